@@ -8,17 +8,24 @@ Home.py
     For more information see:
     https://github.com/walkerazam/squatjump_dashboard
 """
+import contextlib
+import logging
+import os
 import streamlit as st
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib
-import streamlit.components.v1 as components
 from squatjump_dashboard.squat_jump_utils import groundforce_plot, create_COP_plot
 from squatjump_dashboard.squat_jump_utils import metric_viewer, create_plot_vs_time
-from squatjump_dashboard.squat_jump_utils import split_by_jump, create_center_pressure_df
 from squatjump_dashboard.process_data import process_data
-from matplotlib.animation import FuncAnimation
+from squatjump_dashboard.process_data.process_data import MAX_ROWS
+from squatjump_dashboard.pipeline_cache import PipelineCache, trial_key
+from squatjump_dashboard.plot_data import use_plot_cache
+from squatjump_dashboard.plot_data.plot_data import PLOT_CACHE_ENTRIES
+from squatjump_dashboard.plot_data.plot_data import PLOT_CACHE_MB
+from squatjump_dashboard.load_data import load_data
+from squatjump_dashboard.validate_data import validate_data
+from squatjump_dashboard.profiling import Profiler, stage
+from squatjump_dashboard.force_animation import create_force_animation
+from squatjump_dashboard.metric_store import MetricStore, patient_id
 
 # Page Configurations
 st.set_page_config(
@@ -26,231 +33,231 @@ st.set_page_config(
     page_icon='🦵'
 )
 
-# Page Header
-st.write("""# ACL Squat Jumps""")
 
-# Asking User to Upload a Data File
-uploaded_file = st.file_uploader("Choose a Patient CSV file", type='csv',
-                                 accept_multiple_files=False)
-# Check that a User Uploaded a File:
-if uploaded_file is not None:
-    # Reading in Data File as df
-    df = pd.read_csv(uploaded_file, header=6)
+@st.experimental_singleton
+def get_pipeline_cache():
+    """
+    Returns the pipeline cache shared by all sessions. Its size can be
+    set with the SQUATJUMP_CACHE_ENTRIES and SQUATJUMP_CACHE_MB
+    environment variables.
+    """
+    return PipelineCache(
+        max_entries=int(os.environ.get('SQUATJUMP_CACHE_ENTRIES', 32)),
+        max_bytes=int(os.environ.get('SQUATJUMP_CACHE_MB', 512)) * 2 ** 20)
 
-    # Retrieve processed data, index, and calculations
-    processed_data, index_df, calculations_df = process_data(df)
 
-    st.metric("Patient's Weight (Kg)",
-              np.round(calculations_df.loc[1, 'weight(kg)'], 2))
+@st.experimental_singleton
+def get_plot_cache():
+    """
+    Returns the cache of plot data and figures shared by all sessions,
+    bounded like the pipeline cache. Its size can be set with the
+    SQUATJUMP_PLOT_CACHE_ENTRIES and SQUATJUMP_PLOT_CACHE_MB
+    environment variables.
+    """
+    return PipelineCache(
+        max_entries=int(os.environ.get('SQUATJUMP_PLOT_CACHE_ENTRIES',
+                                       PLOT_CACHE_ENTRIES)),
+        max_bytes=int(os.environ.get('SQUATJUMP_PLOT_CACHE_MB',
+                                     PLOT_CACHE_MB)) * 2 ** 20)
 
-    # Reporting calculated Metrics:
-    st.write("""## Jump Metrics:""")
 
-    # Asking which jump to view:
-    selected_jump = st.radio("Select which patient jump to View:",
-                             ('1', '2', '3'))
-    # Seperating into columns for display
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Jump Time",
-                calculations_df.loc[int(selected_jump), 'jump_time(s)'],
-                help='Starts from beginning of loading' +
-                '/eccentric phase and ends when patient is in the air')
-    col2.metric("Eccentric Phase Time",
-                calculations_df.loc[int(selected_jump), 'ecce_time(s)'])
-    col3.metric("Concentric Phase Time",
-                calculations_df.loc[int(selected_jump), 'conc_time(s)'])
+@st.experimental_singleton
+def get_metric_store(path):
+    """
+    Returns the metric store (SQLite file at path) where sessions are
+    saved for the Trends page.
+    """
+    return MetricStore(path)
 
-    metric_df = metric_viewer(calculations_df)
-    with st.expander("View Complete Jump Metrics"):
-        # Displaying table with select rows
-        st.table(metric_df.loc[["Jump Height (cm)",
-                                "Takeoff Velocity (m/s)",
-                                "Eccentric Loading Rate (N/s)",
-                                "Jump Time (s)",
-                                "Eccentric Time (s)",
-                                "Concentric Time (s)",
-                                "Peak Force (N)",
-                                "Left Leg COP Displacement(cm) [Ant.-Post.]",
-                                "Right Leg COP Displacement(cm) [Ant.-Post.]",
-                                "Left Leg COP Displacement(cm) [Med.-Lat.]",
-                                "Right Leg COP Displacement(cm) [Med.-Lat.]"]])
-    # Giving an option to download metrics
-    @st.cache  # noqa: E301
-    def convert_df(df):
-        # IMPORTANT: Cache the conversion to prevent computation on every rerun
-        return df.to_csv().encode('utf-8')
-    csv = convert_df(metric_viewer(calculations_df))
-    # Adding download button
-    st.download_button(
-        label="Download Jump Metrics as CSV",
-        data=csv,
-        file_name='jump_metrics.csv',
-        mime='text/csv',
-    )
 
-    # Asking if a plot for groundforce should be made
-    st.write("## Plots of Ground Force by Leg")
-    # Creating a Selectbox
-    axis = st.selectbox(
-        "Select Axis for Ground Force",
-        ('Select Axis', 'X-Axis', 'Y-Axis', 'Z-Axis'))
-    # Conditional Statements based on Selectbox options
-    if axis == 'X-Axis':
-        fig = groundforce_plot(df, 'x')
-        st.pyplot(fig)
-    elif axis == 'Y-Axis':
-        fig = groundforce_plot(df, 'y')
-        st.pyplot(fig)
-    elif axis == 'Z-Axis':
-        fig = groundforce_plot(df, 'z')
-        st.pyplot(fig)
-    else:
-        # If none selected, print a message
-        st.caption("None Selected...")
+def read_and_process(uploaded_file):
+    """
+    Reads an uploaded file and runs it through process_data.
+    Returns the validated raw data followed by the process_data outputs.
+    Results are also persisted in SQUATJUMP_CACHE_DIR if it is set, and
+    trials longer than SQUATJUMP_MAX_ROWS rows (if set) are rejected.
+    """
+    trial = validate_data(load_data(uploaded_file))
+    max_rows = os.environ.get('SQUATJUMP_MAX_ROWS')
+    return (trial,) + process_data(
+        trial, cache_dir=os.environ.get('SQUATJUMP_CACHE_DIR'),
+        max_rows=MAX_ROWS if max_rows is None else int(max_rows))
 
-    # Giving users options to plot metrics
-    st.write("## Jump Plots:")
-    # Creating a multiselect interface
-    options = st.multiselect(
-        'What metrics would you like to visualize?',
-        ['Position', 'Velocity', 'Acceleration'])
-    # If there is an option...
-    if options is None:
-        st.caption("None Selected")
-    else:
-        # Per plot entry, show the plots
-        for option in options:
-            if option == 'Position':
-                st.pyplot(create_plot_vs_time(processed_data, 'bodypos_y'))
-            elif option == 'Velocity':
-                st.pyplot(create_plot_vs_time(processed_data, 'bodyvel_y'))
-            else:
-                st.pyplot(create_plot_vs_time(processed_data, 'bodyacc_y'))
 
-    st.write("## Plotting Center of Pressure:")
+# Opt-in profiling of the pipeline stages and plots of this run, shown in
+# a Performance panel (SQUATJUMP_PROFILE=1, or =memory to add peak memory)
+# The profiler is deactivated when the run ends, even after an error
+profile_mode = os.environ.get('SQUATJUMP_PROFILE', '')
+profiler = None
+if profile_mode != '':
+    profiler = Profiler(memory=profile_mode == 'memory')
 
-    # Creating a selectbox for the COP plot
-    interactive_choice = st.selectbox(
-        "Create Interactive COP Plot?",
-        ('No', 'Yes'))
-    if interactive_choice == 'Yes':
-        fig = create_COP_plot(df)
-        st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.caption("No Interactive Plot Selected")
+# Plot data and figures are kept in a bounded cache shared by all sessions
+use_plot_cache(get_plot_cache())
+
+# Page Header
+st.write("""# ACL Squat Jumps""")
+
+# Asking User to Upload a Data File
+uploaded_file = st.file_uploader("Choose a Patient CSV file", type='csv',
+                                 accept_multiple_files=False)
+with profiler if profiler is not None else contextlib.nullcontext():
+    # Check that a User Uploaded a File:
+    if uploaded_file is not None:
+        # Reading in Data File as trial and retrieve processed data, index,
+        # and calculations (cached by file contents across reruns)
+        trial, processed_data, index_df, calculations_df = \
+            get_pipeline_cache().get_or_compute(
+                trial_key(uploaded_file.getvalue()),
+                lambda: read_and_process(uploaded_file))
 
-    # 3D Animated Plot:
+        st.metric("Patient's Weight (Kg)",
+                  np.round(calculations_df.loc[1, 'weight(kg)'], 2))
 
-    st.write("## 3D Animation For Forces:")
-    df = processed_data.copy()
-    # Retrieveing DF with Position
-    df_pos = create_center_pressure_df(df)
-    # Asking which jump to view:
-    jump = st.radio("Select which jump to view:",
-                    ('None', '1', '2', '3'))
-    if jump != 'None':
-        # Creating 2 columns for left and right sides
-        left, right = st.columns(2)
-        # Create a 3D plot for both directions
-        for direction in ['left', 'right']:
-            # Splitting our Dataset by the selected jump
-            df = split_by_jump(df_pos, index_df, jump)
+        # Reporting calculated Metrics:
+        st.write("""## Jump Metrics:""")
 
-            # Selecting Leg Position (Left or Right)
-            selected_position = direction
-            df = df[df['Position'] == selected_position]
-            # Resetting index
-            df = df.reset_index(drop=True)
+        # Asking which jump to view:
+        jump_options = tuple(str(jump) for jump in calculations_df.index)
+        selected_jump = st.radio("Select which patient jump to View:",
+                                 jump_options)
+        # Seperating into columns for display
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Jump Time",
+                    calculations_df.loc[int(selected_jump), 'jump_time(s)'],
+                    help='Starts from beginning of loading' +
+                    '/eccentric phase and ends when patient is in the air')
+        col2.metric("Eccentric Phase Time",
+                    calculations_df.loc[int(selected_jump), 'ecce_time(s)'])
+        col3.metric("Concentric Phase Time",
+                    calculations_df.loc[int(selected_jump), 'conc_time(s)'])
 
-            # Creating plot animation
-            fig, ax = plt.subplots(figsize=(3.5, 3.5),
-                                   subplot_kw=dict(projection="3d"))
-            # Colorbar initiation
-            norm = matplotlib.colors.Normalize()
-            norm.autoscale(df_pos['ground_force_pt2z'])
-            cm = matplotlib.cm.cool
-            sm = matplotlib.cm.ScalarMappable(cmap=cm, norm=norm)
-            sm.set_array([])
+        metric_df = metric_viewer(calculations_df)
+        with st.expander("View Complete Jump Metrics"):
+            # Displaying table with select rows
+            st.table(metric_df.loc[[
+                "Jump Height (cm)",
+                "Takeoff Velocity (m/s)",
+                "Eccentric Loading Rate (N/s)",
+                "Jump Time (s)",
+                "Eccentric Time (s)",
+                "Concentric Time (s)",
+                "Peak Force (N)",
+                "Left Leg COP Displacement(cm) [Ant.-Post.]",
+                "Right Leg COP Displacement(cm) [Ant.-Post.]",
+                "Left Leg COP Displacement(cm) [Med.-Lat.]",
+                "Right Leg COP Displacement(cm) [Med.-Lat.]"]])
+        # Giving an option to download metrics
+        @st.experimental_memo  # noqa: E301
+        def convert_df(df):
+            # IMPORTANT: Cache the conversion to prevent computation on
+            # every rerun
+            return df.to_csv().encode('utf-8')
+        csv = convert_df(metric_viewer(calculations_df))
+        # Adding download button
+        st.download_button(
+            label="Download Jump Metrics as CSV",
+            data=csv,
+            file_name='jump_metrics.csv',
+            mime='text/csv',
+        )
 
-            def get_arrow(idx):
-                """
-                This function returns unit vector arrow position for
-                plotting in a 3D space.
-                Arguments:
-                    1. idx: index of the time for where plot the arrow
-                Return:
-                    1. coordinates for x, y, z, and magnitude values
-                        (u, v, w)
-                """
-                # x, y, and z = 0 for static start positions
-                x = 0
-                y = 0
-                z = 0
-                u = df['ground_force_pt2x'][idx]
-                v = df['ground_force_pt2y'][idx]
-                w = df['ground_force_pt2z'][idx]
-                return x, y, z, u, v, w
+        # Saving the metrics as a session of the patient, for the Trends page
+        # (when a metric store is set with SQUATJUMP_METRIC_STORE)
+        store_path = os.environ.get('SQUATJUMP_METRIC_STORE')
+        if store_path is not None:
+            with st.form("save_session"):
+                st.write("Save Jump Metrics to Patient History")
+                patient = st.text_input("Patient ID",
+                                        patient_id(uploaded_file.name))
+                session_date = st.date_input("Session Date")
+                if st.form_submit_button("Save Session"):
+                    try:
+                        get_metric_store(store_path).add_session(
+                            patient, calculations_df, session_date,
+                            trial=uploaded_file.name,
+                            key=trial_key(uploaded_file.getvalue()))
+                        st.success("Saved session of " + patient + " on " +
+                                   str(session_date))
+                    except ValueError as error:
+                        st.error(str(error))
 
-            def update(idx):
-                """
-                This function takes the index for the 3D animation
-                in order to update the arrows.
-                No returns, but updates Quiver position.
-                Arguments:
-                    1. idx: the time index for the jump data.
-                """
-                # Calling on the global quiver
-                global quiver
-                # Removing the old quiver
-                quiver.remove()
-                # Replotting based on new idx
-                quiver = ax.quiver(
-                    *get_arrow(idx), arrow_length_ratio=0.05,
-                    color=cm(norm(df['ground_force_pt2z'][idx]))
-                    )
+        # Asking if a plot for groundforce should be made
+        st.write("## Plots of Ground Force by Leg")
+        # Creating a Selectbox
+        axis = st.selectbox(
+            "Select Axis for Ground Force",
+            ('Select Axis', 'X-Axis', 'Y-Axis', 'Z-Axis'))
+        # Conditional Statements based on Selectbox options
+        if axis == 'X-Axis':
+            fig = groundforce_plot(trial, 'x')
+            st.pyplot(fig)
+        elif axis == 'Y-Axis':
+            fig = groundforce_plot(trial, 'y')
+            st.pyplot(fig)
+        elif axis == 'Z-Axis':
+            fig = groundforce_plot(trial, 'z')
+            st.pyplot(fig)
+        else:
+            # If none selected, print a message
+            st.caption("None Selected...")
 
-            # Quiver plotting:
-            quiver = ax.quiver(*get_arrow(0), arrow_length_ratio=0.05,
-                               color=cm(norm(df['ground_force_pt2z'][0])))
-            # Plot Title:
-            plot_title = '3D Force Plot for Jump ' + str(jump) + \
-                         ' [' + str(selected_position) + ']'
-            ax.set_title(plot_title)
-            # X Axis:
-            ax.set_xlabel('X Axis')
-            ax.set_xlim(min(list(df.ground_force_pt1x) +
-                            list(df.ground_force_pt2x)) - 1,
-                        max(list(df.ground_force_pt1x) +
-                            list(df.ground_force_pt2x)) + 1)
-            # Y Axis:
-            ax.set_ylabel('Y Axis')
-            ax.set_ylim(min(list(df.ground_force_pt1y) +
-                            list(df.ground_force_pt2y)) - 1,
-                        max(list(df.ground_force_pt1y) +
-                            list(df.ground_force_pt2y)) + 1)
-            # Z Axis:
-            ax.set_zlabel('Force Magnitude')
-            ax.set_zlim(min(list(df_pos.ground_force_pt1z) +
-                            list(df_pos.ground_force_pt2z)),
-                        max(list(df_pos.ground_force_pt1z) +
-                            list(df_pos.ground_force_pt2z)) + 1)
+        # Giving users options to plot metrics
+        st.write("## Jump Plots:")
+        # Creating a multiselect interface
+        options = st.multiselect(
+            'What metrics would you like to visualize?',
+            ['Position', 'Velocity', 'Acceleration'])
+        # If there is an option...
+        if options is None:
+            st.caption("None Selected")
+        else:
+            # Per plot entry, show the plots
+            for option in options:
+                if option == 'Position':
+                    st.pyplot(create_plot_vs_time(processed_data, 'bodypos_y'))
+                elif option == 'Velocity':
+                    st.pyplot(create_plot_vs_time(processed_data, 'bodyvel_y'))
+                else:
+                    st.pyplot(create_plot_vs_time(processed_data, 'bodyacc_y'))
 
-            # Animation figure
-            anim = FuncAnimation(fig, update, frames=range(0, len(df), 4),
-                                 interval=1)
-            # Colorbar for magnitude
-            plt.colorbar(sm, location='bottom', label='Force (N)')
-            # To show in streamlit, saving as jshtml and then showing in
-            # every column:
-            if direction == 'left':
-                with left:
-                    components.html(anim.to_jshtml(), height=750,
-                                    scrolling=True)
-            else:
-                with right:
-                    components.html(anim.to_jshtml(), height=750,
-                                    scrolling=True)
+        st.write("## Plotting Center of Pressure:")
 
+        # Creating a selectbox for the COP plot
+        interactive_choice = st.selectbox(
+            "Create Interactive COP Plot?",
+            ('No', 'Yes'))
+        if interactive_choice == 'Yes':
+            fig = create_COP_plot(trial)
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.caption("No Interactive Plot Selected")
+
+        # 3D Animated Plot:
+
+        st.write("## 3D Animation For Forces:")
+        # Asking which jump to view:
+        jump = st.radio("Select which jump to view:",
+                        ('None',) + jump_options)
+        if jump != 'None':
+            with stage('force_animation'):
+                # Creating 2 columns for left and right sides, each showing an
+                # animation built once per trial, jump and leg
+                for column, leg in zip(st.columns(2), ['left', 'right']):
+                    column.plotly_chart(
+                        create_force_animation(processed_data, index_df,
+                                               int(jump), leg),
+                        use_container_width=True)
+
+
+    else:
+        st.caption("Please Upload a File Above")
 
-else:
-    st.caption("Please Upload a File Above")
+if profiler is not None:
+    logging.getLogger(__name__).info(profiler.log_line())
+    with st.expander("Performance"):
+        performance = profiler.as_frame()
+        if profiler.memory_requested and 'peak_mb' not in performance:
+            st.caption("Peak memory is unavailable while another session "
+                       "records it.")
+        st.dataframe(performance)
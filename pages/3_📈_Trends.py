@@ -0,0 +1,85 @@
+"""
+Trends.py
+    This file contains code for the Trends Page
+    that will be used in the Squat Jumps Dashboard
+    for Streamlit.
+
+    It plots the jump metrics of a patient across
+    sessions, read from the metric store set with
+    SQUATJUMP_METRIC_STORE (see metric_store.py), so
+    no force plate data is read or processed again.
+"""
+import os
+import streamlit as st
+import plotly.express as px
+from squatjump_dashboard.metric_store import MetricStore
+from squatjump_dashboard.process_data.process_data import METRIC_COLUMNS
+from squatjump_dashboard.squat_jump_utils.squat_jump_utils import METRIC_NAMES
+
+# Page Configuration
+st.set_page_config(
+    page_title='Squat Jumps Trends Page',
+    page_icon='📈'
+)
+
+# Readable name of each stored metric (weight excluded, as in the tables)
+metric_names = dict(zip(METRIC_NAMES[1:], METRIC_COLUMNS[1:]))
+# Aggregate of the jumps of each session
+aggregates = {'Mean of Jumps': 'mean', 'Best Jump (Max)': 'max',
+              'All Jumps': None}
+
+
+@st.experimental_singleton
+def get_metric_store(path):
+    """
+    Returns the metric store (SQLite file at path) holding the saved
+    sessions.
+    """
+    return MetricStore(path)
+
+
+# Page Header
+st.title('Patient Trends')
+
+store_path = os.environ.get('SQUATJUMP_METRIC_STORE')
+if store_path is None:
+    st.info("No metric store is set. Launch the dashboard with " +
+            "SQUATJUMP_METRIC_STORE=<file>.sqlite to save sessions from " +
+            "the home page (or store a batch with batch_process --store).")
+    st.stop()
+store = get_metric_store(store_path)
+
+patients = store.patients()
+if len(patients) == 0:
+    st.caption("No sessions saved yet. Save sessions from the home page.")
+    st.stop()
+
+# Asking which patient and metrics to view
+patient = st.selectbox("Select Patient", patients)
+selected = st.multiselect("What metrics would you like to follow?",
+                          list(metric_names),
+                          ["Jump Height (cm)", "Peak Force (N)"])
+aggregate = st.radio("Metric per session:", list(aggregates))
+
+if len(selected) == 0:
+    st.caption("None Selected")
+else:
+    trends = store.trends(patient, [metric_names[name] for name in selected],
+                          aggregates[aggregate])
+    st.metric("Sessions", trends['session_id'].nunique())
+    # One line per jump number when all jumps are shown
+    color = None
+    if 'jump' in trends.columns:
+        trends['jump'] = 'Jump ' + trends['jump'].astype(str)
+        color = 'jump'
+    # One plot per metric, by session date
+    for name in selected:
+        fig = px.line(trends, x='session_date', y=metric_names[name],
+                      color=color, markers=True, hover_data=['trial'],
+                      labels={'session_date': 'Session Date',
+                              metric_names[name]: name, 'jump': 'Jump'},
+                      title=name)
+        st.plotly_chart(fig, use_container_width=True)
+
+with st.expander("View Sessions"):
+    st.dataframe(store.sessions(patient))
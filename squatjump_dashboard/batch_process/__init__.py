@@ -0,0 +1 @@
+from .batch_process import batch_process, find_trials, main, store_trial
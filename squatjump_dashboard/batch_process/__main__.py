@@ -0,0 +1,5 @@
+import sys
+
+from squatjump_dashboard.batch_process import main
+
+sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+batch_process.py
+    This file contains the command line entry point used to process
+    a directory of squat jump trials (for research cohorts) without
+    the dashboard. Trials are processed by a pool of worker processes
+    and the calculation results of every jump are written to one
+    Parquet or CSV table as trials finish. A trial that fails to
+    process is reported and skipped without stopping the batch.
+    Results can also be added to a metric store (see metric_store.py)
+    as sessions, dated by the file modification time.
+    Usage:
+        python -m squatjump_dashboard.batch_process data -o metrics.csv
+        python -m squatjump_dashboard.batch_process data -o metrics.csv \
+            --store metrics.sqlite
+"""
+import argparse
+import datetime
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import parquet
+
+from squatjump_dashboard.load_data import load_data
+from squatjump_dashboard.metric_store import MetricStore, patient_id
+from squatjump_dashboard.pipeline_cache import trial_key
+from squatjump_dashboard.process_data import process_data
+from squatjump_dashboard.process_data.process_data import MAX_ROWS
+from squatjump_dashboard.process_data.process_data import METRIC_COLUMNS
+
+TRIAL_PATTERN = '*_squat_jump.csv'  # Trials looked for in directories
+
+# Columns of the output table
+OUTPUT_SCHEMA = pa.schema([('trial', pa.string()), ('jump', pa.int64())] +
+                          [(col, pa.float64()) for col in METRIC_COLUMNS])
+
+
+def find_trials(paths, pattern=TRIAL_PATTERN):
+    """
+    This function lists the trial files to process.
+    Arguments:
+        1. paths: directories, files or glob patterns (list of str)
+        2. pattern: pattern of trial files in directories (str)
+    Return:
+        1. trials: sorted paths of trial files, without duplicates
+    """
+    trials = set()
+    for path in paths:
+        if os.path.isdir(path):
+            trials.update(glob.glob(os.path.join(path, pattern)))
+        else:
+            trials.update(glob.glob(path))
+    return sorted(trials)
+
+
+def process_trial(path, cache_dir=None, max_rows=MAX_ROWS):
+    """
+    This function processes one trial file. Errors are returned
+    instead of raised so one bad trial does not stop a batch.
+    Arguments:
+        1. path: path of the trial file (str)
+        2. cache_dir: optional directory of persisted results
+        3. max_rows: most rows of a trial, or None for no limit
+    Return:
+        1. path: path of the trial file (str)
+        2. calculations: calculation results of each jump, or None if
+            the trial failed (df)
+        3. error: error message, or None if the trial was processed
+    """
+    try:
+        _, _, calculations = process_data(load_data(path),
+                                          cache_dir=cache_dir,
+                                          max_rows=max_rows)
+    except Exception as error:
+        return path, None, type(error).__name__ + ': ' + str(error)
+    return path, calculations, None
+
+
+def trial_table(path, calculations):
+    """
+    This function converts the calculation results of a trial into
+    rows of the output table.
+    Arguments:
+        1. path: path of the trial file (str)
+        2. calculations: calculation results of each jump (df)
+    Return:
+        1. table: output rows, one per jump (pyarrow Table)
+    """
+    rows = calculations.copy()
+    rows.insert(0, 'jump', calculations.index.astype('int64'))
+    rows.insert(0, 'trial', os.path.basename(path))
+    return pa.Table.from_pandas(rows, schema=OUTPUT_SCHEMA,
+                                preserve_index=False)
+
+
+class TableWriter:
+    """
+    Writer appending rows to a Parquet or CSV table, picked from the
+        file extension. Rows are written as they are added so results
+        are not held in memory.
+    """
+
+    def __init__(self, output):
+        """
+        Open the output table.
+        Argument:
+            output: path of the table (.parquet or .csv)
+        """
+        extension = os.path.splitext(output)[1].lower()
+        if extension not in ['.parquet', '.csv']:
+            raise ValueError('Output must be a .parquet or .csv file')
+        self.output = output
+        self.is_parquet = extension == '.parquet'
+        if self.is_parquet:
+            self.writer = parquet.ParquetWriter(output, OUTPUT_SCHEMA)
+        else:
+            self.file = open(output, 'w', newline='')
+            pd.DataFrame(columns=OUTPUT_SCHEMA.names).to_csv(self.file,
+                                                             index=False)
+
+    def write(self, table):
+        """
+        Append rows to the table.
+        Argument:
+            table: rows with OUTPUT_SCHEMA (pyarrow Table)
+        """
+        if self.is_parquet:
+            self.writer.write_table(table)
+        else:
+            table.to_pandas().to_csv(self.file, header=False, index=False)
+            self.file.flush()
+
+    def close(self):
+        """Close the output table"""
+        if self.is_parquet:
+            self.writer.close()
+        else:
+            self.file.close()
+
+
+def store_trial(store, path, calculations):
+    """
+    This function adds the calculation results of a trial file to a
+    metric store, as a session of the patient named by the file and
+    dated by its modification time. Storing a file again replaces its
+    session.
+    Arguments:
+        1. store: metric store (MetricStore)
+        2. path: path of the trial file (str)
+        3. calculations: calculation results of each jump (df)
+    Return:
+        1. session_id: identifier of the stored session (int)
+    """
+    with open(path, 'rb') as trial_file:
+        key = trial_key(trial_file.read())
+    session_date = datetime.date.fromtimestamp(os.path.getmtime(path))
+    return store.add_session(patient_id(path), calculations, session_date,
+                             trial=os.path.basename(path), key=key)
+
+
+def batch_process(paths, output, workers=None, cache_dir=None,
+                  pattern=TRIAL_PATTERN, log=None, max_rows=MAX_ROWS,
+                  store=None):
+    """
+    This function processes trial files in parallel and writes the
+    calculation results of every jump to one table.
+    Arguments:
+        1. paths: directories, files or glob patterns (list of str)
+        2. output: path of the output table (.parquet or .csv)
+        3. workers: number of worker processes, defaults to the number
+            of CPUs. With 1 worker trials are processed in this process
+        4. cache_dir: optional directory of persisted results
+        5. pattern: pattern of trial files in directories (str)
+        6. log: optional function called with a progress message for
+            every trial
+        7. max_rows: most rows of a trial, or None for no limit
+        8. store: optional path of a metric store the results of each
+            trial are added to
+    Return:
+        1. summary: number of trials processed and failed, failures
+            by path, run time (s) and throughput (trials/s) (dict)
+    """
+    trials = find_trials(paths, pattern)
+    if len(trials) == 0:
+        raise ValueError('No trial files found in ' + str(paths))
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    start = time.perf_counter()
+    if store is not None:
+        store = MetricStore(store)
+    writer = TableWriter(output)
+    failures = {}
+    executor = None
+    try:
+        if workers == 1:
+            results = (process_trial(path, cache_dir, max_rows)
+                       for path in trials)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(process_trial, trials,
+                                   [cache_dir] * len(trials),
+                                   [max_rows] * len(trials))
+        for path, calculations, error in results:
+            if error is None:
+                writer.write(trial_table(path, calculations))
+                if store is not None:
+                    store_trial(store, path, calculations)
+                message = path + ': ' + str(len(calculations)) + ' jumps'
+            else:
+                failures[path] = error
+                message = path + ': failed (' + error + ')'
+            if log is not None:
+                log(message)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        writer.close()
+    seconds = time.perf_counter() - start
+
+    return {'processed': len(trials) - len(failures),
+            'failed': len(failures),
+            'failures': failures,
+            'seconds': seconds,
+            'trials_per_s': len(trials) / seconds}
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+    Argument:
+        argv: command line arguments, defaults to sys.argv
+    Return:
+        1. status: exit status, 1 if no trial could be processed
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m squatjump_dashboard.batch_process',
+        description='Process squat jump trials and write the metrics of '
+                    'every jump to one table.')
+    parser.add_argument('paths', nargs='+',
+                        help='directories, files or glob patterns of trials')
+    parser.add_argument('-o', '--output', required=True,
+                        help='output table (.parquet or .csv)')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='worker processes (default: number of CPUs)')
+    parser.add_argument('--pattern', default=TRIAL_PATTERN,
+                        help='trial files looked for in directories '
+                             '(default: %(default)s)')
+    parser.add_argument('--cache-dir', default=None,
+                        help='directory of persisted results to reuse')
+    parser.add_argument('--max-rows', type=int, default=MAX_ROWS,
+                        help='most rows of a trial, 0 for no limit '
+                             '(default: %(default)s)')
+    parser.add_argument('--store', default=None,
+                        help='metric store (SQLite file) the results are '
+                             'added to')
+    args = parser.parse_args(argv)
+
+    try:
+        summary = batch_process(args.paths, args.output, args.workers,
+                                args.cache_dir, args.pattern, log=print,
+                                max_rows=args.max_rows or None,
+                                store=args.store)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    print('Processed %d trials (%d failed) in %.2f s: %.2f trials/s'
+          % (summary['processed'] + summary['failed'], summary['failed'],
+             summary['seconds'], summary['trials_per_s']))
+    return 0 if summary['processed'] > 0 else 1
@@ -0,0 +1 @@
+from .benchmark import run_benchmark, compare, scaled_trial, main
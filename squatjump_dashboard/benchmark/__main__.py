@@ -0,0 +1,5 @@
+import sys
+
+from squatjump_dashboard.benchmark import main
+
+sys.exit(main())
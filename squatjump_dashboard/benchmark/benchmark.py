@@ -0,0 +1,379 @@
+"""
+benchmark.py
+    This file contains the benchmark harness for the cleaning and
+    processing pipeline. Each stage of clean_data, each ProcessData
+    metric and the plotting helpers are timed separately on the
+    sample trials in data/ and on synthetic trials scaled up to
+    30,000 rows. Results are written to JSON so runs on different
+    commits can be compared, and a run fails if a stage got slower
+    than the baseline by more than a threshold.
+    Usage:
+        python -m squatjump_dashboard.benchmark data -o bench.json
+        python -m squatjump_dashboard.benchmark data -o new.json \
+            --baseline bench.json
+"""
+import argparse
+import contextlib
+import datetime
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import scipy
+
+from squatjump_dashboard.batch_process import find_trials
+from squatjump_dashboard.load_data import load_data
+from squatjump_dashboard.process_data.process_data import ProcessData
+from squatjump_dashboard.squat_jump_utils import squat_jump_utils
+from squatjump_dashboard.synthetic_data import generate_trial
+from squatjump_dashboard.validate_data import validate_data, ValidatedTrial
+
+# Module of clean_data (the package exports the function of the same name)
+clean_data_module = importlib.import_module(
+    'squatjump_dashboard.clean_data.clean_data')
+
+SCALED_ROWS = 30000  # Rows of the synthetic trials
+REPEAT = 5  # Runs of each timing, the fastest is kept
+THRESHOLD = 1.25  # Slowdown (ratio to baseline) counted as a regression
+MIN_SECONDS = 0.001  # Slowdowns smaller than this are ignored (s)
+
+# Stages of clean_data and the function of clean_data.py timed for each
+CLEAN_DATA_STAGES = {'validation': 'validate_data',
+                     'filter': 'butter_filter',
+                     'contact_finder': 'contact_finder',
+                     'find_static_indexes': 'find_static_indexes',
+                     'contact_event_finder': 'contact_event_finder',
+                     'integration': 'integrate_segments'}
+
+# ProcessData methods timed over every jump
+METRIC_METHODS = ['height_by_v', 'get_take_off_v', 'rate_of_force_ecce',
+                  'get_peak_force', 'get_peak_power', 'avg_power_conc',
+                  'get_squat_depth', 'get_max_cop_dis']
+
+
+def scaled_trial(data, n_rows=SCALED_ROWS, tail=500):
+    """
+    This function lengthens a trial to n_rows by extending the
+    standing after the last jump, mirroring its last samples back and
+    forth so the signals stay continuous. Jump results do not change.
+    Arguments:
+        1. data: squat jump dataframe
+        2. n_rows: rows of the scaled trial (int)
+        3. tail: samples of the end of the trial that are mirrored
+    Return:
+        1. scaled: scaled squat jump dataframe
+    """
+    n_extra = n_rows - len(data)
+    if n_extra <= 0:
+        return data.iloc[:n_rows].reset_index(drop=True)
+    tail_values = data.to_numpy()[-tail:]
+    swing = np.concatenate([tail_values[::-1], tail_values])
+    repeats = -(-n_extra // len(swing))
+    values = np.concatenate([data.to_numpy(),
+                             np.tile(swing, (repeats, 1))[:n_extra]])
+    scaled = pd.DataFrame(values, columns=data.columns)
+    scaled['time'] = np.arange(n_rows) * (data['time'][1] - data['time'][0])
+    return scaled
+
+
+@contextlib.contextmanager
+def timed_stages(module, stages, seconds):
+    """
+    Context manager timing calls to functions of a module. Time spent
+    in each function is added to seconds while the context is active.
+    Arguments:
+        1. module: module whose functions are timed
+        2. stages: name of the function timed for each stage (dict)
+        3. seconds: time spent in each stage (dict, updated)
+    """
+    originals = {stage: getattr(module, name)
+                 for stage, name in stages.items()}
+
+    def timer(stage, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds[stage] = seconds.get(stage, 0.0) + \
+                    time.perf_counter() - start
+        return timed
+
+    for stage, name in stages.items():
+        setattr(module, name, timer(stage, originals[stage]))
+    try:
+        yield seconds
+    finally:
+        for stage, name in stages.items():
+            setattr(module, name, originals[stage])
+
+
+def best_time(func, repeat=REPEAT, setup=None):
+    """
+    This function times a call, keeping the fastest of several runs.
+    Arguments:
+        1. func: function called without arguments, or with the value
+            returned by setup
+        2. repeat: number of runs (int)
+        3. setup: optional function called before each run, which is
+            not timed
+    Return:
+        1. seconds: fastest run time (s)
+    """
+    times = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def time_clean_data(data, repeat=REPEAT):
+    """
+    This function times each stage of clean_data and the whole call.
+    Arguments:
+        1. data: raw squat jump dataframe
+        2. repeat: number of runs, the fastest run of each stage is kept
+    Return:
+        1. seconds: time of each stage (dict)
+        2. error: error raised by clean_data, or None
+    """
+    best = {}
+    for _ in range(repeat):
+        seconds = {}
+        error = None
+        start = time.perf_counter()
+        with timed_stages(clean_data_module, CLEAN_DATA_STAGES, seconds):
+            try:
+                clean_data_module.clean_data(data)
+            except Exception as exc:
+                error = type(exc).__name__ + ': ' + str(exc)
+        if error is None:
+            seconds['total'] = time.perf_counter() - start
+        for stage, value in seconds.items():
+            best[stage] = min(value, best.get(stage, value))
+        if error is not None:
+            break
+    return {'clean_data.' + stage: value
+            for stage, value in best.items()}, error
+
+
+def time_metrics(processed, repeat=REPEAT):
+    """
+    This function times each ProcessData metric over every jump.
+    Arguments:
+        1. processed: ProcessData object of the trial
+        2. repeat: number of runs, the fastest is kept
+    Return:
+        1. seconds: time of each metric (dict)
+    """
+    n_jumps = len(processed.get_calculations())
+
+    def every_jump(method):
+        def run():
+            for jump in range(1, n_jumps + 1):
+                processed.set_jump(jump)
+                getattr(processed, method)()
+        return run
+
+    seconds = {'metrics.' + method: best_time(every_jump(method), repeat)
+               for method in METRIC_METHODS}
+    seconds['metrics.generate_cal_result'] = best_time(
+        processed.generate_cal_result, repeat)
+    return seconds
+
+
+def time_plots(trial, processed, repeat=REPEAT):
+    """
+    This function times the plotting helpers used by the dashboard.
+    Arguments:
+        1. trial: validated raw trial
+        2. processed: ProcessData object of the trial
+        3. repeat: number of runs, the fastest is kept
+    Return:
+        1. seconds: time of each helper (dict)
+    """
+    data = processed.get_data()
+    index = processed.get_index()
+    calculations = processed.get_calculations()
+
+    def closed(make_figure):
+        def run(*args):
+            plt.close(make_figure(*args))
+        return run
+
+    # Plot data is cached per dataframe (see plot_data.py), so the
+    #   line plots are given a new copy of the data on every run
+    uncached = {
+        'groundforce_plot': (
+            closed(lambda copy: squat_jump_utils.groundforce_plot(copy,
+                                                                  'y')),
+            lambda: ValidatedTrial(trial.data.copy())),
+        'create_plot_vs_time': (
+            closed(lambda copy: squat_jump_utils.create_plot_vs_time(
+                copy, 'bodyvel_y')),
+            data.copy)}
+    helpers = {
+        # The COP plot itself, not the per trial cache around it
+        'create_COP_plot': lambda: squat_jump_utils.cop_figure(
+            squat_jump_utils.center_pressure_bins(trial.data)),
+        'metric_viewer': lambda: squat_jump_utils.metric_viewer(
+            calculations),
+        'create_center_pressure_df': lambda:
+            squat_jump_utils.create_center_pressure_df(data),
+        'split_by_jump': lambda: squat_jump_utils.split_by_jump(
+            data, index, 1)}
+    seconds = {'plots.' + name: best_time(helper, repeat, setup)
+               for name, (helper, setup) in uncached.items()}
+    seconds.update({'plots.' + name: best_time(helper, repeat)
+                    for name, helper in helpers.items()})
+    return seconds
+
+
+def benchmark_trial(data, repeat=REPEAT):
+    """
+    This function times every stage for one trial. If the trial cannot
+    be processed, only the stages run before the error are timed.
+    Arguments:
+        1. data: raw squat jump dataframe
+        2. repeat: number of runs, the fastest is kept
+    Return:
+        1. result: number of rows, time of each stage and error (dict)
+    """
+    seconds, error = time_clean_data(data, repeat)
+    if error is None:
+        trial = validate_data(data)
+        processed = ProcessData(trial)
+        seconds.update(time_metrics(processed, repeat))
+        seconds.update(time_plots(trial, processed, repeat))
+    return {'rows': len(data), 'seconds': seconds, 'error': error}
+
+
+def git_commit():
+    """Return the commit of the repository, or None outside git"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(paths, rows=SCALED_ROWS, repeat=REPEAT, log=None):
+    """
+    This function benchmarks the sample trials and, for every one that
+    can be processed, a copy scaled to rows, plus a generated synthetic
+    trial of rows.
+    Arguments:
+        1. paths: directories, files or glob patterns of trials
+        2. rows: rows of the synthetic trials (int), 0 to skip them
+        3. repeat: number of runs, the fastest is kept
+        4. log: optional function called with a progress message for
+            every trial
+    Return:
+        1. results: run details and results by trial name (dict)
+    """
+    results = {'meta': {'commit': git_commit(),
+                        'date': datetime.datetime.now().isoformat(),
+                        'python': platform.python_version(),
+                        'platform': platform.platform(),
+                        'numpy': np.__version__,
+                        'pandas': pd.__version__,
+                        'scipy': scipy.__version__,
+                        'repeat': repeat},
+               'trials': {}}
+
+    def add(name, data):
+        result = benchmark_trial(data, repeat)
+        results['trials'][name] = result
+        if log is not None:
+            log('%s: %d rows, %s' % (
+                name, result['rows'], result['error'] or
+                'clean_data %.3f s' % result['seconds']['clean_data.total']))
+        return result['error'] is None
+
+    for path in find_trials(paths):
+        name = os.path.basename(path)
+        data = load_data(path)
+        if add(name, data) and rows > 0:
+            add(name + '@' + str(rows), scaled_trial(data, rows))
+    if rows > 0:
+        add('synthetic@' + str(rows),
+            generate_trial(n_rows=rows, seed=0).data)
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD,
+            min_seconds=MIN_SECONDS):
+    """
+    This function finds the stages that got slower than the baseline.
+    Arguments:
+        1. results: results of run_benchmark
+        2. baseline: results of an earlier run_benchmark
+        3. threshold: slowdown ratio counted as a regression (float)
+        4. min_seconds: slowdowns smaller than this are ignored (s)
+    Return:
+        1. regressions: trial, stage, baseline and current time of each
+            regression (list of tuple)
+    """
+    regressions = []
+    for name, result in results['trials'].items():
+        if name not in baseline['trials']:
+            continue
+        before = baseline['trials'][name]['seconds']
+        for stage, seconds in result['seconds'].items():
+            if stage in before and seconds > before[stage] * threshold \
+                    and seconds - before[stage] > min_seconds:
+                regressions.append((name, stage, before[stage], seconds))
+    return regressions
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+    Argument:
+        argv: command line arguments, defaults to sys.argv
+    Return:
+        1. status: exit status, 1 if a stage regressed
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m squatjump_dashboard.benchmark',
+        description='Time each stage of the squat jump pipeline.')
+    parser.add_argument('paths', nargs='+',
+                        help='directories, files or glob patterns of trials')
+    parser.add_argument('-o', '--output', required=True,
+                        help='JSON file the results are written to')
+    parser.add_argument('--baseline', default=None,
+                        help='JSON results of an earlier run to compare to')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='slowdown ratio counted as a regression '
+                             '(default: %(default)s)')
+    parser.add_argument('--rows', type=int, default=SCALED_ROWS,
+                        help='rows of the synthetic trials, 0 to skip them '
+                             '(default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=REPEAT,
+                        help='runs of each timing (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.paths, args.rows, args.repeat, log=print)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressions = compare(results, baseline, args.threshold)
+    for name, stage, before, seconds in regressions:
+        print('Regression in %s %s: %.4f s -> %.4f s (x%.2f)'
+              % (name, stage, before, seconds, seconds / before),
+              file=sys.stderr)
+    return 1 if len(regressions) > 0 else 0
@@ -7,12 +7,29 @@ Returns:
     3. weight: patient mass/weight (float)
 
 """
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
-from scipy import integrate
-from scipy.signal import butter, filtfilt
+from scipy.signal import butter, sosfiltfilt
+
+from squatjump_dashboard.load_data.load_data import DROPPED_COLUMNS
+from squatjump_dashboard.profiling import profiled, record
+from squatjump_dashboard.validate_data import validate_data
+from squatjump_dashboard.validate_data.validate_data import CHUNK_ROWS
+from squatjump_dashboard.validate_data.validate_data import chunk_slices
 
+FILTER_CUTOFF = 5  # Lowpass cutoff for force channels (Hz)
+SAMPLE_RATE = 1000  # Force plate sampling rate (Hz)
+FILTER_ORDER = 4  # Order of the butter filter
+# Samples filtered on each side of a chunk of a long trial, for the filter
+# transients at the chunk edges to decay below floating point precision
+FILTER_MARGIN = 4000
+CONTACT_THRESHOLDS = np.arange(10, 101, 5)  # In air thresholds tried (N)
+MIN_FLIGHT = 100  # Fewest samples in the air counted as a jump
 
+
+@profiled('clean_data')
 def clean_data(data):
     """
     This is the main function that takes in a passed dataframe of patient jumps
@@ -21,371 +38,473 @@ def clean_data(data):
     for time (s) per jump phase, and the patient's mass.
 
     Arguments:
-        1. data (df): the raw squat jump dataframe containing jump data
+        1. data (df): the raw squat jump dataframe containing jump data,
+            either with all 19 columns of the force plate export or only
+            the columns used (as read by load_data), or a ValidatedTrial
     Returns:
         1. pre_processed_data (df): pre-processed/cleaned dataframe
         2. index_pd (df): indexes for every jump and their phases
         3. weight (float): patient mass/weight
     """
-    # Check # of columns
-    if data.shape[1] != 19:
-        raise ValueError("Squat jump CSV file has incorrect number of columns")
-    else:
-        pass
-
-    # Check column names:
-    if 'ground_force1_vx' not in data.columns:
-        raise Exception("ground_force1_vx not found")
-    if 'ground_force1_vy' not in data.columns:
-        raise Exception("ground_force1_vy not found")
-    if 'ground_force1_vz' not in data.columns:
-        raise Exception("ground_force1_vz not found")
-    if 'ground_force2_vx' not in data.columns:
-        raise Exception("ground_force2_vx not found")
-    if 'ground_force2_vy' not in data.columns:
-        raise Exception("ground_force2_vy not found")
-    if 'ground_force2_vz' not in data.columns:
-        raise Exception("ground_force2_vz not found")
-    if 'ground_force1_px' not in data.columns:
-        raise Exception("ground_force1_px not found")
-    if 'ground_force1_pz' not in data.columns:
-        raise Exception("ground_force1_pz not found")
-    if 'ground_force2_px' not in data.columns:
-        raise Exception("ground_force2_px not found")
-    if 'ground_force2_pz' not in data.columns:
-        raise Exception("ground_force2_pz not found")
-
-    # Check time is continous
-    for ii in range(data.shape[0]-1):
-        diff = data['time'][ii+1] - data['time'][ii]
-        if np.isclose(diff, 0.001):
-            pass
-        else:
-            raise ValueError("Time series in data not correct. Check to make "
-                             "sure data is at 1000 Hz and continous.")
-
-    # Drop unused columns
-    data = data.drop(['ground_force1_py',
-                      'ground_torque1_x',
-                      'ground_torque1_y',
-                      'ground_torque1_z',
-                      'ground_force2_py',
-                      'ground_torque2_x',
-                      'ground_torque2_y',
-                      'ground_torque2_z'], axis=1)
+    # Check data (skipped if already validated)
+    data = validate_data(data).data
+
+    # Work on arrays of the used columns (views of the data where
+    #   possible) and build the cleaned dataframe once at the end
+    index = data.index
+    columns = {col: data[col].to_numpy(dtype=float) for col in data.columns
+               if col not in DROPPED_COLUMNS}
 
     # Clean data and add new columns
-    # Filter Data Using Butter
-    for col_name in data.columns:
-        if '_v' in col_name:
-            data[col_name] = butter_filter(data[col_name], 5, 1000, 4)
-        else:
-            pass
+    # Filter all force channels at once Using Butter
+    force_cols = [col_name for col_name in columns if '_v' in col_name]
+    filtered = butter_filter(np.column_stack([columns[col]
+                                              for col in force_cols]),
+                             FILTER_CUTOFF, SAMPLE_RATE, FILTER_ORDER)
+    for col_number, col in enumerate(force_cols):
+        columns[col] = filtered[:, col_number]
 
     # Add Total Vertical Force Columns
-    data['ground_force_totaly'] = data['ground_force1_vy'] + \
-        data['ground_force2_vy']
+    columns['ground_force_totaly'] = columns['ground_force1_vy'] + \
+        columns['ground_force2_vy']
 
-    # Find four contact ranges + if subject steps off the force plate
-    c1, c2, c3, c4, off_fp = contact_finder(data['ground_force_totaly'])
+    # Find the contact ranges around every jump + if subject steps off
+    #   the force plate
+    *contacts, off_fp = contact_finder(columns['ground_force_totaly'])
+    n_jumps = len(contacts) - 1
 
     # Replace in air time with zeros
-    for in_air in [[c1[1]+1, c2[0]-1], [c2[1]+1,
-                   c3[0]-1], [c3[1]+1, c4[0]-1]]:
-        data['ground_force1_vy'][in_air[0]:in_air[1]] = 0.0
-        data['ground_force2_vy'][in_air[0]:in_air[1]] = 0.0
-        data['ground_force_totaly'][in_air[0]:in_air[1]] = 0.0
+    for jump in range(n_jumps):
+        for col in ['ground_force1_vy', 'ground_force2_vy',
+                    'ground_force_totaly']:
+            columns[col][contacts[jump][1]+1:contacts[jump+1][0]-1] = 0.0
 
     # Find ground angles
-    ground_force1_angle = find_ground_angle(data['ground_force1_vx'],
-                                            data['ground_force1_vy'],
-                                            data['ground_force1_vz'])
-
-    ground_force2_angle = find_ground_angle(data['ground_force2_vx'],
-                                            data['ground_force2_vy'],
-                                            data['ground_force2_vz'])
-    data['ground_force1_angle'] = ground_force1_angle
-    data['ground_force2_angle'] = ground_force2_angle
-    data['ground_force1_angle'] = data['ground_force1_angle'].fillna(0)
-    data['ground_force2_angle'] = data['ground_force2_angle'].fillna(0)
+    for plate in ['1', '2']:
+        columns['ground_force' + plate + '_angle'] = find_ground_angle(
+            columns['ground_force' + plate + '_vx'],
+            columns['ground_force' + plate + '_vy'],
+            columns['ground_force' + plate + '_vz'])
 
     # Derive Vertical Force
-    dt = data['time'][1] - data['time'][0]
-    force_prime = []
-    for n in range(len(data['ground_force_totaly'])-1):
-        force_prime.append(
-            (
-                data['ground_force_totaly'][n + 1] -
-                data['ground_force_totaly'][n]
-                )/dt
-            )
-    force_prime.append(force_prime[-1])
-    force_prime = pd.DataFrame(force_prime, columns=['force_prime'])
+    dt = columns['time'][1] - columns['time'][0]
+    force_prime = find_force_prime(columns['ground_force_totaly'], dt)
 
     # Find start and end point of all static periods
-    start_index, end_index = find_static_indexes(force_prime, c1, c2, c3, c4)
-
-    # Find largest static periods for all contacts
-    start_index_contact = []
-    end_index_contact = []
-    for contact in [c1, c2, c3, c4]:
-        filtered_start_static = filter(lambda idx:
-                                       contact[1] >= idx >= contact[0],
-                                       start_index)
-        filtered_start_static = list(filtered_start_static)
-
-        filtered_end_static = filter(lambda idx:
-                                     contact[1] >= idx >= contact[0],
-                                     end_index)
-        filtered_end_static = list(filtered_end_static)
-
-        contact_start_index, contact_end_index = find_static_period(
-            filtered_start_static, filtered_end_static)
-        start_index_contact.append(contact_start_index)
-        end_index_contact.append(contact_end_index)
+    start_index, end_index = find_static_indexes(force_prime, *contacts)
+
+    # Find largest static periods for all contacts (static periods are
+    #   sorted, so each contact's are found by binary search)
+    contact_bounds = np.asarray(contacts)
+    start_bounds = [np.searchsorted(start_index, contact_bounds[:, 0], 'left'),
+                    np.searchsorted(start_index, contact_bounds[:, 1],
+                                    'right')]
+    end_bounds = [np.searchsorted(end_index, contact_bounds[:, 0], 'left'),
+                  np.searchsorted(end_index, contact_bounds[:, 1], 'right')]
+    static_periods = np.array([
+        find_static_period(
+            start_index[start_bounds[0][contact]:start_bounds[1][contact]],
+            end_index[end_bounds[0][contact]:end_bounds[1][contact]])
+        for contact in range(len(contacts))])
 
     # Find weight using largest static period:
-    static_diff = []
-    for ii in range(len(start_index_contact)):
-        static_diff.append(end_index_contact[ii] - start_index_contact[ii])
-    max_diff_index = static_diff.index(max(static_diff))
-    start_index_weight = start_index_contact[max_diff_index]
-    end_index_weight = end_index_contact[max_diff_index]
-
-    weight = (data['ground_force_totaly']
+    max_diff_index = int(np.argmax(static_periods[:, 1] -
+                                   static_periods[:, 0]))
+    start_index_weight, end_index_weight = static_periods[max_diff_index]
+
+    weight = (columns['ground_force_totaly']
               [start_index_weight:end_index_weight].mean())/9.81
 
-    # Create cutoffs for contact 2,3, and 4 to help identifcation
-    c2_cutoff = (start_index_contact[1] + end_index_contact[1]) // 2
-    c3_cutoff = (start_index_contact[2] + end_index_contact[2]) // 2
-    if off_fp == 1:
-        c4_cutoff = (start_index_contact[3] + end_index_contact[3]) // 2
-    else:
-        c4_cutoff = c4[1]
-
-    # Identify start and stop of event and phases in each contact:
-    # evt = event, ecc = eccentric phase, con = concentric phase
-    # = jump number, s/e = start/stop
-    contact_list = [c1, c2, c3, c4]
-    cutoffs = [0, c2_cutoff, c3_cutoff, c4_cutoff]
-    for contact in range(len(contact_list)):
-        contact_events = contact_event_finder(data['ground_force_totaly'],
-                                              force_prime['force_prime'],
+    # Create cutoffs for the contacts after the first one to help
+    #   identifcation (middle of their largest static period)
+    cutoffs = (static_periods[:, 0] + static_periods[:, 1]) // 2
+    cutoffs[0] = 0
+    if off_fp == 0:
+        cutoffs[-1] = contacts[-1][1]
+    last_cutoff = int(cutoffs[-1])
+
+    # Identify start and stop of event and phases in each contact, as an
+    #   event table with one row per jump holding the event start,
+    #   eccentric start, concentric start and event end
+    events = np.zeros((n_jumps, 4), dtype=np.int64)
+    for contact in range(len(contacts)):
+        contact_events = contact_event_finder(columns['ground_force_totaly'],
+                                              force_prime,
                                               contact + 1,
-                                              contact_list[contact],
-                                              cutoffs[contact])
+                                              contacts[contact],
+                                              int(cutoffs[contact]),
+                                              len(contacts))
         if contact == 0:
-            evt1_s = contact_events[0]
-            ecc1_s = contact_events[1]
-            con1_s = contact_events[2]
-        elif contact == 1:
-            evt1_e = contact_events[0]
-            evt2_s = contact_events[1]
-            ecc2_s = contact_events[2]
-            con2_s = contact_events[3]
-        elif contact == 2:
-            evt2_e = contact_events[0]
-            evt3_s = contact_events[1]
-            ecc3_s = contact_events[2]
-            con3_s = contact_events[3]
-        elif contact == 3:
-            evt3_e = contact_events
+            events[0, :3] = contact_events
+        elif contact == n_jumps:
+            events[-1, 3] = contact_events
         else:
-            pass
+            events[contact - 1, 3] = contact_events[0]
+            events[contact, :3] = contact_events[1:]
+    event_start, eccentric_start, concentric_start, event_end = events.T
 
     # Derive Acceleration, velocity and position by segment
-    data['bodyacc_y'] = (data['ground_force_totaly']/weight) - 9.81
+    columns['bodyacc_y'] = (columns['ground_force_totaly']/weight) - 9.81
 
-    if c1[0] == evt1_s:
-        index_list = [evt1_s, evt1_e, evt2_s, evt2_e, evt3_s, evt3_e,
-                      c4_cutoff]
-    else:
-        index_list = [c1[0], evt1_s, evt1_e, evt2_s, evt2_e,
-                      evt3_s, evt3_e, c4_cutoff]
-
-    velocity = []
-    position = []
-    for ii in range(len(index_list)-1):
-        acc_segment = data['bodyacc_y'][index_list[ii]:index_list[ii+1]]
-        vel_segment = integrate.cumtrapz(acc_segment, dx=dt, initial=0)
-        pos_segment = integrate.cumtrapz(vel_segment, dx=dt, initial=0)
-        if ii == 0:
-            velocity = vel_segment
-            position = pos_segment
-        else:
-            velocity = np.append(velocity, vel_segment)
-            position = np.append(position, pos_segment)
+    index_list = np.append(events[:, [0, 3]].ravel(), last_cutoff)
+    if contacts[0][0] != event_start[0]:
+        index_list = np.insert(index_list, 0, contacts[0][0])
 
-    data = data[0:c4_cutoff]
-    data['bodyvel_y'] = velocity
-    data['bodypos_y'] = position
+    columns['bodyvel_y'], columns['bodypos_y'] = integrate_segments(
+        columns['bodyacc_y'], index_list, dt)
+
+    # Keep the data up to the end of the last jump
+    data = pd.DataFrame({col: values[0:last_cutoff]
+                         for col, values in columns.items()},
+                        index=index[0:last_cutoff])
 
     # create df for all event index values
-    index_pd = {'Jump 1 Start': [evt1_s, ecc1_s, con1_s, ecc1_s, c2[0]],
-                'Jump 1 End': [evt1_e, con1_s, c1[1],
-                               c1[1], evt1_e],
-                'Jump 2 Start': [evt2_s, ecc2_s, con2_s, ecc2_s, c3[0]],
-                'Jump 2 End': [evt2_e, con2_s, c2[1],
-                               c2[1], evt2_e],
-                'Jump 3 Start': [evt3_s, ecc3_s, con3_s, ecc3_s, c4[0]],
-                'Jump 3 End': [evt3_e, con3_s, c3[1],
-                               c3[1], evt3_e]}
-    index_pd = pd.DataFrame(index_pd, index=['Event',
-                                             'Eccentric Phase',
-                                             'Concentric Phase',
-                                             'Jump Phase',
-                                             'Landing Phase'])
+    take_off = contact_bounds[:-1, 1]
+    landing = contact_bounds[1:, 0]
+    index_table = np.empty((5, 2 * n_jumps), dtype=np.int64)
+    index_table[:, 0::2] = [event_start, eccentric_start, concentric_start,
+                            eccentric_start, landing]
+    index_table[:, 1::2] = [event_end, concentric_start, take_off, take_off,
+                            event_end]
+    index_pd = pd.DataFrame(index_table, columns=index_columns(n_jumps),
+                            index=['Event',
+                                   'Eccentric Phase',
+                                   'Concentric Phase',
+                                   'Jump Phase',
+                                   'Landing Phase'])
 
     # Return
     pre_processed_data = data
     return pre_processed_data, index_pd, weight
 
 
+def index_columns(n_jumps):
+    """
+    This function names the columns of the index table.
+
+    Arguments:
+        1. n_jumps: number of jumps (int)
+    Returns:
+        1. columns: start and end column of each jump in order, e.g.
+        'Jump 1 Start', 'Jump 1 End', ... (list of str)
+    """
+    return ['Jump ' + str(jump) + ' ' + bound
+            for jump in range(1, n_jumps + 1) for bound in ['Start', 'End']]
+
+
+@profiled('integration')
+def integrate_segments(acceleration, index_list, dt):
+    """
+    This function derives velocity and position from acceleration.
+    Each segment between two consecutive indexes is integrated on its
+    own, starting from zero, with the trapezoid rule. All segments are
+    integrated at once into preallocated arrays.
+
+    Arguments:
+        1. acceleration: column of body acceleration (df)
+        2. index_list: indexes where segments start, ending with the
+        end of the last segment (list of int)
+        3. dt: time between samples (float)
+    Returns:
+        1. velocity: body velocity from index_list[0] to index_list[-1]
+        (array of floats)
+        2. position: body position from index_list[0] to index_list[-1]
+        (array of floats)
+    """
+    bounds = np.asarray(index_list, dtype=np.int64)
+    if np.any(np.diff(bounds) < 0):
+        raise ValueError('Segment indexes must not decrease')
+    acceleration = np.asarray(acceleration, dtype=float)[bounds[0]:bounds[-1]]
+
+    # Segment starts relative to the first one, without empty segments
+    segment_starts = np.unique(bounds[:-1] - bounds[0])
+    segment_starts = segment_starts[segment_starts < acceleration.shape[0]]
+
+    velocity = np.empty(acceleration.shape[0], dtype=np.float64)
+    position = np.empty(acceleration.shape[0], dtype=np.float64)
+    cumulative_trapezoid_segments(acceleration, segment_starts, dt, velocity)
+    cumulative_trapezoid_segments(velocity, segment_starts, dt, position)
+    return velocity, position
+
+
+def cumulative_trapezoid_segments(values, segment_starts, dt, out):
+    """
+    This function integrates values with the trapezoid rule, starting
+    again from zero at the start of every segment. One cumulative sum
+    covers all segments: the area added at the start of a segment is
+    minus the total of the segment before, which resets the sum.
+
+    Arguments:
+        1. values: values to integrate (array of floats)
+        2. segment_starts: increasing indexes where segments start, the
+        first being 0 (array of int)
+        3. dt: time between samples (float)
+        4. out: array the integral is written to, same length as values
+        (array of floats)
+    Returns:
+        1. out: integral of each segment (array of floats)
+    """
+    if out.shape[0] == 0:
+        return out
+
+    # Area of every trapezoid between consecutive samples
+    out[0] = 0.0
+    np.add(values[1:], values[:-1], out=out[1:])
+    out[1:] *= dt
+    out[1:] /= 2.0
+
+    # No area across segments: reset the sum at each segment start
+    out[segment_starts] = 0.0
+    segment_totals = np.add.reduceat(out, segment_starts)
+    out[segment_starts[1:]] = -segment_totals[:-1]
+    np.cumsum(out, out=out)
+    return out
+
+
+@profiled('filter')
 def butter_filter(column, cutoff, fs, order):
     """
-    This function filters data using a lowpass butter filter
+    This function filters data using a zero-phase lowpass butter filter.
+    A 2D array is filtered column by column (along axis 0) in one pass.
+    Long data is filtered in chunks of CHUNK_ROWS rows, each with
+    FILTER_MARGIN rows of context on both sides, which bounds the
+    memory used by the filter and gives the same result.
 
     Arguments:
-        1. column: column from main dataframe
+        1. column: column from main dataframe, or 2D array of columns
         2. cutoff: Freq for filtered values (int)
         3. fs: Freq of the orginal/raw data column (int)
         4. order: magnitude of filter used (int)
     Returns:
-        1. filtered_column: column with butter filter applied
+        1. filtered_column: column(s) with butter filter applied
+    """
+    sos = butter_sos(cutoff, fs, order)
+    column = np.asarray(column, dtype=float)
+    n_rows = column.shape[0]
+
+    # sosfiltfilt from scipy applies butter forwards and backwards
+    if n_rows <= CHUNK_ROWS + 2 * FILTER_MARGIN:
+        return sosfiltfilt(sos, column, axis=0)
+    filtered_column = np.empty_like(column)
+    for chunk in chunk_slices(n_rows):
+        start = max(chunk.start - FILTER_MARGIN, 0)
+        stop = min(chunk.stop + FILTER_MARGIN, n_rows)
+        filtered_column[chunk] = sosfiltfilt(sos, column[start:stop], axis=0)[
+            chunk.start - start:chunk.stop - start]
+    return filtered_column
+
+
+@lru_cache(maxsize=None)
+def butter_sos(cutoff, fs, order):
+    """
+    This function designs a lowpass butter filter in second-order
+    sections form. Designs are cached since they only depend on the
+    arguments.
+
+    Arguments:
+        1. cutoff: Freq for filtered values (int)
+        2. fs: Freq of the orginal/raw data column (int)
+        3. order: magnitude of filter used (int)
+    Returns:
+        1. sos: second-order sections of the filter (array)
     """
     nyq = 0.5 * fs
     normal_cutoff = cutoff / nyq
 
     # butter function from scipy creates butter filter
-    b, a = butter(order, normal_cutoff, btype='low', analog=False)
-    # filtfilt function from scipy applies butter
-    filtered_column = filtfilt(b, a, column)
-    return filtered_column
+    sos = butter(order, normal_cutoff, btype='low', analog=False,
+                 output='sos')
+    return sos
 
 
-def contact_finder(force):
+@profiled('contact_finder')
+def contact_finder(force, n_jumps=None):
     """
     This function finds the index ranges for when the subject
-    is in contact with the ground. For this purpose, subjects must
-    jump three times so this function will return four ranges of contact.
-    Also, if the subject steps off the force plate, this function return a
-    1 (True) or 0 (False) to indicate for other functions.
+    is in contact with the ground: one before every jump and one after
+    the last jump. Also, if the subject steps off the force plate, this
+    function return a 1 (True) or 0 (False) to indicate for other
+    functions. The in air threshold comes from find_contact_threshold.
 
     Argument:
         1. force: column of force values from dataframe (df)
+        2. n_jumps: number of jumps, found from the data if None (int)
     Returns:
-        1-4. contact_1 through contact_4: 4 list of contacts with a start
-        and end index value for each (list)
-        5. off_force_plate: value of 1 (True) or 0 (False) if subject stepped
-        off force plate at the end (int)
+        1-n_jumps+1. contacts: one list of contact with a start and end
+        index value for each contact, in order (list)
+        n_jumps+2. off_force_plate: value of 1 (True) or 0 (False) if
+        subject stepped off force plate at the end (int)
     """
-    threshold = 10
+    force = np.asarray(force, dtype=float)
+    threshold = find_contact_threshold(force, n_jumps)
+
+    start_in_air, end_in_air = find_transitions(force < threshold)
+    n_jumps = end_in_air.shape[0]
+
+    # Contacts run from each landing (or the start) to the next take-off
+    #   (or the end)
+    contact_starts = np.concatenate([[0], end_in_air])
+    contact_ends = np.append(start_in_air[:n_jumps] + 1, force.shape[0] - 1)
+    off_force_plate = 0
+    if start_in_air.shape[0] == n_jumps + 1:
+        contact_ends[-1] = start_in_air[-1] + 1
+        off_force_plate = 1
 
-    pass_val = 0
+    contacts = [[int(start), int(end)]
+                for start, end in zip(contact_starts, contact_ends)]
+    return tuple(contacts) + (off_force_plate,)
+
+
+def find_contact_threshold(force, n_jumps=None):
+    """
+    This function finds the force threshold used to tell when the
+    subject is in the air. Every candidate threshold (10 N to 100 N in
+    5 N steps) is evaluated in a single batched pass (one chunk of
+    rows at a time for long data) and the lowest one giving a flight
+    for every jump is returned. Unless it is given, the number of jumps
+    is the number of flights of at least MIN_FLIGHT samples at the
+    highest threshold. The threshold and the number of thresholds
+    tried are recorded when profiling.
+
+    Argument:
+        1. force: column of force values from dataframe (df)
+        2. n_jumps: number of jumps, found from the data if None (int)
+    Returns:
+        1. threshold: force below which the subject is in the air (int)
+    """
+    force = np.asarray(force, dtype=float)
+    thresholds = CONTACT_THRESHOLDS
+    if n_jumps is None:
+        n_jumps = count_flights(force < thresholds[-1])
+
+    # Count flights for every threshold at once (one row per threshold),
+    #   with chunks overlapping by a sample to see every transition
+    n_start_in_air = np.zeros(thresholds.shape[0], dtype=np.int64)
+    n_end_in_air = np.zeros(thresholds.shape[0], dtype=np.int64)
+    for chunk in chunk_slices(force.shape[0] - 1):
+        in_air_bool = force[np.newaxis, chunk.start:chunk.stop + 1] < \
+            thresholds[:, np.newaxis]
+        transitions = np.diff(in_air_bool.view(np.int8), axis=1)
+        n_start_in_air += np.count_nonzero(transitions == 1, axis=1)
+        n_end_in_air += np.count_nonzero(transitions == -1, axis=1)
+
+    passed = ((n_start_in_air == n_jumps + 1) |
+              (n_start_in_air == n_jumps)) & (n_end_in_air == n_jumps)
+    if n_jumps == 0 or not passed.any():
+        raise RuntimeError("Code unable to detect when subject is in air "
+                           "properly")
+    threshold_row = int(np.flatnonzero(passed)[0])
+    record(contact_threshold=int(thresholds[threshold_row]),
+           contact_threshold_tries=threshold_row + 1, n_jumps=n_jumps)
+    return int(thresholds[threshold_row])
+
+
+def count_flights(in_air):
+    """
+    This function counts the flights (runs in the air ending with a
+    landing) of at least MIN_FLIGHT samples.
+
+    Argument:
+        1. in_air: True where the subject is in the air (array of bool)
+    Returns:
+        1. n_flights: number of flights (int)
+    """
+    take_offs, landings = find_transitions(in_air)
+    if take_offs.shape[0] == 0:
+        return 0
+    landings = landings[landings > take_offs[0]]
+    n_flights = landings.shape[0]
+    return int(np.count_nonzero(landings - take_offs[:n_flights] >=
+                                MIN_FLIGHT))
 
-    while pass_val == 0:
-        if threshold > 100:
-            raise RuntimeError("Code unable to detect when subject is in air "
-                               "properly")
-        else:
-            in_air_bool = force < threshold
-            start_in_air = []
-            end_in_air = []
-            for ii in range(len(in_air_bool)-1):
-                if (not in_air_bool[ii]) and \
-                        (in_air_bool[ii+1]):
-                    start_in_air.append(ii+1)
-                elif (in_air_bool[ii]) and \
-                        (not in_air_bool[ii + 1]):
-                    end_in_air.append(ii)
-                else:
-                    pass
-
-            if (len(start_in_air) == 4 or len(start_in_air) == 3) and \
-                    len(end_in_air) == 3:
-                pass_val = 1
-            else:
-                threshold += 5
-
-    contact_1 = [0, start_in_air[0]]
-    contact_2 = [end_in_air[0], start_in_air[1]]
-    contact_3 = [end_in_air[1], start_in_air[2]]
-    if len(start_in_air) == 4:
-        contact_4 = [end_in_air[2], start_in_air[3]]
-        off_force_plate = 1
-    else:
-        contact_4 = [end_in_air[2], force.shape[0] - 1]
-        off_force_plate = 0
 
-    return contact_1, contact_2, contact_3, contact_4, off_force_plate
+def find_transitions(bool_values):
+    """
+    This function finds where a boolean series switches value.
+
+    Arguments:
+        1. bool_values: array of booleans (array)
+    Returns:
+        1. rising: indexes of the last False value before each switch
+        to True (array of int)
+        2. falling: indexes of the last True value before each switch
+        to False (array of int)
+    """
+    bool_values = np.asarray(bool_values, dtype=bool)
+    switches = np.diff(bool_values.view(np.int8))
+    rising = np.flatnonzero(switches == 1)
+    falling = np.flatnonzero(switches == -1)
+    return rising, falling
 
 
 def find_ground_angle(force_x, force_y, force_z):
     """
     This function finds the relative angle of each leg to the ground.
+    Samples with no force at all are given an angle of 0.
 
     Arguments:
         1. force_x: column of force data in x direction (df)
         2. force_y: column of force data in y direction/vertical (df)
         3. force_z: column of force data in z direction (df)
     Returns:
-        1. ground_angle: list of ground angle values (list of floats)
-    """
-    xz = force_x ** 2 + force_z ** 2
-    ground_angle = []
-    for ii in range(len(force_x)):
-        ground_angle.append(
-            (
-                np.arctan(force_y[ii] / np.sqrt(xz[ii]))
-                ) * 180/np.pi
-            )
+        1. ground_angle: ground angle values in degrees (array of floats)
+    """
+    force_y = np.asarray(force_y, dtype=np.float64)
+    ground_angle = np.empty(force_y.shape[0], dtype=np.float64)
+    np.hypot(force_x, force_z, out=ground_angle)
+    np.arctan2(force_y, ground_angle, out=ground_angle)
+    np.degrees(ground_angle, out=ground_angle)
     return ground_angle
 
 
-def find_static_indexes(force_prime, contact_1, contact_2,
-                        contact_3, contact_4):
+def find_force_prime(force, dt):
+    """
+    This function finds the derivative of force using a forward
+    difference. The last value is repeated so the derivative has the
+    same length as force.
+
+    Arguments:
+        1. force: column of force values from dataframe (df)
+        2. dt: time between samples (float)
+    Returns:
+        1. force_prime: derivative of force (array of floats)
+    """
+    force = np.asarray(force, dtype=np.float64)
+    force_prime = np.empty(force.shape[0], dtype=np.float64)
+    np.subtract(force[1:], force[:-1], out=force_prime[:-1])
+    force_prime[:-1] /= dt
+    force_prime[-1] = force_prime[-2]
+    return force_prime
+
+
+@profiled('find_static_indexes')
+def find_static_indexes(force_prime, *contacts):
     """
     This function finds periods of time where subject is static/still.
     Static is defined by the the absolute value of the derivative of
-    force is less than 200.
+    force is less than 200 while the subject is in contact with the
+    ground.
 
     Arguements:
-        1. force_prime: column of the derivative of force (df)
-        2-5. contact_1-4: list of start and stop for each contact (list
+        1. force_prime: column of the derivative of force (df or array)
+        2-. contacts: list of start and stop for each contact (list
         of int)
     Returns:
-        1. static_start: list of indexes where static periods start (list
+        1. static_start: indexes where static periods start (array
         of int)
-        2. end_static: list of indexes where static periods end (list
+        2. end_static: indexes where static periods end (array
         of int)
     """
-    static_bool = []
-    for ii in range(len(force_prime)):
-        if ii < contact_2[0]:
-            is_static = contact_1[1]
-        elif contact_2[0] <= ii < contact_3[0]:
-            is_static = contact_2[1]
-        elif contact_3[0] <= ii < contact_4[0]:
-            is_static = contact_3[1]
-        else:
-            is_static = contact_4[1]
+    force_prime = np.asarray(force_prime, dtype=float).ravel()
 
-        if abs(force_prime.iloc[ii][0]) < 200 and ii < is_static:
-            static_bool.append(True)
-        else:
-            static_bool.append(False)
-
-    start_static = []
-    end_static = []
-    for ii in range(len(static_bool)-1):
-        if (not static_bool[ii]) and \
-                (static_bool[ii + 1]):
-            start_static.append(ii)
-        elif (static_bool[ii]) and \
-                (not static_bool[ii + 1]):
-            end_static.append(ii)
-        else:
-            pass
+    # Mask of samples inside a contact range
+    in_contact = np.zeros(force_prime.shape[0], dtype=bool)
+    for contact in contacts:
+        in_contact[contact[0]:contact[1]] = True
+
+    static_bool = (np.abs(force_prime) < 200) & in_contact
+
+    start_static, end_static = find_transitions(static_bool)
 
     return start_static, end_static
 
@@ -395,45 +514,47 @@ def find_static_period(start_vals, end_vals):
     This function finds the largest period where subject is static.
 
     Arguments:
-        1. start_vals: List of indexes where subject transitions from
-        moving to static
-        2. end_vals: List of indexes where subject transitions from static
-        to moving
+        1. start_vals: indexes where subject transitions from
+        moving to static (array of int)
+        2. end_vals: indexes where subject transitions from static
+        to moving (array of int)
     Returns:
         1. start_index: index where the largest static period starts (int)
-        2. end_index: index where the largest static period ends
-    """
-    static_period = []
-    if start_vals[0] > end_vals[0]:
-        for ii in range(len(end_vals)-1):
-            static_period.append(end_vals[ii + 1]-start_vals[ii])
-        max_index = static_period.index(max(static_period))
-        start_index = start_vals[max_index]
-        end_index = end_vals[max_index + 1]
-    else:
-        for ii in range(len(end_vals)):
-            static_period.append(end_vals[ii] - start_vals[ii])
-        max_index = static_period.index(max(static_period))
-        start_index = start_vals[max_index]
-        end_index = end_vals[max_index]
+        2. end_index: index where the largest static period ends (int)
+    """
+    start_vals = np.asarray(start_vals)
+    end_vals = np.asarray(end_vals)
+
+    # Skip the first end value if the contact starts static
+    offset = 1 if start_vals[0] > end_vals[0] else 0
+    n_periods = len(end_vals) - offset
+    static_period = end_vals[offset:] - start_vals[:n_periods]
+
+    max_index = int(np.argmax(static_period))
+    start_index = int(start_vals[max_index])
+    end_index = int(end_vals[max_index + offset])
 
     return start_index, end_index
 
 
+@profiled('contact_event_finder')
 def contact_event_finder(force, force_prime, contact_number,
-                         contact_index_range, cutoff):
+                         contact_index_range, cutoff, n_contacts=4):
     """
     This functions finds the start and stop indexes for following:
     event/total jump, eccentric phase, and concentric phase.
 
     Arguments:
         1. force: column of force data from dataframe (df)
-        2. force_prime: column of the derivative of force (df)
-        3. contact_number: which contact number it is (from 1-4) (int)
+        2. force_prime: derivative of force (array)
+        3. contact_number: which contact number it is (from 1 to
+        n_contacts) (int)
         4. contact_index_range: list of start and stop index of the
         contact (list w/ int)
         5. cutoff: index to split contact into two sections in order to
         find end point of the first section and starts on the seconds (int)
+        6. n_contacts: number of contacts in the trial, one more than
+        the number of jumps (int)
 
     Returns:
         1. event_start: index of when the total jump starts (returned
@@ -448,74 +569,100 @@ def contact_event_finder(force, force_prime, contact_number,
     """
     start = contact_index_range[0]
     end = contact_index_range[1]
-    force_unloading = force_prime < -200
+    force = np.asarray(force, dtype=float)
 
     if contact_number == 1:
-        eccentric_pk = force[start:end].max()
-        concentric_start = force[force == eccentric_pk].index[0]
-
-        eccentric_min = force[start:concentric_start].min()
-        eccentric_start = force[force == eccentric_min].index[0]
-
-        find_event_start = []
-        for ii in range(start, eccentric_start-10):
-            if (force_unloading[ii]) and (ii == 0):
-                find_event_start.append(ii)
-            elif (not force_unloading[ii]) and \
-                    (force_unloading[ii+1]):
-                find_event_start.append(ii)
-            else:
-                pass
+        eccentric_start, concentric_start = find_phase_starts(force, start,
+                                                              end)
+        event_starts, _ = find_unloading_edges(force_prime, start,
+                                               eccentric_start - 10)
+        if start == 0 and force_prime[0] < -200:
+            event_starts = np.insert(event_starts, 0, 0)
 
-        event_start = find_event_start[0]
+        event_start = int(event_starts[0])
 
         return event_start, eccentric_start, concentric_start
 
-    elif contact_number == 2 or contact_number == 3:
-        eccentric_pk = force[cutoff:end].max()
-        concentric_start = force[force == eccentric_pk].index[0]
-
-        eccentric_min = force[cutoff:concentric_start].min()
-        eccentric_start = force[force == eccentric_min].index[0]
-
-        find_event_end = []
-        find_event_start = []
-        for ii in range(start, eccentric_start - 10):
-            if (force_unloading[ii]) and \
-                    (not force_unloading[ii + 1]) \
-                    and (ii < cutoff):
-                find_event_end.append(ii)
-            elif (not force_unloading[ii]) and \
-                    (force_unloading[ii+1]) \
-                    and (ii > cutoff):
-                find_event_start.append(ii)
-            else:
-                pass
-
-        event_end = 0
-        for ii in range(find_event_end[-1] + 100, cutoff):
-            if abs(force_prime[ii]) < 1:
-                event_end = ii
-                break
-            else:
-                pass
-        if event_end == 0:
+    elif contact_number < n_contacts:
+        eccentric_start, concentric_start = find_phase_starts(force, cutoff,
+                                                              end)
+        event_starts, event_ends = find_unloading_edges(
+            force_prime, start, eccentric_start - 10)
+
+        event_end = find_settled_index(
+            force_prime, event_ends[event_ends < cutoff][-1] + 100, cutoff)
+        if event_end is None:
             raise ValueError("Code could not identify end of jump correctly. "
                              "Check contact %f" % int(contact_number))
 
-        event_start = find_event_start[0]
+        event_start = int(event_starts[event_starts > cutoff][0])
 
         return event_end, event_start, eccentric_start, concentric_start
 
-    elif contact_number == 4:
-        find_event_end = []
-        for ii in range(start+100, cutoff):
-            if (force_unloading[ii]) and \
-                    (not force_unloading[ii+1]):
-                find_event_end.append(ii)
-            else:
-                pass
+    else:
+        _, event_ends = find_unloading_edges(force_prime, start + 100, cutoff)
 
-        event_end = find_event_end[-1]
+        event_end = int(event_ends[-1])
 
         return event_end
+
+
+def find_phase_starts(force, start, end):
+    """
+    This function finds the start of the eccentric and concentric
+    phases within a section of a contact. The concentric phase starts
+    at the peak force and the eccentric phase at the lowest force
+    before it.
+
+    Arguments:
+        1. force: total vertical force (array)
+        2. start: index where the section starts (int)
+        3. end: index where the section ends (int)
+    Returns:
+        1. eccentric_start: index of start of eccentric phase (int)
+        2. concentric_start: index of start of concentric phase (int)
+    """
+    concentric_start = start + int(np.argmax(force[start:end]))
+    eccentric_start = start + int(np.argmin(force[start:concentric_start]))
+    return eccentric_start, concentric_start
+
+
+def find_unloading_edges(force_prime, start, stop):
+    """
+    This function finds where the subject starts and stops unloading
+    (derivative of force below -200) between two indexes.
+
+    Arguments:
+        1. force_prime: derivative of force (array)
+        2. start: first index to check (int)
+        3. stop: index to stop checking at (int)
+    Returns:
+        1. unloading_starts: indexes of the last sample before unloading
+        starts (array of int)
+        2. unloading_ends: indexes of the last unloading sample (array
+        of int)
+    """
+    force_unloading = np.asarray(force_prime[start:max(start, stop) + 1]) \
+        < -200
+    unloading_starts, unloading_ends = find_transitions(force_unloading)
+    return unloading_starts + start, unloading_ends + start
+
+
+def find_settled_index(force_prime, start, stop):
+    """
+    This function finds the first index where force is steady again
+    (absolute derivative of force below 1) between two indexes.
+
+    Arguments:
+        1. force_prime: derivative of force (array)
+        2. start: first index to check (int)
+        3. stop: index to stop checking at (int)
+    Returns:
+        1. settled_index: first steady index, or None if there is
+        none (int)
+    """
+    start = max(start, 0)
+    settled = np.flatnonzero(np.abs(force_prime[start:stop]) < 1)
+    if settled.size == 0:
+        return None
+    return start + int(settled[0])
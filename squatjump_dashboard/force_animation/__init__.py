@@ -0,0 +1 @@
+from .force_animation import create_force_animation, force_vectors
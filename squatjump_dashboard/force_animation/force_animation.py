@@ -0,0 +1,133 @@
+"""
+force_animation.py
+    This file contains the 3D animation of the ground force vector of
+    each leg during a jump, shown on the home page. The animation is
+    one Plotly (WebGL) figure: the path of the tip of the force vector
+    and the vector itself, moved by client side frames with a play
+    button and a time slider. Frames only hold the vector, so the
+    figure is small, and it is built once per trial, jump and leg.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+from squatjump_dashboard.plot_data import plot_data
+from squatjump_dashboard.squat_jump_utils.squat_jump_utils import LEG_PLATES
+
+FRAME_STEP = 4  # Fewest samples between frames
+MAX_FRAMES = 200  # Most frames of an animation
+FRAME_DURATION = 20  # Time each frame is shown (ms)
+COLOR_SCALE = 'Plotly3'  # Color scale of the vertical force
+
+
+def force_vectors(data, index, jump, leg):
+    """
+    This function returns the ground force vector of one leg during
+    the event of a jump.
+    Arguments:
+        1. data: processed data from process_data (df)
+        2. index: index table from process_data (df)
+        3. jump: jump number, from 1 (int)
+        4. leg: 'left' or 'right' (str)
+    Return:
+        1. time: time of each sample (array)
+        2. vectors: force along the plate z, x and vertical axes, one
+            row per sample (array)
+    """
+    if leg not in LEG_PLATES:
+        raise ValueError('leg must be left or right')
+    plate = 'ground_force' + LEG_PLATES[leg] + '_v'
+    start = int(index['Jump ' + str(jump) + ' Start']['Event'])
+    end = int(index['Jump ' + str(jump) + ' End']['Event'])
+    window = data.iloc[start:end + 1]
+    vectors = np.column_stack([window[plate + 'z'].to_numpy(),
+                               window[plate + 'x'].to_numpy(),
+                               window[plate + 'y'].to_numpy()])
+    return window['time'].to_numpy(), vectors
+
+
+def create_force_animation(data, index, jump, leg):
+    """
+    This function returns the force vector animation of one leg during
+    a jump. Animations are cached per trial, jump and leg (see
+    plot_data.py), and each call returns a new figure.
+    Arguments:
+        1. data: processed data from process_data (df)
+        2. index: index table from process_data (df)
+        3. jump: jump number, from 1 (int)
+        4. leg: 'left' or 'right' (str)
+    Return:
+        1. fig: animated Plotly figure
+    """
+    return plot_data(data).figure(
+        ('force_animation', int(jump), leg),
+        lambda: force_animation_figure(*force_vectors(data, index, jump,
+                                                      leg),
+                                       title='3D Force Plot for Jump ' +
+                                       str(jump) + ' [' + leg + ']'))
+
+
+def force_animation_figure(time, vectors, title=''):
+    """
+    This function builds the force vector animation.
+    Arguments:
+        1. time: time of each sample (array)
+        2. vectors: force along the plate z, x and vertical axes, one
+            row per sample (array)
+        3. title: title of the figure (str)
+    Return:
+        1. fig: animated Plotly figure
+    """
+    step = max(FRAME_STEP, -(-len(time) // MAX_FRAMES))
+    frames_at = np.arange(0, len(time), step)
+    vertical = vectors[:, 2]
+    color_range = dict(cmin=float(vertical.min()),
+                       cmax=float(vertical.max()), colorscale=COLOR_SCALE)
+
+    # The first vector holds the style, frames only move its tip
+    def vector_tip(row):
+        tip = np.round(vectors[row], 1)
+        color = [tip[2], tip[2]]
+        return dict(type='scatter3d', x=[0, tip[0]], y=[0, tip[1]],
+                    z=[0, tip[2]], line=dict(color=color),
+                    marker=dict(color=color))
+
+    vector = vector_tip(0)
+    vector.update(mode='lines+markers', showlegend=False, hoverinfo='skip')
+    vector['line'].update(width=6, **color_range)
+    vector['marker'].update(size=[0, 4], **color_range,
+                            colorbar=dict(title='Force (N)', len=0.6))
+
+    # Path of the tip of the vector, then the vector
+    path = np.round(vectors[frames_at], 1)
+    frames = [dict(data=[vector_tip(row)], traces=[1],
+                   name='%.3f' % time[row]) for row in frames_at]
+    fig = go.Figure(data=[dict(type='scatter3d', x=path[:, 0],
+                               y=path[:, 1], z=path[:, 2], mode='lines',
+                               showlegend=False, hoverinfo='skip',
+                               line=dict(color='lightgray')), vector],
+                    frames=frames)
+
+    # Axes fit the whole path so they do not move between frames
+    limits = [[min(0, value.min()) - 1, max(0, value.max()) + 1]
+              for value in vectors.T]
+    play = dict(frame=dict(duration=FRAME_DURATION, redraw=True),
+                fromcurrent=True, mode='immediate')
+    fig.update_layout(
+        title=title, height=500, margin=dict(l=0, r=0, t=40, b=0),
+        scene=dict(xaxis=dict(title='X Axis (N)', range=limits[0]),
+                   yaxis=dict(title='Y Axis (N)', range=limits[1]),
+                   zaxis=dict(title='Force Magnitude (N)',
+                              range=limits[2]),
+                   aspectmode='cube'),
+        updatemenus=[dict(type='buttons', showactive=False, x=0, y=0,
+                          buttons=[dict(label='Play', method='animate',
+                                        args=[None, play])])],
+        sliders=[dict(currentvalue=dict(prefix='Time (s): '),
+                      pad=dict(t=30),
+                      steps=[dict(method='animate', label=frame['name'],
+                                  args=[[frame['name']],
+                                        dict(mode='immediate',
+                                             frame=dict(duration=0,
+                                                        redraw=True))])
+                             for frame in frames])])
+    return fig
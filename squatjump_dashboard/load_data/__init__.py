@@ -0,0 +1 @@
+from .load_data import load_data
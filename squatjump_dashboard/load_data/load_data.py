@@ -0,0 +1,130 @@
+"""
+load_data.py
+    This file contains the loader for squat jump CSV exports from
+    the force plates. The header block of the export is parsed to
+    validate the file shape before any data is read, and the data
+    is parsed with the pyarrow CSV reader using explicit float
+    columns. Columns that clean_data drops are skipped by default.
+"""
+import io
+import os
+
+import pyarrow as pa
+from pyarrow import csv
+
+from squatjump_dashboard.profiling import profiled
+
+# Number of lines before the column names in a force plate export
+HEADER_LINES = 6
+
+# Columns of a force plate export, in file order
+RAW_COLUMNS = ['time',
+               'ground_force1_vx', 'ground_force1_vy', 'ground_force1_vz',
+               'ground_force1_px', 'ground_force1_py', 'ground_force1_pz',
+               'ground_torque1_x', 'ground_torque1_y', 'ground_torque1_z',
+               'ground_force2_vx', 'ground_force2_vy', 'ground_force2_vz',
+               'ground_force2_px', 'ground_force2_py', 'ground_force2_pz',
+               'ground_torque2_x', 'ground_torque2_y', 'ground_torque2_z']
+
+# Columns that are not used to process a trial
+DROPPED_COLUMNS = ['ground_force1_py', 'ground_torque1_x',
+                   'ground_torque1_y', 'ground_torque1_z',
+                   'ground_force2_py', 'ground_torque2_x',
+                   'ground_torque2_y', 'ground_torque2_z']
+
+# Columns used to process a trial, in file order
+USED_COLUMNS = [col for col in RAW_COLUMNS if col not in DROPPED_COLUMNS]
+
+
+@profiled('load_data')
+def load_data(source, columns=None):
+    """
+    This function reads a force plate CSV export into a dataframe.
+    The header block is checked first so malformed files are rejected
+    without parsing their data.
+    Arguments:
+        1. source: path to the CSV file, or a file-like object such as
+            a streamlit upload
+        2. columns: list of columns to read, defaults to USED_COLUMNS
+    Return:
+        1. data: dataframe of float64 columns in file order
+    """
+    if columns is None:
+        columns = USED_COLUMNS
+    unknown = [col for col in columns if col not in RAW_COLUMNS]
+    if len(unknown) > 0:
+        raise ValueError('Unknown columns requested: ' + str(unknown))
+
+    content = read_bytes(source)
+    header = read_header(content)
+
+    # Parse data in one block with explicit types
+    table = csv.read_csv(
+        io.BytesIO(content),
+        read_options=csv.ReadOptions(skip_rows=HEADER_LINES,
+                                     block_size=max(len(content), 1)),
+        convert_options=csv.ConvertOptions(
+            include_columns=[col for col in RAW_COLUMNS if col in columns],
+            column_types={col: pa.float64() for col in columns}))
+
+    if table.num_rows != header['nRows']:
+        raise ValueError('Squat jump CSV file has ' + str(table.num_rows) +
+                         ' rows but its header states ' +
+                         str(header['nRows']) + ' rows')
+
+    return table.to_pandas()
+
+
+def read_header(content):
+    """
+    This function parses and validates the header block of a force
+    plate export.
+    Arguments:
+        1. content: raw bytes of the CSV file, or at least of its
+            header block and column names
+    Return:
+        1. header: dict of header values, with nRows and nColumns as
+            int
+    """
+    lines = content.decode('utf-8-sig', errors='replace') \
+        .splitlines()[:HEADER_LINES + 1]
+    if len(lines) <= HEADER_LINES or \
+            lines[HEADER_LINES - 1].split(',')[0] != 'endheader':
+        raise ValueError('Squat jump CSV file is missing its header block')
+
+    header = {}
+    for line in lines[1:HEADER_LINES - 1]:
+        key, _, value = line.split(',')[0].partition('=')
+        header[key] = value
+    try:
+        header['nRows'] = int(header['nRows'])
+        header['nColumns'] = int(header['nColumns'])
+    except (KeyError, ValueError):
+        raise ValueError('Squat jump CSV header has no valid nRows and '
+                         'nColumns')
+
+    # Check shape from header before reading any data
+    if header['nColumns'] != len(RAW_COLUMNS):
+        raise ValueError("Squat jump CSV file has incorrect number of "
+                         "columns")
+    if lines[HEADER_LINES].strip().split(',') != RAW_COLUMNS:
+        raise ValueError('Squat jump CSV file has incorrect column names')
+
+    return header
+
+
+def read_bytes(source):
+    """
+    This function returns the raw bytes of a path or file-like object.
+    Arguments:
+        1. source: path or file-like object
+    Return:
+        1. content: contents of the file (bytes)
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as source_file:
+            return source_file.read()
+    elif hasattr(source, 'getvalue'):
+        return source.getvalue()
+    else:
+        return source.read()
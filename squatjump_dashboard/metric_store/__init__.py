@@ -0,0 +1 @@
+from .metric_store import MetricStore, patient_id
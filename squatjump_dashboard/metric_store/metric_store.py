@@ -0,0 +1,223 @@
+"""
+metric_store.py
+    This file contains the longitudinal store of jump metrics used to
+    follow a patient across sessions. The calculation results of each
+    processed trial are written to a SQLite database file, one row per
+    session and one row per jump, indexed by patient and session date.
+    Trends across many sessions are then read from the stored metrics
+    without reading or processing force plate data again.
+"""
+import contextlib
+import datetime
+import os
+import sqlite3
+
+import pandas as pd
+
+from squatjump_dashboard.pipeline_cache.pipeline_cache import pipeline_version
+from squatjump_dashboard.process_data.process_data import METRIC_COLUMNS
+
+# Aggregates of the jumps of a session, by name
+AGGREGATES = {'mean': 'AVG', 'max': 'MAX', 'min': 'MIN'}
+
+
+def quoted(name):
+    """Return a column name quoted for SQL (metric names hold '(')"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS sessions (
+        session_id INTEGER PRIMARY KEY,
+        patient TEXT NOT NULL,
+        session_date TEXT NOT NULL,
+        trial TEXT NOT NULL,
+        trial_key TEXT UNIQUE,
+        pipeline_version TEXT)""",
+    """CREATE INDEX IF NOT EXISTS sessions_by_patient
+        ON sessions (patient, session_date)""",
+    """CREATE TABLE IF NOT EXISTS jumps (
+        session_id INTEGER NOT NULL REFERENCES sessions (session_id),
+        jump INTEGER NOT NULL, """ +
+    ', '.join(quoted(column) + ' REAL' for column in METRIC_COLUMNS) + """,
+        PRIMARY KEY (session_id, jump))"""]
+
+
+class MetricStore:
+    """
+    SQLite file of the jump metrics of every stored session. Each call
+        opens its own connection, so a store can be shared by the
+        sessions (threads) of the dashboard and by other processes.
+    """
+
+    def __init__(self, path):
+        """
+        Open the store, creating the database file if missing.
+        Argument:
+            path: path of the SQLite file (str)
+        """
+        self.path = path
+        self.version = pipeline_version()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self.connect() as connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+
+    @contextlib.contextmanager
+    def connect(self):
+        """Open a connection, committing on success and always closing"""
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def add_session(self, patient, calculations, session_date=None,
+                    trial='', key=None):
+        """
+        Store the calculation results of a trial as a session. A trial
+        stored again with the same key replaces the earlier session.
+        Arguments:
+            1. patient: patient identifier (str)
+            2. calculations: calculation results of each jump, as from
+                process_data (df)
+            3. session_date: date of the session (date or ISO str),
+                defaults to today
+            4. trial: name of the trial file (str)
+            5. key: optional key of the trial, e.g. from trial_key
+        Return:
+            1. session_id: identifier of the stored session (int)
+        """
+        if str(patient).strip() == '':
+            raise ValueError('A patient identifier is needed')
+        missing = set(METRIC_COLUMNS) - set(calculations.columns)
+        if missing:
+            raise ValueError('Calculations are missing columns: ' +
+                             ', '.join(sorted(missing)))
+        if session_date is None:
+            session_date = datetime.date.today()
+        session_date = pd.Timestamp(session_date).date().isoformat()
+
+        rows = [(int(jump),) + tuple(values) for jump, values in
+                zip(calculations.index,
+                    calculations[METRIC_COLUMNS].astype(float).to_numpy()
+                    .tolist())]
+        with self.connect() as connection:
+            if key is not None:
+                for (session_id,) in connection.execute(
+                        'SELECT session_id FROM sessions WHERE trial_key = ?',
+                        (key,)).fetchall():
+                    self._remove(connection, session_id)
+            session_id = connection.execute(
+                'INSERT INTO sessions (patient, session_date, trial, '
+                'trial_key, pipeline_version) VALUES (?, ?, ?, ?, ?)',
+                (str(patient).strip(), session_date, trial, key,
+                 self.version)).lastrowid
+            connection.executemany(
+                'INSERT INTO jumps (session_id, jump, ' +
+                ', '.join(quoted(column) for column in METRIC_COLUMNS) +
+                ') VALUES (' + ', '.join(['?'] * (len(METRIC_COLUMNS) + 2)) +
+                ')',
+                [(session_id,) + row for row in rows])
+        return session_id
+
+    def remove_session(self, session_id):
+        """
+        Remove a stored session and its jumps.
+        Argument:
+            session_id: identifier of the session (int)
+        """
+        with self.connect() as connection:
+            self._remove(connection, session_id)
+
+    @staticmethod
+    def _remove(connection, session_id):
+        """Remove a session within an open connection"""
+        connection.execute('DELETE FROM jumps WHERE session_id = ?',
+                           (session_id,))
+        connection.execute('DELETE FROM sessions WHERE session_id = ?',
+                           (session_id,))
+
+    def patients(self):
+        """Return the identifiers of the stored patients, sorted"""
+        with self.connect() as connection:
+            return [patient for (patient,) in connection.execute(
+                'SELECT DISTINCT patient FROM sessions ORDER BY patient')]
+
+    def sessions(self, patient):
+        """
+        Return the stored sessions of a patient, by date.
+        Argument:
+            patient: patient identifier (str)
+        Return:
+            1. sessions: session_id, session_date, trial, number of
+                jumps and pipeline_version of each session (df)
+        """
+        with self.connect() as connection:
+            sessions = pd.read_sql_query(
+                'SELECT s.session_id, s.session_date, s.trial, '
+                'COUNT(j.jump) AS jumps, s.pipeline_version '
+                'FROM sessions AS s LEFT JOIN jumps AS j '
+                'ON j.session_id = s.session_id WHERE s.patient = ? '
+                'GROUP BY s.session_id ORDER BY s.session_date, s.session_id',
+                connection, params=(patient,))
+        sessions['session_date'] = pd.to_datetime(sessions['session_date'])
+        return sessions
+
+    def trends(self, patient, metrics=None, aggregate='mean'):
+        """
+        Return the stored metrics of a patient across sessions, by date.
+        Arguments:
+            1. patient: patient identifier (str)
+            2. metrics: metric columns to return (see METRIC_COLUMNS),
+                defaults to all of them
+            3. aggregate: 'mean', 'max' or 'min' of the jumps of each
+                session (one row per session), or None for one row per
+                jump
+        Return:
+            1. trends: session_id, session_date, trial, jump (if not
+                aggregated) and the metrics (df)
+        """
+        if metrics is None:
+            metrics = METRIC_COLUMNS
+        unknown = [metric for metric in metrics
+                   if metric not in METRIC_COLUMNS]
+        if unknown:
+            raise ValueError('Unknown metrics: ' + ', '.join(unknown))
+        if aggregate is not None and aggregate not in AGGREGATES:
+            raise ValueError('Aggregate can only be one of ' +
+                             ', '.join(AGGREGATES) + ' or None')
+
+        if aggregate is None:
+            columns = ['j.jump'] + ['j.' + quoted(metric)
+                                    for metric in metrics]
+            group = ''
+        else:
+            columns = [AGGREGATES[aggregate] + '(j.' + quoted(metric) +
+                       ') AS ' + quoted(metric) for metric in metrics]
+            group = ' GROUP BY s.session_id'
+        order = ' ORDER BY s.session_date, s.session_id' + \
+            (', j.jump' if aggregate is None else '')
+        with self.connect() as connection:
+            trends = pd.read_sql_query(
+                'SELECT s.session_id, s.session_date, s.trial, ' +
+                ', '.join(columns) + ' FROM sessions AS s JOIN jumps AS j '
+                'ON j.session_id = s.session_id WHERE s.patient = ?' +
+                group + order, connection, params=(patient,))
+        trends['session_date'] = pd.to_datetime(trends['session_date'])
+        return trends
+
+
+def patient_id(path):
+    """
+    This function returns the patient identifier of a trial file, the
+    part of its name before the first '_' (e.g. 'BFR003' for
+    BFR003_squat_jump.csv).
+    Argument:
+        path: path or name of the trial file (str)
+    Return:
+        1. patient: patient identifier (str)
+    """
+    return os.path.basename(path).split('_')[0].split('.')[0]
@@ -0,0 +1,2 @@
+from .pipeline_cache import PipelineCache, trial_key
+from .pipeline_cache import ParquetCache, frame_key
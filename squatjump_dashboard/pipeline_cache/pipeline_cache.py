@@ -0,0 +1,287 @@
+"""
+pipeline_cache.py
+    This file contains a memoization layer for the results of
+    process_data. Results are keyed by a hash of the uploaded file
+    contents plus the pipeline parameters, so reruns of the dashboard
+    on the same upload do not clean and process the data again.
+    Entries are evicted least recently used first once either the
+    entry limit or the memory cap is reached.
+    Results can also be persisted to a directory of Parquet files
+    that survives restarts and can be shared by several workers.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from squatjump_dashboard.clean_data.clean_data import FILTER_CUTOFF
+from squatjump_dashboard.clean_data.clean_data import FILTER_ORDER
+from squatjump_dashboard.clean_data.clean_data import SAMPLE_RATE
+from squatjump_dashboard.validate_data import ValidatedTrial
+
+# Parameters that change the output of the pipeline
+PIPELINE_PARAMS = {'filter_cutoff': FILTER_CUTOFF,
+                   'filter_order': FILTER_ORDER,
+                   'sample_rate': SAMPLE_RATE}
+
+
+# Source files whose changes invalidate persisted results: the pipeline
+# and the modules deciding which columns, dtypes and rows reach it
+PIPELINE_SOURCES = [os.path.join('load_data', 'load_data.py'),
+                    os.path.join('validate_data', 'validate_data.py'),
+                    os.path.join('clean_data', 'clean_data.py'),
+                    os.path.join('process_data', 'process_data.py')]
+
+# Files written for each persisted trial, in process_data return order
+PARQUET_FILES = ['data.parquet', 'index.parquet', 'calculations.parquet']
+
+
+def trial_key(content, params=None):
+    """
+    This function creates a cache key for a trial from the raw bytes
+    of its file and the pipeline parameters.
+    Arguments:
+        1. content: raw bytes of the uploaded file (bytes)
+        2. params: pipeline parameters (dict), defaults to
+            PIPELINE_PARAMS
+    Return:
+        1. key: hex digest identifying the trial and parameters (str)
+    """
+    if params is None:
+        params = PIPELINE_PARAMS
+    digest = hashlib.sha256(content)
+    digest.update(repr(sorted(params.items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def frame_key(data):
+    """
+    This function creates a cache key for a trial that is already read
+    into a dataframe, from its column names and values.
+    Arguments:
+        1. data: raw squat jump dataframe
+    Return:
+        1. key: hex digest identifying the trial (str)
+    """
+    digest = hashlib.sha256(repr(list(data.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy())
+    return digest.hexdigest()
+
+
+def pipeline_version(params=None):
+    """
+    This function identifies the version of the pipeline from the
+    source code of PIPELINE_SOURCES (load_data.py, validate_data.py,
+    clean_data.py and process_data.py) and the pipeline parameters.
+    Any change to either gives a new version.
+    Arguments:
+        1. params: pipeline parameters (dict), defaults to
+            PIPELINE_PARAMS
+    Return:
+        1. version: short hex digest (str)
+    """
+    if params is None:
+        params = PIPELINE_PARAMS
+    package_dir = os.path.dirname(os.path.dirname(__file__))
+    digest = hashlib.sha256(repr(sorted(params.items())).encode('utf-8'))
+    for source in PIPELINE_SOURCES:
+        with open(os.path.join(package_dir, source), 'rb') as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()[:16]
+
+
+def result_nbytes(value):
+    """
+    This function estimates the memory used by a cached value.
+    DataFrames and arrays are measured directly, tuples, lists, dicts
+    (such as Plotly figure dicts) and validated trials are summed,
+    strings count their length, numbers 8 bytes and other values
+    nothing.
+    Arguments:
+        1. value: cached value
+    Return:
+        1. nbytes: estimated size in bytes (int)
+    """
+    if isinstance(value, (tuple, list)):
+        return sum(result_nbytes(item) for item in value)
+    elif isinstance(value, dict):
+        return sum(result_nbytes(item) for item in value.values())
+    elif isinstance(value, (str, bytes)):
+        return len(value)
+    elif isinstance(value, (int, float, np.generic)):
+        return 8
+    elif isinstance(value, ValidatedTrial):
+        return result_nbytes(value.data)
+    elif isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    elif isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    elif isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    else:
+        return 0
+
+
+class PipelineCache:
+    """
+    Least recently used cache of pipeline results, bounded by a number
+        of entries and by the estimated memory of the stored results.
+        Safe to share between dashboard sessions.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=512 * 2 ** 20):
+        """
+        Initialize an empty cache.
+        Arguments:
+            1. max_entries: max number of trials kept (int)
+            2. max_bytes: memory cap for all kept results (int)
+        """
+        if max_entries < 1:
+            raise ValueError('max_entries must be at least 1')
+        if max_bytes < 0:
+            raise ValueError('max_bytes can not be negative')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return number of cached trials"""
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """Return if a key is cached"""
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for a key and mark it as recently used.
+        Arguments:
+            1. key: cache key from trial_key
+            2. default: value returned if key is not cached
+        """
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        """
+        Store a value, evicting least recently used entries until the
+        cache fits its limits. Values larger than the memory cap are
+        not stored.
+        Arguments:
+            1. key: cache key from trial_key
+            2. value: result to store
+        """
+        nbytes = result_nbytes(value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while len(self._entries) > self.max_entries or \
+                    self.nbytes > self.max_bytes:
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for a key, computing and storing it
+        first if it is missing.
+        Arguments:
+            1. key: cache key from trial_key
+            2. compute: function without arguments returning the value
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Remove every cached value"""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+class ParquetCache:
+    """
+    Directory of process_data results stored as Parquet files, one
+        sub directory per pipeline version and trial. Results written
+        by another pipeline version are never returned.
+    """
+
+    def __init__(self, directory, version=None):
+        """
+        Initialize the cache in a directory, created if missing.
+        Arguments:
+            1. directory: path of the cache directory (str)
+            2. version: pipeline version (str), defaults to the
+                current pipeline_version()
+        """
+        if version is None:
+            version = pipeline_version()
+        self.directory = directory
+        self.version = version
+        os.makedirs(os.path.join(directory, version), exist_ok=True)
+
+    def path(self, key):
+        """Return directory holding the files of a trial"""
+        return os.path.join(self.directory, self.version, key)
+
+    def get(self, key):
+        """
+        Return the stored process_data results for a key, or None if
+        the trial is not stored.
+        Arguments:
+            1. key: cache key from frame_key
+        """
+        trial_dir = self.path(key)
+        try:
+            return tuple(pd.read_parquet(os.path.join(trial_dir, name))
+                         for name in PARQUET_FILES)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        """
+        Store process_data results for a key. Files are written to a
+        temporary directory first so other workers never read a
+        partially written trial.
+        Arguments:
+            1. key: cache key from frame_key
+            2. result: data, index and calculations dataframes
+        """
+        version_dir = os.path.join(self.directory, self.version)
+        temp_dir = tempfile.mkdtemp(dir=version_dir, prefix='.tmp-')
+        try:
+            for frame, name in zip(result, PARQUET_FILES):
+                frame.to_parquet(os.path.join(temp_dir, name))
+            os.rename(temp_dir, self.path(key))
+        except OSError:
+            # Another worker stored the same trial first
+            pass
+        finally:
+            # Gone once renamed, left behind by any failed write
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def prune(self):
+        """Remove every trial stored by other pipeline versions"""
+        for version in os.listdir(self.directory):
+            version_dir = os.path.join(self.directory, version)
+            if version != self.version and os.path.isdir(version_dir):
+                shutil.rmtree(version_dir, ignore_errors=True)
+
+
+# Marker for missing cache entries
+_MISSING = object()
@@ -0,0 +1,2 @@
+from .plot_data import PlotData, plot_data, figure_buckets, min_max_decimate
+from .plot_data import use_plot_cache
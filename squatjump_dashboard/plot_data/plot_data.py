@@ -0,0 +1,187 @@
+"""
+plot_data.py
+    This file contains the plot data layer used by the time series
+    plots of squat_jump_utils. A line never needs more points than
+    the figure has pixels across, so each series is decimated to the
+    lowest and highest sample of every pixel wide bucket, which keeps
+    the peaks and the shape of the trace. Decimated series are cached
+    per trial and column, so drawing them again costs the same for a
+    trial of any length. Plotted dataframes are expected not to change
+    afterwards, as for a ValidatedTrial.
+    Cached values of every trial share one least recently used cache
+    bounded by a number of entries and by memory (a PipelineCache,
+    which can be the pipeline cache of the dashboard). Figures are
+    cached as figure dicts, and every call gets its own new figure.
+"""
+import itertools
+import threading
+import weakref
+
+import numpy as np
+import plotly.graph_objects as go
+
+from squatjump_dashboard.pipeline_cache import PipelineCache
+
+PLOT_CACHE_ENTRIES = 256  # Default most cached plot values
+PLOT_CACHE_MB = 64  # Default memory cap of the cached plot values (MB)
+
+# Plot data of every dataframe plotted and still in use, by object id
+_plot_data = {}
+_plot_data_lock = threading.Lock()
+# Cache of the plot values of all trials, and the next PlotData number
+_plot_cache = PipelineCache(max_entries=PLOT_CACHE_ENTRIES,
+                            max_bytes=PLOT_CACHE_MB * 2 ** 20)
+_plot_numbers = itertools.count()
+
+
+class PlotData:
+    """
+    Decimated series (and other plot data) of one trial, computed when
+        first requested.
+    """
+
+    def __init__(self, data):
+        """
+        Initialize the plot data of a trial. Only a weak reference to
+        the dataframe is kept so the cache does not keep it alive.
+        Argument:
+            data: dataframe holding a time column
+        """
+        self._data = weakref.ref(data)
+        self._number = next(_plot_numbers)
+
+    @property
+    def data(self):
+        """Return the dataframe, or None if it no longer exists"""
+        return self._data()
+
+    def series(self, column, n_buckets):
+        """
+        Return a column decimated for a plot n_buckets pixels wide.
+        Arguments:
+            1. column: name of the column to plot (str)
+            2. n_buckets: number of buckets, usually the plot width in
+                pixels (int)
+        Return:
+            1. time: time of the kept samples (array)
+            2. values: values of the kept samples (array)
+        """
+        def decimate():
+            data = self.data
+            return min_max_decimate(data['time'].to_numpy(),
+                                    data[column].to_numpy(), n_buckets)
+        return self.cached(('series', column, n_buckets), decimate)
+
+    def cached(self, key, compute):
+        """
+        Return the value cached for this trial under a key, computing
+        and storing it first if it is missing. Cached values are shared,
+        so they must not be changed by callers.
+        Arguments:
+            1. key: hashable key, e.g. a tuple naming the plot and its
+                options
+            2. compute: function without arguments returning the value
+        """
+        return _plot_cache.get_or_compute(('plot_data', self._number, key),
+                                          compute)
+
+    def figure(self, key, build):
+        """
+        Return a new Plotly figure built from the figure dict cached for
+        this trial under a key, building the figure first if it is
+        missing. Callers can change the figure they get freely.
+        Arguments:
+            1. key: hashable key naming the figure and its options
+            2. build: function without arguments returning the figure
+        Return:
+            1. fig: Plotly figure
+        """
+        return go.Figure(self.cached(key, lambda: build().to_dict()))
+
+
+def plot_data(data):
+    """
+    This function returns the cached PlotData of a dataframe, creating
+    it on first use. The cache entry is dropped with the dataframe.
+    Argument:
+        data: dataframe holding a time column
+    Return:
+        1. plot_data: PlotData of the dataframe
+    """
+    key = id(data)
+    with _plot_data_lock:
+        entry = _plot_data.get(key)
+        if entry is None or entry.data is not data:
+            entry = PlotData(data)
+            _plot_data[key] = entry
+            weakref.finalize(data, _forget, key, entry)
+    return entry
+
+
+def use_plot_cache(cache):
+    """
+    This function sets the cache holding the plot values of every
+    trial, e.g. to count them in the memory cap of the pipeline cache.
+    Argument:
+        cache: PipelineCache
+    """
+    global _plot_cache
+    _plot_cache = cache
+
+
+def _forget(key, entry):
+    """Drop the PlotData of a dataframe that no longer exists"""
+    with _plot_data_lock:
+        if _plot_data.get(key) is entry:
+            del _plot_data[key]
+
+
+def figure_buckets(fig):
+    """
+    This function returns the width of a matplotlib figure in pixels,
+    the number of buckets its series are decimated to.
+    Argument:
+        fig: matplotlib figure
+    Return:
+        1. n_buckets: figure width (pixels)
+    """
+    return max(int(round(fig.get_figwidth() * fig.dpi)), 1)
+
+
+def min_max_decimate(x, y, n_buckets):
+    """
+    This function decimates a series to the lowest and highest sample
+    of each of n_buckets buckets of consecutive samples, in their
+    original order. Series with at most two samples per bucket are
+    returned as they are.
+    Arguments:
+        1. x: x values of the series (array)
+        2. y: y values of the series (array)
+        3. n_buckets: number of buckets (int)
+    Return:
+        1. x: x values of the kept samples (array)
+        2. y: y values of the kept samples (array)
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n_samples = y.shape[0]
+    if n_samples <= 2 * n_buckets:
+        return x, y
+
+    # Buckets of equal size, the last one padded with the last sample
+    bucket_size = -(-n_samples // n_buckets)
+    n_buckets = -(-n_samples // bucket_size)
+    padded = np.empty(n_buckets * bucket_size, dtype=y.dtype)
+    padded[:n_samples] = y
+    padded[n_samples:] = y[-1]
+    buckets = padded.reshape(n_buckets, bucket_size)
+
+    # Index of the lowest and highest sample of every bucket, in order
+    offsets = np.arange(n_buckets) * bucket_size
+    lowest = offsets + np.argmin(buckets, axis=1)
+    highest = offsets + np.argmax(buckets, axis=1)
+    kept = np.column_stack([np.minimum(lowest, highest),
+                            np.maximum(lowest, highest)]).ravel()
+    kept = np.minimum(kept, n_samples - 1)
+    kept = kept[np.append(True, kept[1:] != kept[:-1])]
+    return x[kept], y[kept]
@@ -1 +1,2 @@
-from .process_data import process_data
\ No newline at end of file
+from .process_data import process_data
+from .process_data import calculate_metrics, metrics_frame
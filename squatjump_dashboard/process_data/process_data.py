@@ -7,69 +7,65 @@ Return:
     2. index - index table from clean_data.py
     3. calculations - calculation results of each jump
 """
-# import numpy as np
+import numpy as np
 import pandas as pd
 from scipy.stats import linregress
 from squatjump_dashboard.clean_data import clean_data
+from squatjump_dashboard.pipeline_cache import ParquetCache, frame_key
+from squatjump_dashboard.profiling import profiled
+from squatjump_dashboard.validate_data import validate_data
 
 G = 9.80665  # Constant for gravitational acceleration
+MIN_ROWS = 3000  # Fewest rows of a trial
+MAX_ROWS = 600000  # Default most rows of a trial (10 minutes at 1000 Hz)
+
+# Columns of the calculation results, one row per jump
+METRIC_COLUMNS = ['weight(kg)', 'jump_height(cm)', 'takeoff_v(m/s)',
+                  'rate_of_v_acce(m/s^3)', 'jump_time(s)', 'ecce_time(s)',
+                  'conc_time(s)', 'peak_force(N)', 'peak_power(W)',
+                  'avg_power_conc(W)', 'squat_depth(cm)',
+                  'cop_displace_right_x(cm)', 'cop_displace_left_x(cm)',
+                  'cop_displace_right_z(cm)', 'cop_displace_left_z(cm)']
 
 
 # Main Function
-def process_data(data):
+@profiled('process_data')
+def process_data(data, cache_dir=None, max_rows=MAX_ROWS):
     """
     This is the main function that calls on the ProcessData
         object with a passed dataframe containing squat jump data
         from force plates.
-    Argument:
-        1. data: the raw data containing squat jump information.
+    Arguments:
+        1. data: the raw data containing squat jump information, or a
+            ValidatedTrial.
+        2. cache_dir: optional directory where results are persisted
+            as Parquet files. Trials already stored there for the
+            current pipeline version are returned without cleaning.
+        3. max_rows: most rows accepted, or None for no limit. Memory
+            use grows linearly with the number of rows.
     Returns:
         1. data - processed data from clean_data.py
         2. index - index table from clean_data.py
         3. calculations - calculation results of each jump
     """
-
-    # Exception for time column check
-    if 'time' not in data:
-        raise Exception('[time] column is missing in data')
-    time_list = list(data['time'])
-    data_length = len(time_list)
-    for i in range(data_length):
-        if time_list[i] != i / 1000:
-            raise Exception('time frame is discontinuous'
-                            ' or not in millisecond')
+    # Check data (skipped if already validated)
+    data = validate_data(data)
 
     # Exception for row number check
-    if data_length < 3000:
-        raise Exception('data size is less than 3000 rows')
-    if data_length > 30000:
-        raise Exception('data size is large than 50000 rows')
-
-    # Exceptions for column name check
-    if 'ground_force1_vx' not in data:
-        raise Exception('[ground_force1_vx] column is missing in data')
-    if 'ground_force1_vy' not in data:
-        raise Exception('[ground_force1_vy] column is missing in data')
-    if 'ground_force1_vz' not in data:
-        raise Exception('[ground_force1_vz] column is missing in data')
-    if 'ground_force1_px' not in data:
-        raise Exception('[ground_force2_px] column is missing in data')
-    if 'ground_force1_py' not in data:
-        raise Exception('[ground_force2_py] column is missing in data')
-    if 'ground_force1_pz' not in data:
-        raise Exception('[ground_force2_pz] column is missing in data')
-    if 'ground_force2_vx' not in data:
-        raise Exception('[ground_force2_vx] column is missing in data')
-    if 'ground_force2_vy' not in data:
-        raise Exception('[ground_force2_vy] column is missing in data')
-    if 'ground_force2_vz' not in data:
-        raise Exception('[ground_force2_vz] column is missing in data')
-    if 'ground_force2_px' not in data:
-        raise Exception('[ground_force2_px] column is missing in data')
-    if 'ground_force2_py' not in data:
-        raise Exception('[ground_force2_py] column is missing in data')
-    if 'ground_force2_pz' not in data:
-        raise Exception('[ground_force2_pz] column is missing in data')
+    data_length = len(data)
+    if data_length < MIN_ROWS:
+        raise Exception('data size is less than %d rows' % MIN_ROWS)
+    if max_rows is not None and data_length > max_rows:
+        raise ValueError('data size is larger than %d rows (set max_rows '
+                         'to process longer trials)' % max_rows)
+
+    # Return persisted results for this trial if there are any
+    if cache_dir is not None:
+        cache = ParquetCache(cache_dir)
+        key = frame_key(data.data)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
 
     # Creating a Processed Data Object
     processed_data = ProcessData(data)
@@ -80,6 +76,10 @@ def process_data(data):
     index = processed_data.get_index()
     calculations = processed_data.get_calculations()
 
+    # Persist results for later calls
+    if cache_dir is not None:
+        cache.put(key, (data, index, calculations))
+
     # Returning the three DFs
     return data, index, calculations
 
@@ -108,30 +108,23 @@ class ProcessData:
         self.cal_result: pd.DataFrame()
 
         # Extract indexes from index table
-        j = self.jump - 1
-        self.event_start = self.index.iat[0, 2 * j]
-        self.event_end = self.index.iat[0, 2 * j + 1]
-        self.ecce_start = self.index.iat[1, 2 * j]
-        self.ecce_end = self.index.iat[1, 2 * j + 1]
-        self.conc_start = self.index.iat[2, 2 * j]
-        self.conc_end = self.index.iat[2, 2 * j + 1]
-        self.landing = self.index.iat[4, 2 * j]
-
-        # Extract Lists from processed data for y-axis computation (1.- 10.)
-        self.time_list = list(self.data['time'])
-        self.l_force_list = list(self.data['ground_force1_vy'])
-        self.r_force_list = list(self.data['ground_force2_vy'])
-        self.force_list = list(self.data['ground_force_totaly'])
-
-        self.acce_list = list(self.data['bodyacc_y'])
-        self.velocity_list = list(self.data['bodyvel_y'])
-        self.displace_list = list(self.data['bodypos_y'])
-
-        # Extract Lists from processed data Lists for COP (11.& 12.)
-        self.rx_cop_list = list(self.data['ground_force1_px'])
-        self.lx_cop_list = list(self.data['ground_force2_px'])
-        self.rz_cop_list = list(self.data['ground_force1_pz'])
-        self.lz_cop_list = list(self.data['ground_force2_pz'])
+        self.set_jump(self.jump)
+
+        # Extract arrays from processed data for y-axis computation (1.- 10.)
+        self.time = self.data['time'].to_numpy()
+        self.l_force = self.data['ground_force1_vy'].to_numpy()
+        self.r_force = self.data['ground_force2_vy'].to_numpy()
+        self.force = self.data['ground_force_totaly'].to_numpy()
+
+        self.acce = self.data['bodyacc_y'].to_numpy()
+        self.velocity = self.data['bodyvel_y'].to_numpy()
+        self.displace = self.data['bodypos_y'].to_numpy()
+
+        # Extract arrays from processed data for COP (11.& 12.)
+        self.rx_cop = self.data['ground_force1_px'].to_numpy()
+        self.lx_cop = self.data['ground_force2_px'].to_numpy()
+        self.rz_cop = self.data['ground_force1_pz'].to_numpy()
+        self.lz_cop = self.data['ground_force2_pz'].to_numpy()
 
         # Generate dataframe of computed results of squat calculations
         self.generate_cal_result()
@@ -141,16 +134,12 @@ class ProcessData:
         """
         Reset indexes for the certain jumps
         Argument:
-            jump - first, second or third jump
+            jump - jump number, from 1
         """
-        j = jump - 1
-        self.event_start = self.index.iat[0, 2 * j]
-        self.event_end = self.index.iat[0, 2 * j + 1]
-        self.ecce_start = self.index.iat[1, 2 * j]
-        self.ecce_end = self.index.iat[1, 2 * j + 1]
-        self.conc_start = self.index.iat[2, 2 * j]
-        self.conc_end = self.index.iat[2, 2 * j + 1]
-        self.landing = self.index.iat[4, 2 * j]
+        self.jump = jump
+        (self.event_start, self.event_end, self.ecce_start, self.ecce_end,
+         self.conc_start, self.conc_end, self.landing) = \
+            (int(idx) for idx in jump_bounds(self.index)[jump - 1])
 
     # Get Functions for Returns
     def get_data(self):
@@ -168,52 +157,11 @@ class ProcessData:
     # Functions for Squat Calculations
     def generate_cal_result(self):
         """
-        Creating a dataframe for the 12 squat calculation results of 3 jumps:
+        Creating a dataframe for the squat calculation results of every
+        jump in the index table.
         """
-        # Creating a empty DF with columns
-        cal_result = pd.DataFrame(columns=['weight(kg)', 'jump_height(cm)',
-                                           'takeoff_v(m/s)',
-                                           'rate_of_v_acce(m/s^3)',
-                                           'jump_time(s)', 'ecce_time(s)',
-                                           'conc_time(s)', 'peak_force(N)',
-                                           'peak_power(W)',
-                                           'avg_power_conc(W)',
-                                           'squat_depth(cm)',
-                                           'cop_displace_right_x(cm)',
-                                           'cop_displace_left_x(cm)',
-                                           'cop_displace_right_z(cm)',
-                                           'cop_displace_left_z(cm)'],
-                                  index=[1, 2, 3])
-
-        # Adding mass of patient
-        cal_result.at[1, 'weight(kg)'] = self.mass
-
-        # Filling in dataframe with values for each jump
-        for i in range(1, 4):
-            self.set_jump(i)
-            height, vel = self.height_by_v()
-            cal_result.at[i, 'jump_height(cm)'] = height
-            cal_result.at[i, 'takeoff_v(m/s)'] = vel
-            cal_result.at[i, 'rate_of_v_acce(m/s^3)'] \
-                = self.rate_of_force_ecce()
-            cal_result.at[i, 'jump_time(s)'] \
-                = (self.conc_end - self.ecce_start) / 1000
-            cal_result.at[i, 'ecce_time(s)'] \
-                = (self.ecce_end - self.ecce_start) / 1000
-            cal_result.at[i, 'conc_time(s)'] \
-                = (self.conc_end - self.conc_start) / 1000
-            cal_result.at[i, 'peak_force(N)'] = self.get_peak_force()
-            cal_result.at[i, 'peak_power(W)'] = self.get_peak_power()
-            cal_result.at[i, 'avg_power_conc(W)'] = self.avg_power_conc()
-            cal_result.at[i, 'squat_depth(cm)'] = self.get_squat_depth()
-            right_x, left_x, right_z, left_z = self.get_max_cop_dis()
-            cal_result.at[i, 'cop_displace_right_x(cm)'] = right_x
-            cal_result.at[i, 'cop_displace_left_x(cm)'] = left_x
-            cal_result.at[i, 'cop_displace_right_z(cm)'] = right_z
-            cal_result.at[i, 'cop_displace_left_z(cm)'] = left_z
-
-        # Storing results
-        self.cal_result = cal_result
+        self.cal_result = metrics_frame(
+            calculate_metrics(self.data, self.index, self.mass))
 
     # Metric Calculation Functions:
     def height_by_v(self):
@@ -233,52 +181,8 @@ class ProcessData:
         Return:
             vel: take-off velocity (m/s)
         """
-        max_velocity = -99999
-        max_idx = 0
-        start = self.event_start
-        end = self.landing
-
-        # Find a peak velocity before takeoff
-        for i in range(start, end):
-            if self.velocity_list[i] > max_velocity:
-                max_velocity = self.velocity_list[i]
-                max_idx = i
-
-        # Find a constant slop after the peak to find the start point
-        #   where the patient is on the air
-        cutoff_rate = 0.001
-        vel = self.velocity_list[max_idx]
-        vel_slope = self.velocity_list[max_idx]-self.velocity_list[max_idx-1]
-        count = 0
-
-        for j in range(max_idx + 1, len(self.velocity_list)):
-            vel_cur = self.velocity_list[j]
-            vel_cur_slope = self.velocity_list[j] - self.velocity_list[j - 1]
-
-            # if the slope difference is less the the cutoff_rate
-            # we assume that the slope is constant at this frame
-            slope_diff = vel_slope - vel_cur_slope
-            if abs(slope_diff) / abs(vel_cur_slope) < cutoff_rate:
-                if count == 0:
-                    vel = vel_cur
-                    vel_slope = vel_cur_slope
-                else:
-                    pass
-                #
-                count += 1
-            else:
-                vel = vel_cur
-                vel_slope = vel_cur_slope
-                count = 0
-
-            # If a constant slope is found, break
-            if count == 100:
-                break
-
-        # if a constant sloop cannot be found, raise exception
-        if count != 100:
-            raise Exception("Cannot find a constant slope")
-        return vel
+        return take_off_velocity(self.velocity, self.event_start,
+                                 self.landing)
 
     def rate_of_force_ecce(self):
         """
@@ -287,18 +191,8 @@ class ProcessData:
         Return:
             rate_of_f: rate of force during eccentric phase (N/s)
         """
-        start = self.ecce_start
-        end = self.ecce_end
-
-        # get time and force values in eccentric phase
-        time = self.time_list[start: end]
-        force = self.force_list[start: end]
-
-        # apply linear regression and return its slope as ratio
-        regress = linregress(time, force)
-        rate_of_force = regress.slope
-
-        return rate_of_force
+        return rate_of_force(self.time, self.force, self.ecce_start,
+                             self.ecce_end)
 
     def get_peak_force(self):
         """
@@ -306,12 +200,7 @@ class ProcessData:
         Return:
             peak_force(N)
         """
-        peak_force = 0.0
-        # find the peak force in the force_list
-        for i in range(self.event_start, self.event_end):
-            peak_force = max(peak_force, self.force_list[i])
-
-        return peak_force
+        return peak_force(self.force, self.event_start, self.event_end)
 
     def get_peak_power(self):
         """
@@ -319,12 +208,8 @@ class ProcessData:
         Return:
             peak_power(W)
         """
-        peak_power = 0.0
-        # Find the max power where power = force * velocity
-        for i in range(self.event_start, self.event_end):
-            cur_power = self.force_list[i] * self.velocity_list[i]
-            peak_power = max(peak_power, cur_power)
-        return peak_power
+        return peak_power(self.force, self.velocity, self.event_start,
+                          self.event_end)
 
     def avg_power_conc(self):
         """
@@ -332,17 +217,8 @@ class ProcessData:
         Return:
             avg_power: the average power (W)
         """
-        start = self.conc_start
-        end = self.conc_end
-        count = start - end
-        sum_power = 0.0
-
-        # Sum the power value for each frame and compute average
-        for i in range(start, end):
-            sum_power += self.force_list[i] * self.velocity_list[i]
-
-        avg_power = sum_power / count
-        return avg_power
+        return average_power(self.force, self.velocity, self.conc_start,
+                             self.conc_end)
 
     def get_squat_depth(self):
         """
@@ -350,11 +226,7 @@ class ProcessData:
         Return:
             Squat Depth (cm)
         """
-        min_displace = 0.0
-        # Find the lowest position before take-off
-        for i in range(self.event_start, self.conc_end):
-            min_displace = min(min_displace, self.displace_list[i])
-        return abs(min_displace) * 100
+        return squat_depth(self.displace, self.event_start, self.conc_end)
 
     def get_max_cop_dis(self):
         """
@@ -392,26 +264,238 @@ class ProcessData:
         # Identify for the four different cases
         if axis == 'x':
             if foot == 'r':
-                cop_list = self.rx_cop_list
-                origin = self.rx_cop_list[self.conc_start]
+                cop = self.rx_cop
             else:
-                cop_list = self.lx_cop_list
-                origin = self.lx_cop_list[self.conc_start]
+                cop = self.lx_cop
         else:
             if foot == 'r':
-                cop_list = self.rz_cop_list
-                origin = self.rz_cop_list[self.conc_start]
+                cop = self.rz_cop
             else:
-                cop_list = self.lz_cop_list
-                origin = self.lz_cop_list[self.conc_start]
-
-        # Find the max absolute displacement
-        start = self.conc_start
-        end = self.conc_end
-        max_displace = 0.0
-        for i in range(start, end):
-            cur_displace = cop_list[i] - origin
-            if abs(cur_displace) > abs(max_displace):
-                max_displace = cur_displace
-
-        return max_displace
+                cop = self.lz_cop
+
+        return max_cop_displacement(cop, self.conc_start, self.conc_end)
+
+
+# Stateless metric functions used by ProcessData
+def jump_bounds(index):
+    """
+    Function to convert the index table into phase boundaries per jump.
+    Argument:
+        index: index table from clean_data.py
+    Return:
+        bounds: array with one row per jump holding event start, event
+            end, eccentric start, eccentric end, concentric start,
+            concentric end and landing indexes (int)
+    """
+    index = np.asarray(index, dtype=np.int64)
+    starts = index[:, 0::2]
+    ends = index[:, 1::2]
+    bounds = np.stack([starts[0], ends[0], starts[1], ends[1],
+                       starts[2], ends[2], starts[4]], axis=1)
+    return bounds
+
+
+@profiled('calculate_metrics')
+def calculate_metrics(data, index, mass):
+    """
+    Function to compute the squat calculation results of every jump
+        in the index table at once.
+    Arguments:
+        1. data: processed data from clean_data.py
+        2. index: index table from clean_data.py
+        3. mass: patient mass from clean_data.py (kg)
+    Return:
+        results: float64 array with one row per jump and one column per
+            entry of METRIC_COLUMNS
+    """
+    bounds = jump_bounds(index)
+    n_jumps = bounds.shape[0]
+
+    time = data['time'].to_numpy()
+    force = data['ground_force_totaly'].to_numpy()
+    velocity = data['bodyvel_y'].to_numpy()
+    displace = data['bodypos_y'].to_numpy()
+    cops = [data['ground_force1_px'].to_numpy(),
+            data['ground_force2_px'].to_numpy(),
+            data['ground_force1_pz'].to_numpy(),
+            data['ground_force2_pz'].to_numpy()]
+
+    results = np.full((n_jumps, len(METRIC_COLUMNS)), np.nan)
+
+    # Adding mass of patient
+    results[0, 0] = mass
+
+    # Phase times for all jumps at once
+    (event_start, event_end, ecce_start, ecce_end,
+     conc_start, conc_end, landing) = bounds.T
+    results[:, 4] = (conc_end - ecce_start) / 1000
+    results[:, 5] = (ecce_end - ecce_start) / 1000
+    results[:, 6] = (conc_end - conc_start) / 1000
+
+    # Filling in the remaining metrics for each jump
+    for j in range(n_jumps):
+        vel = take_off_velocity(velocity, event_start[j], landing[j])
+        results[j, 1] = vel ** 2 / (2 * G) * 100
+        results[j, 2] = vel
+        results[j, 3] = rate_of_force(time, force, ecce_start[j],
+                                      ecce_end[j])
+        results[j, 7] = peak_force(force, event_start[j], event_end[j])
+        results[j, 8] = peak_power(force, velocity, event_start[j],
+                                   event_end[j])
+        results[j, 9] = average_power(force, velocity, conc_start[j],
+                                      conc_end[j])
+        results[j, 10] = squat_depth(displace, event_start[j], conc_end[j])
+        for k, cop in enumerate(cops):
+            results[j, 11 + k] = max_cop_displacement(cop, conc_start[j],
+                                                      conc_end[j])
+
+    return results
+
+
+def metrics_frame(results):
+    """
+    Function to wrap calculated metrics into the calculation results
+        dataframe, indexed by jump number starting at 1.
+    Argument:
+        results: array returned by calculate_metrics
+    Return:
+        cal_result: dataframe of squat calculation results
+    """
+    return pd.DataFrame(results, columns=METRIC_COLUMNS,
+                        index=np.arange(1, results.shape[0] + 1))
+
+
+def take_off_velocity(velocity, start, end):
+    """
+    Function to compute the take-off velocity. After the peak velocity
+        the patient is in the air once the velocity slope stays constant
+        for 100 frames: a run starts at a frame whose slope is within
+        0.1% of the slope of the frame before, and the slopes of the
+        next 99 frames are all within 0.1% of the slope at the start of
+        the run. The search never goes past landing.
+    Arguments:
+        1. velocity: body velocity array (m/s)
+        2. start: index of the start of the jump event
+        3. end: index of landing
+    Return:
+        vel: take-off velocity (m/s)
+    """
+    cutoff_rate = 0.001
+    run_length = 100
+
+    # Find a peak velocity before takeoff (the first frame has no slope)
+    max_idx = max(start + int(np.argmax(velocity[start:end])), 1)
+
+    # Slope of every frame from the peak until landing
+    slopes = np.diff(velocity[max_idx - 1:end])
+    # Frames within the cutoff_rate of the slope of the frame before
+    run_starts = np.flatnonzero(np.abs(slopes[:-1] - slopes[1:]) <
+                                cutoff_rate * np.abs(slopes[1:])) + 1
+
+    # Check the runs in order; a run broken at a frame is followed by the
+    #   next run start after that frame
+    position = 0
+    while True:
+        candidates = run_starts[run_starts >= position]
+        if candidates.size == 0 or \
+                candidates[0] + run_length > slopes.size:
+            # if a constant sloop cannot be found, raise exception
+            raise Exception("Cannot find a constant slope")
+        run_start = candidates[0]
+        run = slopes[run_start + 1:run_start + run_length]
+        broken = np.flatnonzero(np.abs(slopes[run_start] - run) >=
+                                cutoff_rate * np.abs(run))
+        if broken.size == 0:
+            return float(velocity[max_idx + run_start])
+        position = run_start + 1 + broken[0] + 1
+
+
+def rate_of_force(time, force, start, end):
+    """
+    Function to return the rate of force development between two
+        indexes by linear regression.
+    Arguments:
+        1. time: time array (s)
+        2. force: total vertical force array (N)
+        3-4. start, end: indexes of the phase
+    Return:
+        rate_of_force: rate of force during the phase (N/s)
+    """
+    # apply linear regression and return its slope as ratio
+    regress = linregress(time[start:end], force[start:end])
+    return regress.slope
+
+
+def peak_force(force, start, end):
+    """
+    Function to return Peak force between two indexes.
+    Arguments:
+        1. force: total vertical force array (N)
+        2-3. start, end: indexes of the event
+    Return:
+        peak_force(N), never below 0
+    """
+    return max(0.0, float(force[start:end].max(initial=0.0)))
+
+
+def peak_power(force, velocity, start, end):
+    """
+    Function to return peak power where power = force * velocity
+    Arguments:
+        1. force: total vertical force array (N)
+        2. velocity: body velocity array (m/s)
+        3-4. start, end: indexes of the event
+    Return:
+        peak_power(W), never below 0
+    """
+    power = force[start:end] * velocity[start:end]
+    return max(0.0, float(power.max(initial=0.0)))
+
+
+def average_power(force, velocity, start, end):
+    """
+    Function to return Average Power between two indexes.
+    Arguments:
+        1. force: total vertical force array (N)
+        2. velocity: body velocity array (m/s)
+        3-4. start, end: indexes of the phase
+    Return:
+        avg_power: the average power (W)
+    """
+    count = start - end
+
+    # Sum the power value for each frame and compute average
+    sum_power = float(np.dot(force[start:end], velocity[start:end]))
+
+    avg_power = sum_power / count
+    return avg_power
+
+
+def squat_depth(displace, start, end):
+    """
+    Function to return the Counter-movement / Squat Depth.
+    Arguments:
+        1. displace: body position array (m)
+        2-3. start, end: indexes from event start to take-off
+    Return:
+        Squat Depth (cm)
+    """
+    # Find the lowest position before take-off
+    min_displace = min(0.0, float(displace[start:end].min(initial=0.0)))
+    return abs(min_displace) * 100
+
+
+def max_cop_displacement(cop, start, end):
+    """
+    Function to retrieve the max Center of Pressure displacement
+        from its position at the start index.
+    Arguments:
+        1. cop: center of pressure array for one foot and axis
+        2-3. start, end: indexes of the phase
+    Return:
+        max displacement distance (cm)
+    """
+    cur_displace = cop[start:end] - cop[start]
+    if cur_displace.size == 0:
+        return 0.0
+    return float(cur_displace[np.argmax(np.abs(cur_displace))])
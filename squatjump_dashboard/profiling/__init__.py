@@ -0,0 +1 @@
+from .profiling import Profiler, active_profiler, profiled, record, stage
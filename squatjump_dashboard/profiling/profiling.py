@@ -0,0 +1,250 @@
+"""
+profiling.py
+    This file contains opt-in instrumentation of the pipeline stages
+    and plotting helpers. Stages are wrapped with the profiled
+    decorator (or the stage context manager) and only record anything
+    while a Profiler is active, so instrumentation costs close to
+    nothing otherwise. For each stage a Profiler records the wall
+    time, the number of rows it was given, values the stage reports
+    with record (such as the final contact threshold) and,
+    optionally, its peak memory (with tracemalloc). Before Python 3.9
+    tracemalloc cannot reset its peak, so it is restarted instead and
+    memory allocated before a stage and freed during it is not
+    subtracted from the current memory.
+    The tracemalloc peak is shared by the whole process, so only one
+    Profiler at a time records memory; Profilers activated while
+    another one records memory only record times.
+    Usage:
+        with Profiler(memory=True) as profiler:
+            process_data(data)
+        print(profiler.log_line())
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Profiler of the current thread (each streamlit session runs its own)
+_active = contextvars.ContextVar('squatjump_profiler', default=None)
+
+# Held by the Profiler recording memory (tracemalloc peaks are global)
+_memory_lock = threading.Lock()
+
+
+class Profiler:
+    """
+    Collector of stage measurements. Stages run while the profiler is
+        active (between activate and deactivate, or inside a with block)
+        are recorded in the order they finish.
+    """
+
+    def __init__(self, memory=False):
+        """
+        Initialize an empty profiler.
+        Argument:
+            memory: True to also record the peak memory of each stage
+                with tracemalloc (slows the stages down), if no other
+                Profiler is recording memory when this one is activated
+        """
+        self.memory_requested = memory
+        self.memory = False
+        # Memory traced before tracemalloc was last restarted
+        self._memory_offset = 0
+        self.records = []
+        self._stack = []
+        self._token = None
+        self._started_tracing = False
+
+    def __enter__(self):
+        return self.activate()
+
+    def __exit__(self, *exc_info):
+        self.deactivate()
+
+    def activate(self):
+        """Start recording stages run in this thread, return self"""
+        self._token = _active.set(self)
+        if self.memory_requested and _memory_lock.acquire(blocking=False):
+            self.memory = True
+            self._memory_offset = 0
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        return self
+
+    def deactivate(self):
+        """Stop recording stages"""
+        if self._token is not None:
+            _active.reset(self._token)
+            self._token = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        if self.memory:
+            self.memory = False
+            _memory_lock.release()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        """
+        Context manager recording one stage.
+        Arguments:
+            1. name: name of the stage (str)
+            2. rows: number of rows the stage was given (int)
+        """
+        record = {'stage': name, 'parent': None, 'rows': rows}
+        if len(self._stack) > 0:
+            record['parent'] = self._stack[-1]['stage']
+        memory = self.memory
+        if memory:
+            record['_memory'] = self.traced_memory()
+            record['_peak'] = 0
+            self.reset_peak()
+        self._stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            self._stack.pop()
+            if memory:
+                current, outer_peak = record.pop('_memory')
+                peak = max(self.traced_memory()[1], record.pop('_peak'))
+                record['peak_mb'] = (peak - current) / 2 ** 20
+                # The peak of the enclosing stage includes this stage
+                if len(self._stack) > 0:
+                    self._stack[-1]['_peak'] = max(
+                        self._stack[-1]['_peak'], outer_peak, peak)
+                else:
+                    self.reset_peak()
+            self.records.append(record)
+
+    def traced_memory(self):
+        """
+        Return the current and peak memory traced by tracemalloc (bytes),
+        including memory traced before it was restarted by reset_peak.
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        return self._memory_offset + current, self._memory_offset + peak
+
+    def reset_peak(self):
+        """
+        Set the peak traced memory to the current memory. Before Python
+        3.9 tracemalloc is restarted, keeping its current memory as an
+        offset.
+        """
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        else:
+            self._memory_offset += tracemalloc.get_traced_memory()[0]
+            frames = tracemalloc.get_traceback_limit()
+            tracemalloc.stop()
+            tracemalloc.start(frames)
+
+    def record(self, **values):
+        """
+        Attach values to the stage running now.
+        Argument:
+            values: names and values to record (e.g. contact_threshold)
+        """
+        if len(self._stack) > 0:
+            self._stack[-1].update(values)
+
+    def as_dict(self):
+        """
+        Return the measurements as a dict holding a list of stages
+        (in the order they finished) and the time of the outermost
+        stages.
+        """
+        stages = [{key: to_builtin(value) for key, value in record.items()}
+                  for record in self.records]
+        total = sum(record['seconds'] for record in self.records
+                    if record['parent'] is None)
+        return {'stages': stages, 'total_seconds': total}
+
+    def as_frame(self):
+        """Return the measurements with one row per stage (df)"""
+        return pd.DataFrame(self.as_dict()['stages'])
+
+    def log_line(self):
+        """Return the measurements as one structured log line (str)"""
+        return 'squatjump_profile ' + json.dumps(self.as_dict(),
+                                                 sort_keys=True)
+
+
+def active_profiler():
+    """Return the Profiler active in this thread, or None"""
+    return _active.get()
+
+
+@contextlib.contextmanager
+def stage(name, rows=None):
+    """
+    Context manager recording a stage in the active Profiler. Does
+    nothing if there is none.
+    Arguments:
+        1. name: name of the stage (str)
+        2. rows: number of rows the stage was given (int)
+    """
+    profiler = _active.get()
+    if profiler is None:
+        yield None
+    else:
+        with profiler.stage(name, rows) as record:
+            yield record
+
+
+def profiled(name):
+    """
+    Decorator recording every call of a function as a stage of the
+    active Profiler. Rows are counted from the first argument.
+    Argument:
+        name: name of the stage (str)
+    Return:
+        decorator for the function
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _active.get()
+            if profiler is None:
+                return func(*args, **kwargs)
+            rows = row_count(args[0]) if len(args) > 0 else None
+            with profiler.stage(name, rows):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(**values):
+    """
+    Attach values to the stage running now in the active Profiler.
+    Does nothing if there is none.
+    Argument:
+        values: names and values to record (e.g. contact_threshold)
+    """
+    profiler = _active.get()
+    if profiler is not None:
+        profiler.record(**values)
+
+
+def row_count(value):
+    """Return the number of rows of a table or array, or None"""
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    if hasattr(value, 'data') and isinstance(value.data, pd.DataFrame):
+        return len(value.data)
+    return None
+
+
+def to_builtin(value):
+    """Return numpy scalars as python numbers so they can be logged"""
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
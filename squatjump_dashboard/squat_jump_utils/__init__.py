@@ -1,3 +1,4 @@
 from .squat_jump_utils import groundforce_plot, create_COP_plot
 from .squat_jump_utils import metric_viewer, create_plot_vs_time
 from .squat_jump_utils import split_by_jump, create_center_pressure_df
+from .squat_jump_utils import center_pressure_bins, jump_slice
@@ -11,39 +11,71 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import matplotlib.pyplot as plt
-import streamlit as st
+from squatjump_dashboard.load_data.load_data import RAW_COLUMNS, USED_COLUMNS
+from squatjump_dashboard.plot_data import figure_buckets, plot_data
+from squatjump_dashboard.profiling import profiled
+from squatjump_dashboard.validate_data import ValidatedTrial
+from squatjump_dashboard.validate_data.validate_data import has_missing_values
 
+# Force plate of each leg
+LEG_PLATES = {'left': '2', 'right': '1'}
 
+# Readable names of the calculation results (METRIC_COLUMNS), in order
+METRIC_NAMES = [
+    "weight(kg)",
+    "Jump Height (cm)",
+    "Takeoff Velocity (m/s)",
+    "Eccentric Loading Rate (N/s)",
+    "Jump Time (s)",
+    "Eccentric Time (s)",
+    "Concentric Time (s)",
+    "Peak Force (N)",
+    "Peak Power (W)",
+    "Average Concentric Power (W)",
+    "Squat Depth (cm)",
+    "Left Leg COP Displacement(cm) [Ant.-Post.]",
+    "Right Leg COP Displacement(cm) [Ant.-Post.]",
+    "Left Leg COP Displacement(cm) [Med.-Lat.]",
+    "Right Leg COP Displacement(cm) [Med.-Lat.]"
+]
+
+# Start and end of each phase of a jump, as (index table row, edge)
+JUMP_PHASES = {
+    'event': (('Event', 'Start'), ('Event', 'End')),
+    'eccentric': (('Eccentric Phase', 'Start'), ('Eccentric Phase', 'End')),
+    'concentric': (('Concentric Phase', 'Start'),
+                   ('Concentric Phase', 'End')),
+    'jump': (('Jump Phase', 'Start'), ('Jump Phase', 'End')),
+    'flight': (('Jump Phase', 'End'), ('Landing Phase', 'Start')),
+    'landing': (('Landing Phase', 'Start'), ('Landing Phase', 'End'))}
+
+
+@profiled('groundforce_plot')
 def groundforce_plot(df, dir):
     """
     This function creates a plot for ground force. It takes in
     the dataframe passed by a user containing squat jump data
-    and a dir ('y', 'x', or 'z') and returns a figure.
+    and a dir ('y', 'x', or 'z') and returns a figure. The lines are
+    decimated to the figure width (see plot_data.py).
     Arguments:
-        1. df: Squat Jump Data read from a Force Plate.
+        1. df: Squat Jump Data read from a Force Plate (or a
+            ValidatedTrial).
         2. dir: 'y', 'z', or 'x' representing column name.
     Return:
         1. fig: figure of ground force jump in passed direction.
     """
     # Run DF check:
-    check_data(df)
+    df = checked_data(df)
     check_direction(dir)
 
-    # Split left and right legs
-    right_cols = [x for x in list(df.columns) if '1' in x]
-    right_cols.append('time')
-    left_cols = [x for x in list(df.columns) if '2' in x]
-    left_cols.append('time')
-
-    right_df = df[right_cols]
-    left_df = df[left_cols]
-
     fig, ax = plt.subplots()
-    column_names = [('ground_force1_v' + str(dir)),
-                    ('ground_force2_v' + str(dir))]
-    ax.plot(right_df['time'], right_df[column_names[0]], alpha=0.5,
-            label='Right')
-    ax.plot(left_df['time'], left_df[column_names[1]], alpha=0.5, label='Left')
+    # Right leg is force plate 1, left leg force plate 2
+    trial_plot = plot_data(df)
+    n_buckets = figure_buckets(fig)
+    ax.plot(*trial_plot.series('ground_force1_v' + str(dir), n_buckets),
+            alpha=0.5, label='Right')
+    ax.plot(*trial_plot.series('ground_force2_v' + str(dir), n_buckets),
+            alpha=0.5, label='Left')
 
     ax.set_title("Ground Force in the Axis: " + str.upper(dir))
     ax.set_xlabel("Time (s)")
@@ -53,13 +85,15 @@ def groundforce_plot(df, dir):
     return fig
 
 
+@profiled('create_plot_vs_time')
 def create_plot_vs_time(df, column):
     """
     This function creates a plot for acceleration/
     velocity/position against time. It takes in
     the dataframe containing processed squat jump data
     from process_data.py, and also a column name
-    and returns the appropriate figure.
+    and returns the appropriate figure. The line is decimated to the
+    figure width (see plot_data.py).
     Arguments:
         1. df: Squat Jump Dataframe from process_data.
         2. column: 'bodyacc_y', 'bodyvel_y', or
@@ -71,7 +105,8 @@ def create_plot_vs_time(df, column):
     check_plot_col_names(column)
 
     fig, ax = plt.subplots()
-    ax.plot(df['time'], df[column], color='#4B2E83')
+    ax.plot(*plot_data(df).series(column, figure_buckets(fig)),
+            color='#4B2E83')
     ax.set_facecolor("#F8F9FF")
     # For passed column, create appropriate labels
     if column == 'bodyacc_y':
@@ -89,77 +124,83 @@ def create_plot_vs_time(df, column):
     return fig
 
 
-@st.cache
+@profiled('create_COP_plot')
 def create_COP_plot(df):
     """
     This function creates an interactive COP plot using
     plotly. It takes in the read jump dataframe and returns
-    a figure.
+    a figure. Figures are cached per trial (see plot_data.py), and
+    each call returns a new figure.
     Arguments:
-        1. df: Dataframe of squat jump data from force plates.
+        1. df: Dataframe of squat jump data from force plates (or a
+            ValidatedTrial).
     Return:
         1. fig: An interactive Plotly figure for COP data.
     """
     # Run DF Check:
-    check_data(df)
+    df = checked_data(df)
+    return plot_data(df).figure(
+        ('COP_plot',), lambda: cop_figure(center_pressure_bins(df)))
 
-    # Creating df for plotting center of pressure:
-    center_pressure_left = df[['time', 'ground_force1_px',
-                               'ground_force1_py',
-                               'ground_force1_pz']].copy()
-    # Renaming Columns for Left Leg:
-    center_pressure_left.rename(columns={
-        'ground_force1_px': 'ground_force_px',
-        'ground_force1_py': 'ground_force_py',
-        'ground_force1_pz': 'ground_force_pz'},
-                                inplace=True)
-    center_pressure_left['side'] = ['left']*len(center_pressure_left)
-    # Renaming Columns for Right Leg:
-    center_pressure_right = df[['time', 'ground_force2_px',
-                                'ground_force2_py',
-                                'ground_force2_pz']].copy()
-    center_pressure_right.rename(columns={
-        'ground_force2_px': 'ground_force_px',
-        'ground_force2_py': 'ground_force_py',
-        'ground_force2_pz': 'ground_force_pz'},
-                                 inplace=True)
-    center_pressure_right['side'] = ['right']*len(center_pressure_right)
-    # Joining together with added information for left and right leg
-    center_pressure = pd.concat([center_pressure_left,
-                                 center_pressure_right],
-                                axis=0, ignore_index=True)
-    center_pressure.sort_values(by="time", inplace=True)
-    # Splitting time into ranges for computational purposes
-    center_pressure = center_pressure.groupby(
-        [pd.cut(center_pressure.time,
-         bins=np.arange(0, round(max(center_pressure.time)), step=.5),
-         include_lowest=True), 'side']
-        )[['ground_force_px', 'ground_force_pz']].mean()
-    # Reset index
-    center_pressure = center_pressure.reset_index()
-
-    # Creating plotly figure
-    fig = px.scatter(center_pressure, x="ground_force_pz",
-                     y="ground_force_px", facet_col="side",
-                     animation_frame='time', range_x=[-1.36, -0.40],
-                     range_y=[0.02, 0.40])
-
-    # Updating slider
-    steps = []
-    for i in range(len(fig.data)):
-        step = dict(
-            method="update",
-            args=[{"visible": [False] * len(fig.data)},
-                  {"title": "Time: " + str(5 * i)+" seconds"}, ],
-            label=str(5 * i))
-        step["args"][0]["visible"][i] = True
-        steps.append(step)
-
-    # check_plotly_output(fig)
 
-    return fig
+def center_pressure_bins(df, bin_width=0.5):
+    """
+    This function returns the mean center of pressure of each leg in
+    bins of time, from 0 to the rounded end of the trial. Bins include
+    their end time (and the first one also 0). Bins without samples
+    have NaN means.
+    Arguments:
+        1. df: Dataframe of squat jump data from force plates.
+        2. bin_width: width of the bins (s)
+    Return:
+        1. center_pressure: Dataframe with a row per bin and side
+            ('left' then 'right'), with columns time (bin interval),
+            side, ground_force_px and ground_force_pz.
+    """
+    time = df['time'].to_numpy()
+    edges = np.arange(0, round(time.max()), step=bin_width)
+    n_bins = max(len(edges) - 1, 0)
+    # Bin of each sample, from the first edge at or after its time
+    bins = np.maximum(np.searchsorted(edges, time, side='left'), 1) - 1
+    in_bins = (time >= 0) & (time <= edges[-1]) if n_bins else \
+        np.zeros(len(time), dtype=bool)
+    bins = bins[in_bins]
+    counts = np.bincount(bins, minlength=n_bins)
+
+    # Mean per bin (rows) and side (columns)
+    means = {}
+    for axis in ['px', 'pz']:
+        sums = np.column_stack([
+            np.bincount(bins, weights=df['ground_force' + plate + '_' +
+                                         axis].to_numpy()[in_bins],
+                        minlength=n_bins) for plate in ['1', '2']])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means['ground_force_' + axis] = (sums / counts[:, None]).ravel()
+
+    intervals = pd.IntervalIndex.from_breaks(edges[:n_bins + 1])
+    return pd.DataFrame({
+        'time': pd.Categorical.from_codes(np.repeat(np.arange(n_bins), 2),
+                                          intervals),
+        'side': np.tile(['left', 'right'], n_bins),
+        **means})
+
+
+def cop_figure(center_pressure):
+    """
+    This function creates the animated Plotly figure of the center of
+    pressure of each leg.
+    Arguments:
+        1. center_pressure: Dataframe from center_pressure_bins.
+    Return:
+        1. fig: An interactive Plotly figure for COP data.
+    """
+    return px.scatter(center_pressure, x="ground_force_pz",
+                      y="ground_force_px", facet_col="side",
+                      animation_frame='time', range_x=[-1.36, -0.40],
+                      range_y=[0.02, 0.40])
 
 
+@profiled('metric_viewer')
 def metric_viewer(calculations_df):
     """
     This function creates a metric table output to be viewed in
@@ -173,127 +214,107 @@ def metric_viewer(calculations_df):
     """
     metric_df = calculations_df.copy()  # Creating a copy
     # Updating column names to more readable:
-    metric_names = [
-        "weight(kg)",
-        "Jump Height (cm)",
-        "Takeoff Velocity (m/s)",
-        "Eccentric Loading Rate (N/s)",
-        "Jump Time (s)",
-        "Eccentric Time (s)",
-        "Concentric Time (s)",
-        "Peak Force (N)",
-        "Peak Power (W)",
-        "Average Concentric Power (W)",
-        "Squat Depth (cm)",
-        "Left Leg COP Displacement(cm) [Ant.-Post.]",
-        "Right Leg COP Displacement(cm) [Ant.-Post.]",
-        "Left Leg COP Displacement(cm) [Med.-Lat.]",
-        "Right Leg COP Displacement(cm) [Med.-Lat.]"
-    ]
-    # Renaming columns
-    metric_df.columns = metric_names
+    metric_df.columns = METRIC_NAMES
     # Transposing to better show table
     metric_df = metric_df.iloc[:, 1:].T
-    # Renaming columns
-    metric_df.columns = ['Jump 1', 'Jump 2', 'Jump 3']
+    # Renaming columns (one per jump)
+    metric_df.columns = ['Jump ' + str(jump) for jump in metric_df.columns]
     return metric_df
 
 
-def split_by_jump(df, index, jump):
+@profiled('split_by_jump')
+def split_by_jump(df, index, jump, phase='event'):
     """
     This function splits the processed dataframe of jumps and
-    splits it by jump (1, 2 or 3).
+    splits it by jump (numbered from 1), or by a phase of the jump.
+    The rows are a positional slice of df (see jump_slice), so the
+    result is a view rather than a copy.
     Arguments:
-        1. df: the processed jump dataframe containing time.
+        1. df: the processed jump dataframe containing time (as a
+            column or as the index, as from create_center_pressure_df).
         2. index: the index dataframe output from process_data.py
-        3. jump: an int being either 1, 2 or 3 representing which
-            jump to find.
+        3. jump: an int (or str) representing which jump to find.
+        4. phase: part of the jump to keep (see JUMP_PHASES), the whole
+            jump event by default.
     Return:
         1. jump_df: the dataframe containing values only for a given
             jump.
     """
-    # Creating masks for passed jumps
-    if jump == 1:
-        mask1 = df['time'] >= (index['Jump 1 Start'][0]/1000)
-        mask2 = df['time'] <= (index['Jump 1 End'][0]/1000)
-    elif jump == 2:
-        mask1 = df['time'] >= (index['Jump 2 Start'][0]/1000)
-        mask2 = df['time'] <= (index['Jump 2 End'][0]/1000)
-    else:
-        mask1 = df['time'] >= (index['Jump 3 Start'][0]/1000)
-        mask2 = df['time'] <= (index['Jump 3 End'][0]/1000)
-    # Filtering
-    jump_df = df[mask1 & mask2]
-    return jump_df
+    return df.iloc[jump_slice(df, index, jump, phase)]
 
 
+def jump_slice(df, index, jump, phase='event'):
+    """
+    This function returns the rows of a jump, or of a phase of the jump,
+    as a positional slice. Index table entries are sample numbers at
+    1000 Hz, and the rows from the start to the end time (both
+    included) are found with a binary search of the time.
+    Arguments:
+        1. df: the processed jump dataframe containing time (as a
+            column or as the index).
+        2. index: the index dataframe output from process_data.py
+        3. jump: an int (or str) representing which jump to find.
+        4. phase: part of the jump (see JUMP_PHASES), the whole jump
+            event by default.
+    Return:
+        1. rows: slice of the rows of the jump, for df.iloc
+    """
+    if phase not in JUMP_PHASES:
+        raise ValueError('Phase passed can only be one of ' +
+                         ', '.join(JUMP_PHASES))
+    if 'Jump ' + str(jump) + ' Start' not in index.columns:
+        raise ValueError('Jump ' + str(jump) + ' is not in the index table')
+    (start_row, start_edge), (end_row, end_edge) = JUMP_PHASES[phase]
+    start = index['Jump ' + str(jump) + ' ' + start_edge][start_row]
+    end = index['Jump ' + str(jump) + ' ' + end_edge][end_row]
+    time = df['time'] if 'time' in df.columns else df.index
+    time = np.asarray(time)
+    return slice(int(np.searchsorted(time, start / 1000, side='left')),
+                 int(np.searchsorted(time, end / 1000, side='right')))
+
+
+@profiled('create_center_pressure_df')
 def create_center_pressure_df(df):
     """
-    Creates a dataframe for visualization
-    when given a path to the raw data file.
+    Creates a dataframe for visualization of the center of pressure
+    and force vector of each leg. The legs are side by side: columns
+    are (side, name) pairs, with a categorical side level ('left' for
+    plate 2 and 'right' for plate 1), and rows are indexed by time in
+    the order of the data. All values share one array, so
+    center_pressure['left'] and positional row slices such as
+    center_pressure.iloc[start:end] are views.
     Arguments:
         1. df: processed_df containing vector data
     Return:
         1. center_pressure: df containing translated
-            column names and position.
+            column names by side.
     """
-    # Seperating Left Leg Data
-    center_pressure_left = df[['time',
-                               'ground_force2_pz',
-                               'ground_force2_px',
-                               'ground_force2_vz',
-                               'ground_force2_vx',
-                               'ground_force2_vy']].copy()
-    # Renaming columns:
-    center_pressure_left.rename(columns={
-        'ground_force2_pz': 'ground_force_pt1x',
-        'ground_force2_px': 'ground_force_pt1y',
-        'ground_force2_vz': 'ground_force_pt2x',
-        'ground_force2_vx': 'ground_force_pt2y',
-        'ground_force2_vy': 'ground_force_pt2z'
-                                            }, inplace=True)
-    center_pressure_left['ground_force_pt1z'] = [0] * \
-        len(center_pressure_left)
-    # Adding a new column Position
-    center_pressure_left['Position'] = ['left'] * len(center_pressure_left)
-    # Seperating Right Leg Data
-    center_pressure_right = df[['time',
-                                'ground_force1_pz',
-                                'ground_force1_px',
-                                'ground_force1_vz',
-                                'ground_force1_vx',
-                                'ground_force1_vy']].copy()
-    # Homogenizing column names for right leg also
-    center_pressure_right.rename(columns={
-        'ground_force1_pz': 'ground_force_pt1x',
-        'ground_force1_px': 'ground_force_pt1y',
-        'ground_force1_vz': 'ground_force_pt2x',
-        'ground_force1_vx': 'ground_force_pt2y',
-        'ground_force1_vy': 'ground_force_pt2z'
-                                            }, inplace=True)
-    center_pressure_right['ground_force_pt1z'] = [0] * \
-        len(center_pressure_left)
-    # Adding column for Position
-    center_pressure_right['Position'] = ['right'] * \
-        len(center_pressure_right)
-    # Rejoining our two dataframes
-    center_pressure = pd.concat([center_pressure_left,
-                                 center_pressure_right],
-                                axis=0, ignore_index=True)
-    # Sorting by time
-    center_pressure.sort_values(by="time", inplace=True)
-    # Returning the dataset with Position
-    return center_pressure
+    # Force plate columns of each translated column name
+    plate_columns = {'ground_force_pt1x': 'pz',
+                     'ground_force_pt1y': 'px',
+                     'ground_force_pt2x': 'vz',
+                     'ground_force_pt2y': 'vx',
+                     'ground_force_pt2z': 'vy'}
+    values = np.empty((len(df), len(LEG_PLATES), len(plate_columns)))
+    for side, plate in enumerate(LEG_PLATES.values()):
+        for column, name in enumerate(plate_columns.values()):
+            values[:, side, column] = df['ground_force' + plate + '_' + name]
+    columns = pd.MultiIndex.from_product(
+        [pd.CategoricalIndex(list(LEG_PLATES)), list(plate_columns)],
+        names=['side', None])
+    return pd.DataFrame(values.reshape(len(df), -1), columns=columns,
+                        index=pd.Index(df['time'].to_numpy(), name='time'))
 
 
 # Helper functions below:
 def check_data(df):
     """
     This function checks that the passed dataframe has the correct shape
-    (19 columns) since forceplate outputs are consistent.
+    (19 columns, or the 11 used columns read by load_data) since
+    forceplate outputs are consistent.
     Arguments:
         1. df: Patient forceplate data containing variable rows,
-            but having set 19 columns.
+            but having set 19 (or 11) columns.
     Return:
         RaiseError if not correct shape or not a pandas dataframe.
     """
@@ -303,17 +324,33 @@ def check_data(df):
                         'DataFrame. Instead recieved data type ' +
                         str(type(df)))
     # Raise Errors if there are not 3 columns in the dataset:
-    elif df.shape[1] != 19:
+    elif df.shape[1] not in (len(RAW_COLUMNS), len(USED_COLUMNS)):
         raise ValueError('Data shape passed has wrong number of columns. ' +
-                         'Expected to have 19 columns instead got ' +
+                         'Expected to have 19 or 11 columns instead got ' +
                          str(df.shape[1]) + ' columns.')
     # Raise error is there are missing values:
-    elif df.isna().sum().sum() >= 1:
+    elif has_missing_values(df):
         raise ValueError('Data contains missing values!')
     else:
         return None
 
 
+def checked_data(df):
+    """
+    This function returns the dataframe to plot from either a
+    ValidatedTrial (which is not checked again) or a dataframe
+    (which is checked with check_data).
+    Arguments:
+        1. df: Patient forceplate data or a ValidatedTrial.
+    Return:
+        1. df: Patient forceplate dataframe.
+    """
+    if isinstance(df, ValidatedTrial):
+        return df.data
+    check_data(df)
+    return df
+
+
 def check_direction(dir):
     """
     This function checks that the direction input is
@@ -0,0 +1 @@
+from .stream_data import StreamProcessor, replay, replay_csv
@@ -0,0 +1,641 @@
+"""
+stream_data.py
+    This file contains the streaming mode used to follow a trial live
+    while the force plates are recording. Samples are pushed in chunks
+    as they arrive and the calculation results of each jump are
+    returned as soon as the patient has landed and settled. Only the
+    samples of the current jump are kept, so memory stays bounded no
+    matter how long the recording runs.
+    The force channels are filtered with the zero-phase butter filter
+    of clean_data applied to overlapping blocks, which matches
+    filtering the complete trial. Jump events are found with the
+    clean_data helpers and metrics with calculate_metrics. clean_data
+    picks the in air threshold and the patient weight from the
+    complete trial; here they are estimated from the samples seen so
+    far unless they are given.
+"""
+import numpy as np
+import pandas as pd
+from scipy import integrate
+from scipy.signal import sosfiltfilt
+
+from squatjump_dashboard.clean_data.clean_data import (
+    CONTACT_THRESHOLDS, FILTER_CUTOFF, FILTER_ORDER, SAMPLE_RATE,
+    butter_sos, contact_event_finder, find_force_prime, find_phase_starts,
+    find_settled_index, find_transitions, find_unloading_edges)
+from squatjump_dashboard.load_data import load_data
+from squatjump_dashboard.load_data.load_data import USED_COLUMNS
+from squatjump_dashboard.process_data import calculate_metrics
+from squatjump_dashboard.process_data.process_data import METRIC_COLUMNS
+
+FILTER_OVERLAP = 2000  # Samples filtered again on both sides of a block
+FILTER_BLOCK = 500  # Fewest new samples filtered at once
+SETTLE_LENGTH = 250  # Static samples after landing that end a jump
+MIN_FLIGHT = 100  # Shortest time in the air counted as a jump (samples)
+MAX_FLIGHT = 2000  # Longer times off the plate mean the patient left it
+MAX_SAMPLES = 60000  # Most samples kept while waiting for a jump
+MAX_PENDING_SAMPLES = 30000  # Most samples kept for a jump not yet ended
+
+# Positions of columns in the sample buffer
+FORCE_COLS = [ii for ii, col in enumerate(USED_COLUMNS) if '_v' in col]
+VERTICAL_COLS = [USED_COLUMNS.index('ground_force1_vy'),
+                 USED_COLUMNS.index('ground_force2_vy')]
+TOTAL_COL = len(USED_COLUMNS)
+
+
+class StreamProcessor:
+    """
+    Incremental squat jump processing for live force plate capture.
+        Push chunks of samples as they are recorded with push(), which
+        returns the calculation results of the jumps completed by
+        that chunk, and call finish() once the recording ends.
+    """
+
+    def __init__(self, mass=None, threshold=None,
+                 settle_length=SETTLE_LENGTH, max_samples=MAX_SAMPLES,
+                 max_pending_samples=MAX_PENDING_SAMPLES):
+        """
+        Initialize an empty stream.
+        Arguments:
+            1. mass: patient mass (kg), estimated from the longest
+                static period seen so far if not given
+            2. threshold: force below which the patient is in the air
+                (N), picked per flight from CONTACT_THRESHOLDS if not
+                given (never lower than for an earlier flight)
+            3. settle_length: static samples needed after landing
+                before a jump is completed
+            4. max_samples: most samples kept while no jump is found
+            5. max_pending_samples: most samples kept for a jump that
+                has not ended; past it the jump is dropped and an error
+                is recorded
+        """
+        self.mass = mass
+        self.threshold = threshold
+        self.settle_length = settle_length
+        self.max_samples = max_samples
+        self.max_pending_samples = max_pending_samples
+        self.sos = butter_sos(FILTER_CUTOFF, SAMPLE_RATE, FILTER_ORDER)
+        self.errors = []
+        self.off_force_plate = False
+        self._results = {}
+        self._events = {}
+        self._n_jumps = 0
+        self._finished = False
+        self._dt = None
+        self._last_time = None
+        # Raw samples not yet filtered for good, after _n_history
+        #   samples kept only to filter them
+        self._raw = np.empty((0, len(USED_COLUMNS)))
+        self._n_history = 0
+        # Filtered samples (plus total vertical force), the first of
+        #   which is sample number _offset of the recording
+        self._data = np.empty((0, len(USED_COLUMNS) + 1))
+        self._offset = 0
+        self._scanned = 0
+        self._air_start = None
+        self._threshold_used = 0 if threshold is None else threshold
+        # Current contact, and jump waiting for the patient to settle
+        self._contact_start = 0
+        self._cutoff = None
+        self._first_contact = True
+        self._pending = None
+        self._static = None
+
+    @property
+    def calculations(self):
+        """Return calculation results of every completed jump (df)"""
+        return results_frame(self._results)
+
+    @property
+    def index(self):
+        """Return index table of every completed jump (df)"""
+        index = {}
+        for jump, (start, end) in sorted(self._events.items()):
+            index['Jump ' + str(jump) + ' Start'] = start
+            index['Jump ' + str(jump) + ' End'] = end
+        return pd.DataFrame(index, index=['Event', 'Eccentric Phase',
+                                          'Concentric Phase', 'Jump Phase',
+                                          'Landing Phase'])
+
+    @property
+    def buffered_samples(self):
+        """Return number of samples held in memory"""
+        return self._raw.shape[0] + self._data.shape[0]
+
+    def push(self, chunk):
+        """
+        Add recorded samples to the stream.
+        Argument:
+            chunk: dataframe with the columns used by clean_data, in
+                recording order and continuing the previous chunk
+        Return:
+            calculations: calculation results of the jumps completed by
+                this chunk, indexed by jump number (df, may be empty)
+        """
+        if self._finished:
+            raise ValueError('Stream is already finished')
+        missing = [col for col in USED_COLUMNS if col not in chunk]
+        if len(missing) > 0:
+            raise ValueError('Data is missing columns: ' + str(missing))
+        samples = chunk[USED_COLUMNS].to_numpy(dtype=np.float64)
+        if np.isnan(samples).any():
+            raise ValueError('Data has missing values')
+        if len(samples) == 0:
+            return results_frame({})
+        time = samples[:, 0]
+        if self._last_time is not None:
+            time = np.concatenate([[self._last_time], time])
+        dt = self._dt
+        if dt is None and len(time) > 1:
+            dt = time[1] - time[0]
+        if dt is not None:
+            # Gaps or overlaps would shift every event after them
+            steps = np.diff(time)
+            wrong = np.flatnonzero(np.abs(steps - dt) > dt / 2)
+            if len(wrong) > 0:
+                raise ValueError('Time does not continue the recording at '
+                                 + str(time[wrong[0] + 1]) + ' (expected '
+                                 + str(time[wrong[0]] + dt) + ')')
+        self._dt = dt
+        self._last_time = time[-1]
+
+        done = set(self._results)
+        self._raw = np.concatenate([self._raw, samples])
+        n_new = self._raw.shape[0] - self._n_history
+        if n_new >= FILTER_OVERLAP + FILTER_BLOCK:
+            self._add_samples(self._filter(self._raw.shape[0] -
+                                           FILTER_OVERLAP))
+        return results_frame({jump: row for jump, row in
+                              self._results.items() if jump not in done})
+
+    def finish(self):
+        """
+        End the recording. The last jump is completed with the samples
+            left, as clean_data does for the last contact.
+        Return:
+            calculations: calculation results of the jumps completed
+                while finishing (df, may be empty)
+        """
+        if self._finished:
+            raise ValueError('Stream is already finished')
+        done = set(self._results)
+        if self._raw.shape[0] > self._n_history:
+            self._add_samples(self._filter(self._raw.shape[0]))
+        end = self._offset + self._data.shape[0] - 1
+        if self._air_start is not None and not self._first_contact:
+            self.off_force_plate = True
+            self._close_last(self._air_start, off_force_plate=True)
+        else:
+            self._close_last(end, off_force_plate=False)
+        self._finished = True
+        return results_frame({jump: row for jump, row in
+                              self._results.items() if jump not in done})
+
+    def _filter(self, stop):
+        """
+        Filter the raw samples and keep the ones before stop for good.
+        Argument:
+            stop: number of raw samples to keep for good
+        Return:
+            samples: filtered samples from _n_history to stop (array)
+        """
+        filtered = self._raw.copy()
+        filtered[:, FORCE_COLS] = sosfiltfilt(self.sos,
+                                              filtered[:, FORCE_COLS],
+                                              axis=0)
+        samples = filtered[self._n_history:stop]
+        history = max(0, stop - FILTER_OVERLAP)
+        self._raw = self._raw[history:]
+        self._n_history = stop - history
+        return samples
+
+    def _add_samples(self, samples):
+        """
+        Add filtered samples to the buffer and move the jump state
+            machine forward.
+        Argument:
+            samples: filtered samples (array)
+        """
+        total = samples[:, VERTICAL_COLS].sum(axis=1)
+        self._data = np.concatenate([self._data,
+                                     np.column_stack([samples, total])])
+        self._find_flights()
+        self._check_off_force_plate()
+        if self._pending is not None and self._cutoff is None:
+            self._find_settle()
+        self._trim()
+
+    def _local(self, idx):
+        """Return buffer position of sample number idx"""
+        return idx - self._offset
+
+    def _force_prime(self):
+        """Return derivative of total force over the buffer (array)"""
+        return find_force_prime(self._data[:, TOTAL_COL], self._dt)
+
+    def _find_flights(self):
+        """
+        Look for flights in the samples added since the last call.
+            A flight ends once force is above the threshold again.
+        """
+        limit = self.threshold
+        if limit is None:
+            limit = CONTACT_THRESHOLDS[-1]
+        start = self._local(self._scanned)
+        below = self._data[start:, TOTAL_COL] < limit
+        rising, falling = find_transitions(
+            np.concatenate([[self._air_start is not None], below]))
+        air_starts = list(self._scanned + rising)
+        air_ends = list(self._scanned + falling - 1)
+        if self._air_start is not None:
+            air_starts.insert(0, self._air_start)
+        for air_start, air_end in zip(air_starts, air_ends):
+            self._add_flight(int(air_start), int(air_end))
+        if len(air_starts) > len(air_ends):
+            self._air_start = int(air_starts[-1])
+        else:
+            self._air_start = None
+        self._scanned = self._offset + self._data.shape[0]
+
+    def _check_off_force_plate(self):
+        """
+        Handle a patient in the air for longer than MAX_FLIGHT as having
+            stepped off without waiting for the next contact: complete
+            the last jump and keep only the last MAX_FLIGHT samples of
+            the air period, so memory stays bounded while the force
+            plates are empty.
+        """
+        end = self._offset + self._data.shape[0]
+        if self._air_start is None or \
+                end - self._air_start <= MAX_FLIGHT + 1:
+            return
+        if not self._first_contact:
+            self.off_force_plate = True
+            self._close_last(self._air_start, off_force_plate=True)
+            self._cutoff = None
+            self._first_contact = True
+        # Still longer than MAX_FLIGHT once the patient steps on again
+        self._air_start = end - MAX_FLIGHT - 1
+        self._contact_start = self._air_start
+
+    def _add_flight(self, air_start, air_end):
+        """
+        Handle a flight: complete the previous jump if it is still
+            waiting, start the next one and zero the force in the air.
+        Arguments:
+            1. air_start: first sample below the threshold
+            2. air_end: last sample below the threshold
+        """
+        if air_end - air_start + 1 < MIN_FLIGHT:
+            return
+        if air_end - air_start + 1 > MAX_FLIGHT:
+            # Patient stepped off and on again: start a new set
+            if not self._first_contact:
+                self.off_force_plate = True
+                self._close_last(air_start, off_force_plate=True)
+            self._contact_start = air_end
+            self._cutoff = None
+            self._first_contact = True
+            return
+        takeoff, landing = self._flight_edges(air_start, air_end)
+        in_air = slice(self._local(takeoff) + 1, self._local(landing) - 1)
+        self._data[in_air, VERTICAL_COLS + [TOTAL_COL]] = 0.0
+
+        if self._pending is not None:
+            self._close_pending(takeoff)
+        self._update_static(self._contact_start, takeoff)
+        self._n_jumps += 1
+        try:
+            self._pending = self._jump_start(takeoff)
+        except (IndexError, ValueError) as error:
+            self.errors.append((self._n_jumps, str(error)))
+            self._pending = None
+        else:
+            self._pending['landing'] = landing
+        self._contact_start = landing
+        self._cutoff = None
+        self._first_contact = False
+
+    def _flight_edges(self, air_start, air_end):
+        """
+        Find take-off and landing of a flight. Without a set threshold
+            the lowest threshold (not below the ones used before) for
+            which the patient is in the air only once is used.
+        Arguments:
+            1. air_start: first sample below the largest threshold
+            2. air_end: last sample below the largest threshold
+        Return:
+            1. takeoff: first sample in the air
+            2. landing: last sample in the air
+        """
+        if self.threshold is not None:
+            return air_start, air_end
+        force = self._data[self._local(air_start):self._local(air_end) + 1,
+                           TOTAL_COL]
+        for threshold in CONTACT_THRESHOLDS:
+            if threshold < self._threshold_used:
+                continue
+            in_air = force < threshold
+            rising, _ = find_transitions(in_air)
+            if in_air.any() and len(rising) + in_air[0] == 1:
+                break
+        self._threshold_used = threshold
+        in_air_index = np.flatnonzero(in_air)
+        return (air_start + int(in_air_index[0]),
+                air_start + int(in_air_index[-1]))
+
+    def _jump_start(self, takeoff):
+        """
+        Find the start of the event and phases of the jump that ends
+            the current contact, as clean_data does.
+        Argument:
+            takeoff: first sample in the air
+        Return:
+            jump: event start, eccentric start, concentric start and
+                take-off indexes (dict)
+        """
+        force = self._data[:, TOTAL_COL]
+        force_prime = self._force_prime()
+        start = self._local(self._contact_start)
+        end = self._local(takeoff)
+        if self._first_contact:
+            event_start, eccentric_start, concentric_start = \
+                contact_event_finder(force, force_prime, 1, [start, end], 0)
+        else:
+            # No cutoff if the previous jump could not be found
+            cutoff = start if self._cutoff is None else \
+                self._local(self._cutoff)
+            eccentric_start, concentric_start = find_phase_starts(
+                force, cutoff, end)
+            event_starts, _ = find_unloading_edges(
+                force_prime, start, eccentric_start - 10)
+            event_start = int(event_starts[event_starts > cutoff][0])
+        return {'number': self._n_jumps,
+                'event_start': self._offset + event_start,
+                'eccentric_start': self._offset + eccentric_start,
+                'concentric_start': self._offset + concentric_start,
+                'takeoff': takeoff}
+
+    def _static_periods(self, start, stop):
+        """
+        Find static periods within part of the current contact, as
+            clean_data does.
+        Arguments:
+            1. start: first sample of the contact part
+            2. stop: sample after the contact part
+        Return:
+            1. static_start: sample before each static period (array)
+            2. static_end: last sample of each static period (array)
+        """
+        force_prime = self._force_prime()
+        start = self._local(start)
+        stop = self._local(stop)
+        static = np.zeros(force_prime.shape[0], dtype=bool)
+        static[start:stop] = np.abs(force_prime[start:stop]) < 200
+        static_start, static_end = find_transitions(static)
+        if static_end.size > 0 and static_start.size > 0 and \
+                static_end[0] < static_start[0]:
+            static_end = static_end[1:]
+        static_start = static_start[:static_end.size]
+        return static_start + self._offset, static_end + self._offset
+
+    def _update_static(self, start, stop):
+        """
+        Keep the longest static period of a contact, used for weight.
+        Arguments:
+            1. start: first sample of the contact
+            2. stop: sample after the contact
+        """
+        static_start, static_end = self._static_periods(start, stop)
+        if static_start.size == 0:
+            return
+        longest = int(np.argmax(static_end - static_start))
+        self._keep_static(int(static_start[longest]),
+                          int(static_end[longest]))
+
+    def _keep_static(self, start, end):
+        """
+        Keep a static period if it is the longest one seen so far.
+        Arguments:
+            1. start: sample before the static period
+            2. end: last sample of the static period
+        """
+        if self._static is None or end - start > self._static[0]:
+            force = self._data[self._local(start):self._local(end),
+                               TOTAL_COL]
+            self._static = (end - start, force.mean())
+
+    def _weight(self):
+        """Return patient mass, given or from the longest static period"""
+        if self.mass is not None:
+            return self.mass
+        if self._static is None:
+            raise ValueError('No static period found to estimate weight')
+        return self._static[1] / 9.81
+
+    def _find_settle(self):
+        """
+        Complete the waiting jump once the patient has been static for
+            settle_length samples after landing and the end of the
+            jump can be found before that.
+        """
+        stop = self._offset + self._data.shape[0] - 1
+        if self._air_start is not None:
+            stop = self._air_start
+        static_start, static_end = self._static_periods(
+            self._contact_start, stop)
+        force_prime = self._force_prime()
+        start = self._local(self._contact_start)
+        for period_start, period_end in zip(static_start, static_end):
+            if period_end - period_start < self.settle_length:
+                continue
+            cutoff = self._local((period_start + period_end) // 2)
+            _, unloading_ends = find_unloading_edges(force_prime, start,
+                                                     cutoff)
+            if unloading_ends.size == 0:
+                continue
+            event_end = find_settled_index(force_prime,
+                                           unloading_ends[-1] + 100, cutoff)
+            if event_end is None:
+                continue
+            self._keep_static(int(period_start), int(period_end))
+            self._cutoff = self._offset + cutoff
+            self._add_result(self._offset + event_end)
+            return
+
+    def _close_pending(self, takeoff):
+        """
+        Complete the waiting jump when the next take-off comes before
+            the patient settled, using the largest static period of the
+            contact as clean_data does.
+        Argument:
+            takeoff: first sample in the air after the contact
+        """
+        force_prime = self._force_prime()
+        try:
+            static_start, static_end = self._static_periods(
+                self._contact_start, takeoff)
+            longest = int(np.argmax(static_end - static_start))
+            cutoff = (int(static_start[longest]) +
+                      int(static_end[longest])) // 2
+            self._cutoff = cutoff
+            _, unloading_ends = find_unloading_edges(
+                force_prime, self._local(self._contact_start),
+                self._local(cutoff))
+            event_end = find_settled_index(
+                force_prime, unloading_ends[-1] + 100, self._local(cutoff))
+            if event_end is None:
+                raise ValueError("Code could not identify end of jump "
+                                 "correctly.")
+            self._add_result(self._offset + event_end)
+        except (IndexError, ValueError) as error:
+            self.errors.append((self._pending['number'], str(error)))
+            self._pending = None
+            if self._cutoff is None:
+                self._cutoff = self._contact_start
+
+    def _close_last(self, stop, off_force_plate):
+        """
+        Complete the waiting jump at the end of the recording (or when
+            the patient steps off), as clean_data does for the last
+            contact.
+        Arguments:
+            1. stop: last sample on the force plate
+            2. off_force_plate: True if the patient stepped off
+        """
+        if self._pending is None or self._cutoff is not None:
+            self._pending = None
+            return
+        force_prime = self._force_prime()
+        try:
+            if off_force_plate:
+                static_start, static_end = self._static_periods(
+                    self._contact_start, stop)
+                longest = int(np.argmax(static_end - static_start))
+                cutoff = (int(static_start[longest]) +
+                          int(static_end[longest])) // 2
+            else:
+                cutoff = stop
+            _, unloading_ends = find_unloading_edges(
+                force_prime, self._local(self._contact_start) + 100,
+                self._local(cutoff))
+            self._add_result(self._offset + int(unloading_ends[-1]))
+        except (IndexError, ValueError) as error:
+            self.errors.append((self._pending['number'], str(error)))
+        self._pending = None
+
+    def _add_result(self, event_end):
+        """
+        Integrate the waiting jump and calculate its results.
+        Argument:
+            event_end: index where the jump ends
+        """
+        jump = self._pending
+        self._pending = None
+        event_start = jump['event_start']
+        index = [[event_start, jump['eccentric_start'],
+                  jump['concentric_start'], jump['eccentric_start'],
+                  jump['landing']],
+                 [event_end, jump['concentric_start'], jump['takeoff'],
+                  jump['takeoff'], event_end]]
+        try:
+            mass = self._weight()
+        except ValueError as error:
+            self.errors.append((jump['number'], str(error)))
+            return
+
+        # Derive acceleration, velocity and position over the jump
+        window = self._data[self._local(event_start):
+                            self._local(event_end)]
+        acceleration = window[:, TOTAL_COL] / mass - 9.81
+        velocity = integrate.cumulative_trapezoid(acceleration, dx=self._dt,
+                                                  initial=0)
+        position = integrate.cumulative_trapezoid(velocity, dx=self._dt,
+                                                  initial=0)
+        data = pd.DataFrame(window[:, :TOTAL_COL], columns=USED_COLUMNS)
+        data['ground_force_totaly'] = window[:, TOTAL_COL]
+        data['bodyvel_y'] = velocity
+        data['bodypos_y'] = position
+        local_index = pd.DataFrame({'Jump 1 Start': index[0],
+                                    'Jump 1 End': index[1]}) - event_start
+        self._results[jump['number']] = calculate_metrics(
+            data, local_index, mass)[0]
+        self._events[jump['number']] = index
+
+    def _trim(self):
+        """
+        Drop samples that are no longer needed. Samples of a waiting
+            jump are kept, up to max_pending_samples; otherwise at most
+            max_samples are kept.
+        """
+        end = self._offset + self._data.shape[0]
+        if self._pending is not None and \
+                end - self._pending['event_start'] > self.max_pending_samples:
+            # Patient never settled: drop the jump and start again from
+            #   the last sample on the force plate
+            self.errors.append((self._pending['number'],
+                                'Jump did not end within ' +
+                                str(self.max_pending_samples) + ' samples'))
+            self._pending = None
+            restart = end - 1 if self._air_start is None else self._air_start
+            self._contact_start = restart
+            self._cutoff = restart
+        keep = self._contact_start
+        if self._pending is not None:
+            keep = min(keep, self._pending['event_start'])
+        elif self._data.shape[0] > self.max_samples:
+            keep = max(keep, self._offset + self._data.shape[0] -
+                       self.max_samples)
+            self._contact_start = keep
+        if self._air_start is not None:
+            keep = min(keep, self._air_start)
+        if keep > self._offset:
+            self._data = self._data[self._local(keep):].copy()
+            self._offset = keep
+
+
+def results_frame(results):
+    """
+    Function to wrap results of a stream into a dataframe like the
+        calculation results of process_data.
+    Argument:
+        results: calculation results by jump number (dict of array)
+    Return:
+        calculations: dataframe indexed by jump number
+    """
+    jumps = sorted(results)
+    values = np.array([results[jump] for jump in jumps]).reshape(
+        len(jumps), len(METRIC_COLUMNS))
+    return pd.DataFrame(values, columns=METRIC_COLUMNS, index=jumps)
+
+
+def replay(data, chunk_size=1000, **kwargs):
+    """
+    Function to feed a recorded trial through a StreamProcessor in
+        chunks, as if it was being recorded.
+    Arguments:
+        1. data: squat jump dataframe (e.g. from load_data)
+        2. chunk_size: samples pushed at once
+        3. kwargs: arguments of StreamProcessor
+    Return:
+        processor: the finished StreamProcessor
+    """
+    processor = StreamProcessor(**kwargs)
+    for start in range(0, len(data), chunk_size):
+        processor.push(data.iloc[start:start + chunk_size])
+    processor.finish()
+    return processor
+
+
+def replay_csv(path, chunk_size=1000, **kwargs):
+    """
+    Function to replay a force plate CSV export through a
+        StreamProcessor.
+    Arguments:
+        1. path: path to the CSV file
+        2. chunk_size: samples pushed at once
+        3. kwargs: arguments of StreamProcessor
+    Return:
+        processor: the finished StreamProcessor
+    """
+    return replay(load_data(path), chunk_size, **kwargs)
@@ -0,0 +1,289 @@
+"""
+synthetic_data.py
+    This file contains a generator of synthetic squat jump trials,
+    used to test and benchmark the pipeline at any scale without
+    patient data. Trials have the 19 columns of a force plate export
+    and can be written as CSV files that load_data reads.
+    The vertical force of each jump follows the phases of a real
+    squat jump (unloading, propulsion, flight and landing impact)
+    and its impulses are set so the body leaves the plate at the
+    speed needed for the requested flight time. The true index of
+    every event is returned with the data.
+"""
+import numpy as np
+import pandas as pd
+
+from squatjump_dashboard.load_data.load_data import RAW_COLUMNS
+
+G = 9.81  # Gravitational acceleration used by clean_data to find weight
+
+# Durations of the phases of a jump (s)
+UNLOADING_TIME = 0.35
+PROPULSION_TIME = 0.45
+RELEASE_TIME = 0.08
+IMPACT_TIME = 0.04
+IMPACT_RISE_TIME = 0.015
+LANDING_TIME = 0.8
+STEP_OFF_TIME = 0.5
+OFF_PLATE_TIME = 1.0
+
+UNLOADING_DEPTH = 0.55  # Lowest force while unloading (fraction of weight)
+
+# Feet positions on the plates while standing and when unloaded (m)
+FOOT_X = 0.3
+FOOT_Z = [-1.1, -0.67]
+UNLOADED_Z = [-1.354, -0.45]
+
+# Columns of the ground truth events
+EVENT_COLUMNS = ['movement_start', 'eccentric_start', 'concentric_start',
+                 'takeoff', 'landing']
+
+
+class SyntheticTrial:
+    """
+    Synthetic squat jump trial with its ground truth.
+    """
+
+    def __init__(self, data, events, mass, step_off):
+        """
+        Initialize the trial. Use generate_trial to create one.
+        Arguments:
+            1. data: force plate data with the 19 export columns (df)
+            2. events: true event indexes of each jump, with the take-off
+                velocity and jump height (df indexed by jump from 1)
+            3. mass: patient mass (kg)
+            4. step_off: index where the patient steps off the plates,
+                or None
+        """
+        self.data = data
+        self.events = events
+        self.mass = mass
+        self.step_off = step_off
+
+    def __len__(self):
+        """Return number of rows of the trial"""
+        return len(self.data)
+
+    def to_csv(self, path):
+        """
+        Write the trial as a force plate CSV export.
+        Argument:
+            path: path of the CSV file
+        """
+        write_csv(self.data, path)
+
+
+def generate_trial(n_jumps=3, mass=80.0, flight_times=0.45, noise=2.0,
+                   sway=0.01, sample_rate=1000, standing_time=2.5,
+                   step_off=False, n_rows=None, seed=None):
+    """
+    This function generates a synthetic squat jump trial.
+    Arguments:
+        1. n_jumps: number of jumps (int)
+        2. mass: patient mass (kg)
+        3. flight_times: time in the air (s), one for all jumps or one
+            per jump (float or list)
+        4. noise: standard deviation of the force noise (N)
+        5. sway: amplitude of the slow weight changes while standing
+            (fraction of weight)
+        6. sample_rate: samples per second (clean_data expects 1000)
+        7. standing_time: time standing before, between and after the
+            jumps (s)
+        8. step_off: True if the patient steps off the plates at the end
+        9. n_rows: rows of the trial, by standing longer after the last
+            jump; defaults to the rows needed for the jumps
+        10. seed: seed of the random generator (int)
+    Return:
+        1. trial: the data and its ground truth (SyntheticTrial)
+    """
+    if n_jumps < 1:
+        raise ValueError('n_jumps must be at least 1')
+    flight_times = np.broadcast_to(np.asarray(flight_times, dtype=float),
+                                   (n_jumps,))
+    if np.any(flight_times <= 0):
+        raise ValueError('flight_times must be positive')
+    rng = np.random.default_rng(seed)
+    weight = mass * G
+    dt = 1 / sample_rate
+
+    def samples(seconds):
+        return int(round(seconds * sample_rate))
+
+    # Jump force templates (from movement start to the end of landing)
+    jumps = [jump_force(mass, flight_time, sample_rate)
+             for flight_time in flight_times]
+    standing = [samples(standing_time)] * (n_jumps + 1)
+    step_off_rows = samples(STEP_OFF_TIME + OFF_PLATE_TIME) if step_off \
+        else 0
+    base_rows = sum(standing) + sum(len(force) for force, _ in jumps) + \
+        step_off_rows
+    if n_rows is not None:
+        if n_rows < base_rows:
+            raise ValueError('n_rows must be at least ' + str(base_rows))
+        standing[-1] += n_rows - base_rows
+
+    # Total vertical force, with events
+    force = []
+    events = []
+    start = 0
+    for jump in range(n_jumps):
+        force.append(standing_force(weight, standing[jump], sway, dt, rng))
+        start += standing[jump]
+        jump_values, jump_events = jumps[jump]
+        force.append(jump_values)
+        events.append([start + jump_events[col] for col in EVENT_COLUMNS])
+        start += len(jump_values)
+    force.append(standing_force(weight, standing[-1], sway, dt, rng))
+    step_off_index = None
+    if step_off:
+        release = samples(STEP_OFF_TIME)
+        force.append(weight * np.cos(np.linspace(
+            0, np.pi / 2, release, endpoint=False)) ** 2)
+        force.append(np.zeros(step_off_rows - release))
+        step_off_index = start + standing[-1] + release
+    force = np.concatenate(force)
+
+    data = plate_data(force, rng, noise, sway, dt)
+    velocity = G * flight_times / 2
+    events = pd.DataFrame(events, columns=EVENT_COLUMNS,
+                          index=np.arange(1, n_jumps + 1))
+    events['takeoff_v(m/s)'] = velocity
+    events['jump_height(cm)'] = velocity ** 2 / (2 * 9.80665) * 100
+    return SyntheticTrial(data, events, mass, step_off_index)
+
+
+def jump_force(mass, flight_time, sample_rate):
+    """
+    This function creates the vertical force of one jump, from the
+    start of the movement to the end of the landing. The propulsion
+    and landing impulses are scaled so the patient takes off at the
+    speed matching the flight time and stops after landing.
+    Arguments:
+        1. mass: patient mass (kg)
+        2. flight_time: time in the air (s)
+        3. sample_rate: samples per second
+    Return:
+        1. force: total vertical force (array)
+        2. events: index of each event from the start (dict)
+    """
+    weight = mass * G
+    dt = 1 / sample_rate
+    velocity = G * flight_time / 2
+
+    def phase(seconds):
+        return np.arange(int(round(seconds * sample_rate))) / \
+            (seconds * sample_rate)
+
+    # Unloading dip, propulsion peak and release to take-off
+    unloading = weight - UNLOADING_DEPTH * weight * \
+        np.sin(np.pi * phase(UNLOADING_TIME)) ** 2
+    propulsion_shape = np.sin(np.pi * phase(PROPULSION_TIME)) ** 2
+    release = weight * np.cos(np.pi / 2 * phase(RELEASE_TIME)) ** 2
+    impulse = (np.sum(unloading - weight) + np.sum(release - weight)) * dt
+    propulsion = weight + propulsion_shape * \
+        (mass * velocity - impulse) / (np.sum(propulsion_shape) * dt)
+    movement = np.concatenate([unloading, propulsion, release])
+
+    # Landing: force builds up to weight while an impact stops the body
+    tau = np.arange(int(round(LANDING_TIME * sample_rate))) * dt
+    build_up = weight * (1 - np.exp(-tau / IMPACT_RISE_TIME))
+    impact_shape = tau / IMPACT_TIME * np.exp(1 - tau / IMPACT_TIME)
+    landing = build_up + impact_shape * \
+        (mass * velocity - np.sum(build_up - weight) * dt) / \
+        (np.sum(impact_shape) * dt)
+
+    flight = np.zeros(int(round(flight_time * sample_rate)))
+    force = np.concatenate([movement, flight, landing])
+    events = {'movement_start': 0,
+              'eccentric_start': int(np.argmin(unloading)),
+              'concentric_start': len(unloading) +
+              int(np.argmax(propulsion)),
+              'takeoff': len(movement),
+              'landing': len(movement) + len(flight)}
+    return force, events
+
+
+def standing_force(weight, n_samples, sway, dt, rng):
+    """
+    This function creates the vertical force while standing: the
+    weight plus slow sway that fades in and out at the ends.
+    Arguments:
+        1. weight: patient weight (N)
+        2. n_samples: number of samples
+        3. sway: amplitude of the sway (fraction of weight)
+        4. dt: time between samples (s)
+        5. rng: random generator
+    Return:
+        1. force: total vertical force (array)
+    """
+    time = np.arange(n_samples) * dt
+    phases = rng.uniform(0, 2 * np.pi, 2)
+    waves = 0.6 * np.sin(2 * np.pi * 0.35 * time + phases[0]) + \
+        0.4 * np.sin(2 * np.pi * 0.8 * time + phases[1])
+    fade = np.sin(np.pi * np.arange(n_samples) / max(n_samples - 1, 1))
+    return weight * (1 + sway * waves * fade)
+
+
+def plate_data(force, rng, noise, sway, dt):
+    """
+    This function splits the total vertical force between the two
+    plates and adds the shear forces, centers of pressure and torques
+    of a force plate export. Plates read zero force when unloaded.
+    Arguments:
+        1. force: total vertical force (array)
+        2. rng: random generator
+        3. noise: standard deviation of the force noise (N)
+        4. sway: amplitude of the sway (fraction of weight)
+        5. dt: time between samples (s)
+    Return:
+        1. data: force plate data with the 19 export columns (df)
+    """
+    n_samples = force.shape[0]
+    time = np.arange(n_samples) * dt
+    loaded = force > 0
+    shift = 0.02 * np.sin(2 * np.pi * 0.25 * time + rng.uniform(0, np.pi))
+    data = {'time': time}
+    for plate, share in [(1, 0.52 + shift), (2, 0.48 - shift)]:
+        side = 1 if plate == 1 else -1
+        vertical = force * share + rng.normal(0, noise, n_samples)
+        columns = {
+            'vx': 0.01 * vertical + rng.normal(0, noise, n_samples),
+            'vy': vertical,
+            'vz': side * 0.13 * vertical +
+            rng.normal(0, noise, n_samples),
+            'px': FOOT_X + 2 * sway * np.sin(2 * np.pi * 0.3 * time),
+            'py': np.zeros(n_samples),
+            'pz': FOOT_Z[plate - 1] + sway * np.sin(2 * np.pi * 0.4 * time)}
+        for name, values in columns.items():
+            data['ground_force' + str(plate) + '_' + name] = values
+        data['ground_torque' + str(plate) + '_x'] = np.zeros(n_samples)
+        data['ground_torque' + str(plate) + '_y'] = \
+            side * 0.003 * vertical * np.sin(2 * np.pi * 0.2 * time)
+        data['ground_torque' + str(plate) + '_z'] = np.zeros(n_samples)
+
+        # Unloaded plates read zero, with the center of pressure parked
+        for name in ['vx', 'vy', 'vz']:
+            data['ground_force' + str(plate) + '_' + name][~loaded] = 0.0
+        data['ground_torque' + str(plate) + '_y'][~loaded] = 0.0
+        data['ground_force' + str(plate) + '_px'][~loaded] = FOOT_X
+        data['ground_force' + str(plate) + '_pz'][~loaded] = \
+            UNLOADED_Z[plate - 1]
+    return pd.DataFrame(data, columns=RAW_COLUMNS)
+
+
+def write_csv(data, path):
+    """
+    This function writes force plate data as a CSV export, with the
+    header block read by load_data.
+    Arguments:
+        1. data: force plate data with the 19 export columns (df)
+        2. path: path of the CSV file
+    """
+    padding = ',' * (len(RAW_COLUMNS) - 1)
+    header = ['Squat Jump', 'version=1', 'nRows=' + str(len(data)),
+              'nColumns=' + str(len(RAW_COLUMNS)), 'inDegrees=yes',
+              'endheader']
+    with open(path, 'w', newline='') as file:
+        for line in header:
+            file.write(line + padding + '\n')
+        data[RAW_COLUMNS].to_csv(file, index=False, float_format='%.6f')
@@ -0,0 +1,105 @@
+"""
+test_batch_process.py
+This file contains unittests for the file batch_process.py.
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from squatjump_dashboard.batch_process import batch_process, find_trials
+from squatjump_dashboard.batch_process import main
+from squatjump_dashboard.process_data import process_data
+from squatjump_dashboard.load_data import load_data
+from squatjump_dashboard.metric_store import MetricStore
+my_dir = os.path.dirname(__file__)
+data_dir = os.path.join(my_dir, "../../data")
+
+
+class TestBatchProcess(unittest.TestCase):
+    """
+    Test class to check the batch command line entry point
+    """
+
+    def test_find_trials(self):
+        """
+        Directories are searched for trials, globs are expanded and
+        duplicates are dropped
+        """
+        trials = find_trials([data_dir, os.path.join(data_dir, "BFR0*.csv")])
+        self.assertEqual([os.path.basename(path) for path in trials],
+                         ["BFR003_squat_jump.csv", "BFR007_squat_jump.csv",
+                          "BFR011_squat_jump.csv", "BFR013_squat_jump.csv",
+                          "BFR014_squat_jump.csv"])
+
+    def test_parallel_batch(self):
+        """
+        Metrics of every processed trial end up in one table, and
+        failing trials are reported without stopping the batch
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            for extension in ['.parquet', '.csv']:
+                output = os.path.join(tmp, 'metrics' + extension)
+                summary = batch_process([data_dir], output, workers=2)
+                if extension == '.parquet':
+                    table = pd.read_parquet(output)
+                else:
+                    table = pd.read_csv(output)
+                self.assertEqual(summary['processed'], 2)
+                self.assertEqual(summary['failed'], 3)
+                self.assertTrue(all(error.startswith('ValueError')
+                                    for error in
+                                    summary['failures'].values()))
+                self.assertGreater(summary['trials_per_s'], 0)
+                self.assertEqual(list(table['trial'].unique()),
+                                 ["BFR003_squat_jump.csv",
+                                  "BFR007_squat_jump.csv"])
+                self.assertEqual(list(table['jump']), [1, 2, 3, 1, 2, 3])
+
+        # Same results as process_data
+        _, _, calculations = process_data(load_data(
+            os.path.join(data_dir, "BFR007_squat_jump.csv")))
+        rows = table[table['trial'] == "BFR007_squat_jump.csv"]
+        pd.testing.assert_frame_equal(
+            rows.drop(columns=['trial', 'jump']).reset_index(drop=True),
+            calculations.reset_index(drop=True))
+
+    def test_main(self):
+        """
+        The entry point exits with 0 once trials are processed and 1
+        when there are no trials
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'metrics.csv')
+            path = os.path.join(data_dir, "BFR003_squat_jump.csv")
+            self.assertEqual(main([path, '-o', output, '-j', '1']), 0)
+            self.assertEqual(len(pd.read_csv(output)), 3)
+            self.assertEqual(main([tmp, '-o', output]), 1)
+
+    def test_store(self):
+        """
+        Processed trials are added to a metric store once, as sessions
+        of the patient named by the file
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'metrics.csv')
+            store = os.path.join(tmp, 'metrics.sqlite')
+            for _ in range(2):
+                batch_process([data_dir], output, workers=1, store=store)
+            trends = MetricStore(store).trends('BFR007', aggregate=None)
+            self.assertEqual(MetricStore(store).patients(),
+                             ['BFR003', 'BFR007'])
+            table = pd.read_csv(output)
+            rows = table[table['trial'] == "BFR007_squat_jump.csv"]
+            np.testing.assert_allclose(
+                trends[list(rows.columns[2:])].to_numpy(),
+                rows.iloc[:, 2:].to_numpy())
+
+    # Edge Tests
+    def test_output_extension(self):
+        """
+        Output tables other than Parquet or CSV raise ValueError
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(ValueError):
+                batch_process([data_dir], os.path.join(tmp, 'metrics.txt'))
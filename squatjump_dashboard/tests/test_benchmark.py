@@ -0,0 +1,91 @@
+"""
+test_benchmark.py
+This file contains unittests for the file benchmark.py.
+"""
+import json
+import os
+import tempfile
+import unittest
+import pandas as pd
+from squatjump_dashboard.benchmark import run_benchmark, compare
+from squatjump_dashboard.benchmark import scaled_trial, main
+from squatjump_dashboard.benchmark.benchmark import best_time
+from squatjump_dashboard.load_data import load_data
+from squatjump_dashboard.process_data import process_data
+my_dir = os.path.dirname(__file__)
+trial_path = os.path.join(my_dir, "../../data/BFR003_squat_jump.csv")
+
+
+class TestBenchmark(unittest.TestCase):
+    """
+    Test class to check the benchmark harness
+    """
+
+    def test_scaled_trial(self):
+        """
+        Scaled trials have the requested rows and the same jump results
+        """
+        data = load_data(trial_path)
+        scaled = scaled_trial(data, 30000)
+        self.assertEqual(len(scaled), 30000)
+        self.assertAlmostEqual(scaled['time'].iloc[-1], 29.999)
+        pd.testing.assert_frame_equal(process_data(scaled)[2],
+                                      process_data(data)[2], atol=1e-6)
+
+    def test_run_benchmark(self):
+        """
+        Every stage is timed and results can be written to JSON
+        """
+        results = run_benchmark([trial_path], rows=0, repeat=1)
+        result = results['trials']['BFR003_squat_jump.csv']
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['rows'], 12080)
+        for stage in ['clean_data.validation', 'clean_data.filter',
+                      'clean_data.contact_finder',
+                      'clean_data.find_static_indexes',
+                      'clean_data.contact_event_finder',
+                      'clean_data.integration', 'clean_data.total',
+                      'metrics.get_take_off_v', 'plots.create_COP_plot']:
+            self.assertGreater(result['seconds'][stage], 0)
+        json.dumps(results)
+
+    def test_best_time_setup(self):
+        """
+        Setup runs untimed before every run and its value is passed on
+        """
+        calls = []
+        best_time(calls.append, 3, setup=lambda: len(calls))
+        self.assertEqual(calls, [0, 1, 2])
+
+    def test_compare(self):
+        """
+        Only stages slower than the baseline by more than the threshold
+        and the minimum time are regressions
+        """
+        baseline = {'trials': {'a': {'seconds': {'filter': 0.010,
+                                                 'plot': 0.0001}}}}
+        results = {'trials': {'a': {'seconds': {'filter': 0.020,
+                                                'plot': 0.0005}},
+                              'b': {'seconds': {'filter': 1.0}}}}
+        self.assertEqual(compare(results, baseline),
+                         [('a', 'filter', 0.010, 0.020)])
+        self.assertEqual(compare(results, baseline, threshold=3), [])
+
+    def test_main_regression(self):
+        """
+        The entry point exits with 1 when a stage regressed
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'bench.json')
+            args = [trial_path, '-o', output, '--rows', '0', '--repeat', '1']
+            self.assertEqual(main(args), 0)
+            with open(output) as file:
+                baseline = json.load(file)
+            for result in baseline['trials'].values():
+                result['seconds']['clean_data.total'] = 1e-6
+            with open(output, 'w') as file:
+                json.dump(baseline, file)
+            new_output = os.path.join(tmp, 'new.json')
+            self.assertEqual(main([trial_path, '-o', new_output, '--rows',
+                                   '0', '--repeat', '1', '--baseline',
+                                   output]), 1)
@@ -6,9 +6,21 @@ This file contains unittests for clean_data
 import os
 import unittest
 
+import numpy as np
 import pandas as pd
+from scipy.integrate import cumulative_trapezoid
+from scipy.signal import butter, filtfilt, sosfiltfilt
 
 from squatjump_dashboard.clean_data import clean_data
+from squatjump_dashboard.clean_data.clean_data import butter_filter
+from squatjump_dashboard.clean_data.clean_data import contact_finder
+from squatjump_dashboard.clean_data.clean_data import find_contact_threshold
+from squatjump_dashboard.clean_data.clean_data import find_force_prime
+from squatjump_dashboard.clean_data.clean_data import find_ground_angle
+from squatjump_dashboard.clean_data.clean_data import find_static_indexes
+from squatjump_dashboard.clean_data.clean_data import find_static_period
+from squatjump_dashboard.clean_data.clean_data import integrate_segments
+from squatjump_dashboard.synthetic_data import generate_trial
 
 main_path = os.path.dirname(__file__)
 data_path1 = os.path.join(main_path, "../../data/BFR007_squat_jump.csv")
@@ -144,3 +156,165 @@ class Testclean_data(unittest.TestCase):
                 self.assertAlmostEqual(min_force, 65.5, places=1)
             else:
                 self.assertAlmostEqual(min_force, 65.84, places=1)
+
+    def test_contact_finder_equivalence(self):
+        """
+        Checks contact ranges and off force plate flag match the
+        original loop based contact_finder for every data file
+        """
+        expected = {
+            'BFR003_squat_jump.csv': ([0, 2425], [2664, 5942],
+                                      [6199, 9697], [9949, 12079], 0),
+            'BFR007_squat_jump.csv': ([0, 1811], [2063, 6204],
+                                      [6494, 11068], [11347, 14790], 1),
+            'BFR011_squat_jump.csv': ([0, 3572], [3792, 7380],
+                                      [7720, 11159], [11494, 14369], 0),
+            'BFR013_squat_jump.csv': ([0, 2450], [2788, 4942],
+                                      [5278, 7336], [7679, 10779], 0),
+            'BFR014_squat_jump.csv': ([0, 1906], [2186, 5892],
+                                      [6179, 10052], [10347, 13339], 0),
+            'squat_jump_error_test.csv': ([0, 1948], [2206, 4140],
+                                          [4395, 6256], [6522, 7849], 0)}
+        for file_name, contacts in expected.items():
+            test_df8 = pd.read_csv(
+                os.path.join(main_path, "../../data", file_name), header=6)
+            force = butter_filter(test_df8['ground_force1_vy'], 5, 1000, 4) \
+                + butter_filter(test_df8['ground_force2_vy'], 5, 1000, 4)
+            self.assertEqual(contact_finder(force), contacts)
+
+    def test_force_prime_ground_angle_loops(self):
+        """
+        Checks the force derivative and ground angles match the original
+        loops, including samples with no force (0/0, filled with 0) and
+        with only vertical force (90 degrees)
+        """
+        frame = pd.DataFrame({'vx': [3.0, 0.0, 0.0, -12.5, 0.0, 4.0],
+                              'vy': [400.0, 0.0, 250.0, 610.0, -5.0, 0.0],
+                              'vz': [-4.0, 0.0, 0.0, 7.5, 0.0, 3.0]})
+        dt = 0.001
+        xz = frame['vx'] ** 2 + frame['vz'] ** 2
+        expected_angle = []
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for ii in range(len(frame)):
+                expected_angle.append(
+                    np.arctan(frame['vy'][ii] / np.sqrt(xz[ii])) * 180/np.pi)
+        expected_angle = pd.Series(expected_angle).fillna(0)
+        expected_prime = []
+        for n in range(len(frame['vy'])-1):
+            expected_prime.append((frame['vy'][n + 1] - frame['vy'][n])/dt)
+        expected_prime.append(expected_prime[-1])
+
+        angle = find_ground_angle(frame['vx'], frame['vy'], frame['vz'])
+        np.testing.assert_allclose(angle, expected_angle)
+        np.testing.assert_array_equal(angle[[1, 2, 4]], [0, 90, -90])
+        np.testing.assert_allclose(find_force_prime(frame['vy'], dt),
+                                   expected_prime)
+
+    def test_static_periods(self):
+        """
+        Checks static runs are only found inside contacts and the
+        largest one is selected
+        """
+        force_prime = [500] * 5 + [0] * 10 + [500] * 5 + [0] * 30
+        start_static, end_static = find_static_indexes(
+            force_prime, [0, 18], [20, 30], [32, 40], [42, 49])
+        self.assertEqual(list(start_static), [4, 19, 31, 41])
+        self.assertEqual(list(end_static), [14, 29, 39, 48])
+        self.assertEqual(find_static_period(start_static[:2],
+                                            end_static[:2]), (4, 14))
+        self.assertEqual(find_static_period(start_static[2:3],
+                                            end_static[1:3]), (31, 39))
+
+    def test_batched_filter(self):
+        """
+        Checks filtering all force channels at once matches filtering
+        each column separately with the transfer function filter
+        """
+        test_df9 = pd.read_csv(data_path1, header=6)
+        force_cols = [col for col in test_df9.columns if '_v' in col]
+        b, a = butter(4, 5 / 500, btype='low', analog=False)
+        filtered = butter_filter(test_df9[force_cols].to_numpy(), 5, 1000, 4)
+        for ii, col in enumerate(force_cols):
+            np.testing.assert_allclose(filtered[:, ii],
+                                       filtfilt(b, a, test_df9[col]),
+                                       atol=1e-5)
+
+    def test_chunked_filter(self):
+        """
+        Checks long data filtered in chunks matches filtering it in one
+        pass
+        """
+        rng = np.random.default_rng(0)
+        column = 800 + np.cumsum(rng.normal(0, 5, (200000, 2)), axis=0)
+        sos = butter(4, 5 / 500, btype='low', analog=False, output='sos')
+        np.testing.assert_allclose(butter_filter(column, 5, 1000, 4),
+                                   sosfiltfilt(sos, column, axis=0),
+                                   rtol=1e-12, atol=1e-8)
+
+    def test_chunked_contact_threshold(self):
+        """
+        Checks the in air threshold of a long trial (searched in chunks)
+        matches the one found from its jumps only
+        """
+        trial = generate_trial(n_rows=200000, seed=3)
+        force = butter_filter(trial.data[['ground_force1_vy',
+                                          'ground_force2_vy']].to_numpy(),
+                              5, 1000, 4).sum(axis=1)
+        self.assertEqual(find_contact_threshold(force),
+                         find_contact_threshold(force[:20000]))
+
+    def test_integrate_segments(self):
+        """
+        Checks integrating all segments at once matches integrating
+        each segment separately, including empty and one sample
+        segments
+        """
+        rng = np.random.default_rng(0)
+        acceleration = rng.normal(0.3, 1, 20000)
+        index_list = [100, 2000, 2001, 7000, 7000, 19999, 20000]
+        velocity, position = integrate_segments(acceleration, index_list,
+                                                0.001)
+        self.assertEqual(velocity.shape, (19900,))
+        for start, stop in zip(index_list[:-1], index_list[1:]):
+            if start == stop:
+                continue
+            segment_velocity = cumulative_trapezoid(
+                acceleration[start:stop], dx=0.001, initial=0)
+            segment_position = cumulative_trapezoid(
+                segment_velocity, dx=0.001, initial=0)
+            np.testing.assert_allclose(velocity[start - 100:stop - 100],
+                                       segment_velocity, atol=1e-12)
+            np.testing.assert_allclose(position[start - 100:stop - 100],
+                                       segment_position, atol=1e-12)
+        with self.assertRaises(ValueError):
+            integrate_segments(acceleration, [0, 200, 100], 0.001)
+
+    def test_many_jumps(self):
+        """
+        Checks trials with any number of jumps give one contact more
+        than jumps and an index table column pair per jump close to the
+        true events
+        """
+        for n_jumps, step_off in [(1, False), (5, False), (10, True)]:
+            trial = generate_trial(n_jumps=n_jumps, step_off=step_off,
+                                   seed=n_jumps)
+            force = butter_filter(trial.data[['ground_force1_vy',
+                                              'ground_force2_vy']].to_numpy(),
+                                  5, 1000, 4).sum(axis=1)
+            *contacts, off_force_plate = contact_finder(force)
+            self.assertEqual(len(contacts), n_jumps + 1)
+            self.assertEqual(off_force_plate, int(step_off))
+            self.assertEqual(contact_finder(force, n_jumps),
+                             contact_finder(force))
+
+            _, index, _ = clean_data(trial.data)
+            self.assertEqual(index.shape, (5, 2 * n_jumps))
+            self.assertEqual(list(index.columns[-2:]),
+                             ['Jump %d Start' % n_jumps,
+                              'Jump %d End' % n_jumps])
+            take_off = index.loc['Jump Phase'].to_numpy()[1::2]
+            landing = index.loc['Landing Phase'].to_numpy()[0::2]
+            np.testing.assert_allclose(take_off, trial.events['takeoff'],
+                                       atol=30)
+            np.testing.assert_allclose(landing, trial.events['landing'],
+                                       atol=60)
@@ -0,0 +1,79 @@
+"""
+test_force_animation.py
+This file contains unittests for the file force_animation.py.
+"""
+import os
+import unittest
+import plotly.graph_objects as go
+from squatjump_dashboard.force_animation import create_force_animation
+from squatjump_dashboard.force_animation import force_vectors
+from squatjump_dashboard.force_animation.force_animation import MAX_FRAMES
+from squatjump_dashboard.load_data import load_data
+from squatjump_dashboard.plot_data import plot_data
+from squatjump_dashboard.process_data import process_data
+my_dir = os.path.dirname(__file__)
+
+
+class TestForceAnimation(unittest.TestCase):
+    """
+    Test class to check the 3D force vector animation
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Process one sample trial shared by the tests"""
+        data = load_data(os.path.join(
+            my_dir, "../../data/BFR003_squat_jump.csv"))
+        cls.data, cls.index, _ = process_data(data)
+
+    def test_force_vectors(self):
+        """
+        The vectors cover the event of the jump on the plate of the leg
+        """
+        time, vectors = force_vectors(self.data, self.index, 2, 'left')
+        start = self.index['Jump 2 Start']['Event']
+        end = self.index['Jump 2 End']['Event']
+        self.assertEqual(len(time), end - start + 1)
+        self.assertEqual(vectors.shape, (len(time), 3))
+        self.assertEqual(vectors[0, 2],
+                         self.data['ground_force2_vy'].iloc[start])
+        self.assertEqual(vectors[-1, 0],
+                         self.data['ground_force2_vz'].iloc[end])
+        with self.assertRaises(ValueError):
+            force_vectors(self.data, self.index, 2, 'both')
+
+    def test_animation(self):
+        """
+        The animation has bounded frames that only move the vector, and
+        is small enough to send on every rerun
+        """
+        fig = create_force_animation(self.data, self.index, 1, 'right')
+        self.assertIsInstance(fig, go.Figure)
+        self.assertEqual(len(fig.data), 2)
+        self.assertLessEqual(len(fig.frames), MAX_FRAMES)
+        self.assertGreater(len(fig.frames), 10)
+        for frame in fig.frames:
+            self.assertEqual(frame.traces, (1,))
+        self.assertEqual(len(fig.layout.sliders[0].steps), len(fig.frames))
+        self.assertLess(len(fig.to_json()), 100 * 1024)
+
+    def test_cache(self):
+        """
+        Animations are built once per trial, jump and leg, and each call
+        gets its own figure
+        """
+        fig = create_force_animation(self.data, self.index, 3, 'left')
+        title = fig.layout.title.text
+        fig.update_layout(title='Changed')
+        fig.frames[0].data[0].x = (0, 1)
+        again = create_force_animation(self.data, self.index, '3', 'left')
+        self.assertIsNot(again, fig)
+        self.assertEqual(again.layout.title.text, title)
+        self.assertNotEqual(again.frames[0].data[0].x, (0, 1))
+
+        def not_cached():
+            raise AssertionError('animation built again')
+        plot_data(self.data).figure(('force_animation', 3, 'left'),
+                                    not_cached)
+        right = create_force_animation(self.data, self.index, 3, 'right')
+        self.assertIn('[right]', right.layout.title.text)
@@ -0,0 +1,72 @@
+"""
+test_load_data.py
+This file contains unittests for load_data
+"""
+import io
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from squatjump_dashboard.load_data import load_data
+from squatjump_dashboard.load_data.load_data import RAW_COLUMNS
+from squatjump_dashboard.load_data.load_data import USED_COLUMNS
+from squatjump_dashboard.process_data import process_data
+
+main_path = os.path.dirname(__file__)
+data_path = os.path.join(main_path, "../../data/BFR007_squat_jump.csv")
+with open(data_path, 'rb') as data_file:
+    content = data_file.read()
+
+
+class Testload_data(unittest.TestCase):
+    def test_matches_read_csv(self):
+        """
+        Checks used columns are read with the same values as read_csv
+        """
+        data = load_data(data_path)
+        expected = pd.read_csv(data_path, header=6)
+        self.assertEqual(list(data.columns), USED_COLUMNS)
+        self.assertTrue((data.dtypes == np.float64).all())
+        np.testing.assert_array_equal(data.to_numpy(),
+                                      expected[USED_COLUMNS].to_numpy())
+
+    def test_all_columns(self):
+        """
+        Checks every column can be read from a file-like object
+        """
+        data = load_data(io.BytesIO(content), columns=RAW_COLUMNS)
+        self.assertEqual(data.shape, (16350, 19))
+
+    def test_process_loaded(self):
+        """
+        Checks process_data gives the same results for loaded data
+        """
+        loaded = process_data(load_data(data_path))
+        expected = process_data(pd.read_csv(data_path, header=6))
+        for frame, expected_frame in zip(loaded, expected):
+            pd.testing.assert_frame_equal(frame, expected_frame)
+
+    def test_header_columns(self):
+        """
+        Throws ValueError if header states the wrong number of columns
+        """
+        bad_content = content.replace(b'nColumns=19', b'nColumns=18', 1)
+        with self.assertRaises(ValueError):
+            load_data(io.BytesIO(bad_content))
+
+    def test_header_rows(self):
+        """
+        Throws ValueError if header row count does not match the data
+        """
+        bad_content = content.replace(b'nRows=16350', b'nRows=16000', 1)
+        with self.assertRaises(ValueError):
+            load_data(io.BytesIO(bad_content))
+
+    def test_missing_header(self):
+        """
+        Throws ValueError if the file has no header block
+        """
+        with self.assertRaises(ValueError):
+            load_data(io.BytesIO(content.split(b'endheader', 1)[1]))
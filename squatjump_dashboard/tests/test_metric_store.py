@@ -0,0 +1,107 @@
+"""
+test_metric_store.py
+This file contains unittests for the file metric_store.py.
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+from squatjump_dashboard.metric_store import MetricStore, patient_id
+from squatjump_dashboard.process_data import process_data
+from squatjump_dashboard.process_data.process_data import METRIC_COLUMNS
+from squatjump_dashboard.synthetic_data import generate_trial
+
+
+class TestMetricStore(unittest.TestCase):
+    """
+    Test class to check the longitudinal metric store
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Process one synthetic trial shared by the tests"""
+        _, _, cls.calculations = process_data(generate_trial(seed=5).data)
+
+    def setUp(self):
+        """Open a store in a temporary directory"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = MetricStore(os.path.join(self.tmp.name, 'store',
+                                              'metrics.sqlite'))
+
+    def tearDown(self):
+        """Remove the temporary store"""
+        self.tmp.cleanup()
+
+    def test_trends(self):
+        """
+        Sessions are returned by date, per jump or aggregated per
+        session, with the stored metric values
+        """
+        later = self.calculations * 1.1
+        self.store.add_session('BFR003', later, '2024-03-01', 'b.csv')
+        self.store.add_session('BFR003', self.calculations, '2024-01-15',
+                               'a.csv')
+        self.store.add_session('BFR007', self.calculations, '2024-02-01')
+        self.assertEqual(self.store.patients(), ['BFR003', 'BFR007'])
+
+        jumps = self.store.trends('BFR003', aggregate=None)
+        self.assertEqual(len(jumps), 2 * len(self.calculations))
+        self.assertEqual(list(jumps['trial'].unique()), ['a.csv', 'b.csv'])
+        np.testing.assert_allclose(
+            jumps[METRIC_COLUMNS].to_numpy()[:len(self.calculations)],
+            self.calculations[METRIC_COLUMNS].to_numpy())
+
+        sessions = self.store.trends('BFR003', ['jump_height(cm)',
+                                                'peak_force(N)'], 'max')
+        self.assertEqual(list(sessions.columns),
+                         ['session_id', 'session_date', 'trial',
+                          'jump_height(cm)', 'peak_force(N)'])
+        self.assertEqual(len(sessions), 2)
+        self.assertAlmostEqual(sessions['peak_force(N)'][1],
+                               later['peak_force(N)'].max())
+        self.assertEqual(str(sessions['session_date'][0].date()),
+                         '2024-01-15')
+        self.assertEqual(list(self.store.sessions('BFR003')['jumps']),
+                         [len(self.calculations)] * 2)
+
+    def test_replace_session(self):
+        """
+        A trial stored again with the same key replaces its session,
+        and removed sessions are gone with their jumps
+        """
+        self.store.add_session('BFR003', self.calculations, '2024-01-15',
+                               key='abc')
+        second = self.store.add_session('BFR003', self.calculations,
+                                        '2024-01-16', key='abc')
+        sessions = self.store.sessions('BFR003')
+        self.assertEqual(list(sessions['session_id']), [second])
+        self.assertEqual(str(sessions['session_date'][0].date()),
+                         '2024-01-16')
+        self.assertEqual(len(self.store.trends('BFR003', aggregate=None)),
+                         len(self.calculations))
+        self.store.remove_session(second)
+        self.assertEqual(self.store.patients(), [])
+        self.assertEqual(len(self.store.trends('BFR003', aggregate=None)),
+                         0)
+
+    def test_errors(self):
+        """
+        Missing patients, missing metrics and unknown metrics or
+        aggregates raise errors
+        """
+        with self.assertRaises(ValueError):
+            self.store.add_session(' ', self.calculations)
+        with self.assertRaises(ValueError):
+            self.store.add_session('BFR003',
+                                   self.calculations.iloc[:, :3])
+        with self.assertRaises(ValueError):
+            self.store.trends('BFR003', ['height'])
+        with self.assertRaises(ValueError):
+            self.store.trends('BFR003', aggregate='sum')
+
+    def test_patient_id(self):
+        """
+        Patients are named by the start of the trial file name
+        """
+        self.assertEqual(patient_id('data/BFR003_squat_jump.csv'), 'BFR003')
+        self.assertEqual(patient_id('P12.csv'), 'P12')
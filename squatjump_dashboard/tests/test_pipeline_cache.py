@@ -0,0 +1,127 @@
+"""
+test_pipeline_cache.py
+This file contains unittests for the file pipeline_cache.py.
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from squatjump_dashboard.pipeline_cache import PipelineCache, trial_key
+from squatjump_dashboard.pipeline_cache import ParquetCache, frame_key
+from squatjump_dashboard.pipeline_cache.pipeline_cache import PIPELINE_SOURCES
+from squatjump_dashboard.pipeline_cache.pipeline_cache import pipeline_version
+from squatjump_dashboard.process_data import process_data
+my_dir = os.path.dirname(__file__)
+
+
+class TestPipelineCache(unittest.TestCase):
+    """
+    Test class to check keys, eviction and memory cap of the cache
+    """
+
+    def test_trial_key(self):
+        """
+        Keys only match for the same contents and parameters
+        """
+        key = trial_key(b'time\n0\n')
+        self.assertEqual(key, trial_key(b'time\n0\n'))
+        self.assertNotEqual(key, trial_key(b'time\n1\n'))
+        self.assertNotEqual(key, trial_key(b'time\n0\n',
+                                           {'filter_cutoff': 6}))
+
+    def test_lru_eviction(self):
+        """
+        The least recently used entry is evicted first
+        """
+        cache = PipelineCache(max_entries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_memory_cap(self):
+        """
+        Results are evicted to stay under the memory cap and results
+        larger than the cap are not stored
+        """
+        frame = pd.DataFrame({'x': np.zeros(1000)})
+        size = int(frame.memory_usage(deep=True).sum())
+        cache = PipelineCache(max_bytes=2 * size)
+        cache.put('a', (frame, frame))
+        cache.put('b', frame)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.nbytes, size)
+        cache.put('c', (frame, frame, frame))
+        self.assertNotIn('c', cache)
+
+    def test_get_or_compute(self):
+        """
+        Values are only computed once
+        """
+        cache = PipelineCache()
+        calls = []
+        for _ in range(3):
+            value = cache.get_or_compute('a', lambda: calls.append(1) or 5)
+        self.assertEqual(value, 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_parquet_cache(self):
+        """
+        Persisted results round trip and are only returned for the
+        pipeline version that wrote them
+        """
+        data_path = os.path.join(my_dir, "../../data/BFR007_squat_jump.csv")
+        data = pd.read_csv(data_path, skiprows=6)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            result = process_data(data, cache_dir=cache_dir)
+            cached = ParquetCache(cache_dir).get(frame_key(data))
+            self.assertIsNotNone(cached)
+            for frame, cached_frame in zip(result, cached):
+                pd.testing.assert_frame_equal(frame, cached_frame)
+            for frame, cached_frame in zip(
+                    result, process_data(data, cache_dir=cache_dir)):
+                pd.testing.assert_frame_equal(frame, cached_frame)
+
+            other = ParquetCache(cache_dir, version='other')
+            self.assertIsNone(other.get(frame_key(data)))
+            other.prune()
+            self.assertEqual(os.listdir(cache_dir), ['other'])
+
+    def test_parquet_failed_put(self):
+        """
+        A trial that cannot be written to Parquet is not stored and
+        leaves no temporary directory behind
+        """
+        frame = pd.DataFrame({'a': [1.0]})
+        unsupported = pd.DataFrame({'a': [1.0, 'text']})
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ParquetCache(cache_dir)
+            with self.assertRaises(Exception):
+                cache.put('key', (frame, unsupported, frame))
+            self.assertIsNone(cache.get('key'))
+            self.assertEqual(os.listdir(os.path.join(cache_dir,
+                                                     cache.version)), [])
+            cache.put('key', (frame, frame, frame))
+            self.assertEqual(os.listdir(os.path.join(cache_dir,
+                                                     cache.version)),
+                             ['key'])
+
+    def test_pipeline_sources(self):
+        """
+        The pipeline version covers every module deciding the persisted
+        results, including the loading and validation of trials
+        """
+        package_dir = os.path.dirname(my_dir)
+        for module in ['load_data', 'validate_data', 'clean_data',
+                       'process_data']:
+            self.assertIn(os.path.join(module, module + '.py'),
+                          PIPELINE_SOURCES)
+        for source in PIPELINE_SOURCES:
+            self.assertTrue(os.path.isfile(os.path.join(package_dir,
+                                                        source)))
+        self.assertNotEqual(pipeline_version(),
+                            pipeline_version({'filter_cutoff': 0}))
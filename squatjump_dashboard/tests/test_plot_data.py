@@ -0,0 +1,114 @@
+"""
+test_plot_data.py
+This file contains unittests for the file plot_data.py.
+"""
+import gc
+import unittest
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from squatjump_dashboard.plot_data import min_max_decimate, plot_data
+from squatjump_dashboard.pipeline_cache import PipelineCache
+from squatjump_dashboard.plot_data import use_plot_cache
+from squatjump_dashboard.plot_data.plot_data import _plot_data
+from squatjump_dashboard.plot_data.plot_data import PLOT_CACHE_ENTRIES
+from squatjump_dashboard.plot_data.plot_data import PLOT_CACHE_MB
+from squatjump_dashboard.squat_jump_utils import create_plot_vs_time
+from squatjump_dashboard.squat_jump_utils import groundforce_plot
+from squatjump_dashboard.synthetic_data import generate_trial
+
+
+class TestPlotData(unittest.TestCase):
+    """
+    Test class to check the decimation and caching of plotted series
+    """
+
+    def test_min_max_decimate(self):
+        """
+        The lowest and highest sample of every bucket are kept in order
+        """
+        rng = np.random.default_rng(0)
+        y = rng.normal(size=10001)
+        x = np.arange(10001) / 1000
+        kept_x, kept_y = min_max_decimate(x, y, 100)
+        self.assertLessEqual(len(kept_y), 200)
+        self.assertTrue(np.all(np.diff(kept_x) > 0))
+        self.assertEqual(kept_y.max(), y.max())
+        self.assertEqual(kept_y.min(), y.min())
+        np.testing.assert_array_equal(kept_y, y[np.rint(kept_x * 1000)
+                                                .astype(int)])
+        # Every bucket keeps its extremes
+        bucket_size = 101
+        for start in range(0, 10001, bucket_size):
+            bucket = y[start:start + bucket_size]
+            self.assertIn(bucket.max(), kept_y)
+            self.assertIn(bucket.min(), kept_y)
+
+    def test_short_series(self):
+        """
+        Series with at most two samples per bucket are not decimated
+        """
+        x = np.arange(50)
+        kept_x, kept_y = min_max_decimate(x, x * 2, 25)
+        np.testing.assert_array_equal(kept_x, x)
+        np.testing.assert_array_equal(kept_y, x * 2)
+
+    def test_cache(self):
+        """
+        Decimated series are cached per dataframe and column, and
+        dropped with the dataframe
+        """
+        data = pd.DataFrame({'time': np.arange(5000) / 1000,
+                             'bodyvel_y': np.sin(np.arange(5000))})
+        trial_plot = plot_data(data)
+        self.assertIs(plot_data(data), trial_plot)
+        series = trial_plot.series('bodyvel_y', 640)
+        self.assertIs(trial_plot.series('bodyvel_y', 640), series)
+        key = id(data)
+        del data, trial_plot
+        gc.collect()
+        self.assertNotIn(key, _plot_data)
+
+    def test_plot_points(self):
+        """
+        Plotted lines have at most two points per pixel of the figure,
+        whatever the length of the trial
+        """
+        data = generate_trial(n_rows=120000, seed=0).data
+        fig = groundforce_plot(data, 'y')
+        width = fig.get_figwidth() * fig.dpi
+        for line in fig.axes[0].get_lines():
+            self.assertLessEqual(len(line.get_xdata()), 2 * width)
+        self.assertEqual(fig.axes[0].get_lines()[0].get_ydata().max(),
+                         data['ground_force1_vy'].max())
+        plt.close(fig)
+        data['bodyvel_y'] = np.cumsum(data['ground_force1_vy'])
+        fig = create_plot_vs_time(data, 'bodyvel_y')
+        self.assertLessEqual(len(fig.axes[0].get_lines()[0].get_xdata()),
+                             2 * width)
+        plt.close(fig)
+
+    def test_bounded_cache(self):
+        """
+        Plot values of all trials share one bounded least recently used
+        cache
+        """
+        small = PipelineCache(max_entries=3, max_bytes=2 ** 20)
+        use_plot_cache(small)
+        try:
+            data = pd.DataFrame({'time': np.arange(5000) / 1000,
+                                 'bodyvel_y': np.sin(np.arange(5000))})
+            for width in [100, 200, 300, 400]:
+                plot_data(data).series('bodyvel_y', width)
+            self.assertEqual(len(small), 3)
+            self.assertLessEqual(small.nbytes, 2 ** 20)
+            calls = []
+            plot_data(data).cached('big', lambda: calls.append(1) or
+                                   np.zeros(2 ** 18))
+            plot_data(data).cached('big', lambda: calls.append(1) or
+                                   np.zeros(2 ** 18))
+            # Values larger than the memory cap are not kept
+            self.assertEqual(len(calls), 2)
+        finally:
+            use_plot_cache(PipelineCache(PLOT_CACHE_ENTRIES,
+                                         PLOT_CACHE_MB * 2 ** 20))
@@ -7,6 +7,10 @@ import numpy as np
 import pandas as pd
 import os
 from squatjump_dashboard.process_data import process_data
+from squatjump_dashboard.process_data import calculate_metrics
+from squatjump_dashboard.process_data import metrics_frame
+from squatjump_dashboard.process_data.process_data import take_off_velocity
+from squatjump_dashboard.synthetic_data import generate_trial
 my_dir = os.path.dirname(__file__)
 G = 9.80665
 
@@ -221,3 +225,96 @@ class TestProcessData(unittest.TestCase):
         bias_rate = abs((vel_actual - vel_expect)/(vel_actual + vel_expect))
         self.assertLess(bias_rate, tolerance)
         print('bias rate of take-off velocity is less than 5%, test passed')
+
+    def test_calculate_metrics_many_jumps(self):
+        """
+        Test for the stateless metrics API
+        Passed if an index table with five jumps gives five float rows
+        """
+        data_path = os.path.join(my_dir, "../../data/BFR007_squat_jump.csv")
+        data = pd.read_csv(data_path, skiprows=6)
+        processed, index, calculations = process_data(data)
+
+        # repeat the first two jumps as jumps 4 and 5
+        index_5 = pd.concat([index, index.iloc[:, :4]], axis=1)
+        results = calculate_metrics(processed, index_5, 89.0)
+        self.assertEqual(results.shape, (5, 15))
+        self.assertEqual(results.dtype, np.float64)
+        np.testing.assert_allclose(results[3:, 1:], results[:2, 1:])
+        np.testing.assert_allclose(results[:3, 1:],
+                                   calculations.iloc[:, 1:].to_numpy())
+
+        cal_result = metrics_frame(results)
+        self.assertEqual(list(cal_result.index), [1, 2, 3, 4, 5])
+        self.assertEqual(list(cal_result.columns), list(calculations.columns))
+
+    def test_take_off_velocity_flight_window(self):
+        """
+        Edge test for take-off velocity
+        Passed if the constant slope run is found after the peak and
+        the search stops at landing.
+        """
+        # push off, a 20 frame slow down and then free fall
+        push = np.linspace(0, 2, 200)
+        slow = 2 - 0.001 * np.arange(1, 21) ** 2
+        fall = slow[-1] - G / 1000 * np.arange(1, 301)
+        velocity = np.concatenate([push, slow, fall])
+
+        vel = take_off_velocity(velocity, 0, len(velocity))
+        self.assertLess(vel, slow[-1])
+        self.assertAlmostEqual(vel, fall[1], places=6)
+        with self.assertRaises(Exception):
+            take_off_velocity(velocity, 0, 300)
+
+    def test_take_off_velocity_slow_drift(self):
+        """
+        Edge test for take-off velocity
+        Passed if a slope drifting slowly (less than 0.1% frame to
+        frame, but more than 0.1% from the start of any run of 100
+        frames) is not taken as constant, and a peak at the first
+        frame does not wrap around the array.
+        """
+        # push off, a slope drifting 0.05% per frame, then free fall at a
+        #   slope 1% away from the end of the drift
+        push = np.linspace(0, 2, 200)
+        drift = 2 + np.cumsum(-G / 1000 * (1 + 0.0005 * np.arange(300)))
+        fall = drift[-1] + np.cumsum(np.full(300, -G / 1000 * 1.2))
+        velocity = np.concatenate([push, drift, fall])
+
+        vel = take_off_velocity(velocity, 0, len(velocity))
+        self.assertAlmostEqual(vel, fall[1], places=9)
+
+        # peak velocity at the first frame
+        vel = take_off_velocity(np.concatenate([[3.0], fall]), 0, 301)
+        self.assertAlmostEqual(vel, fall[2], places=9)
+
+    def test_long_trial(self):
+        """
+        Test for the configurable row limit
+        Passed if a trial longer than max_rows raises ValueError, and a
+        long trial with a rest after the jumps gives the results of its
+        jumps alone.
+        """
+        trial = generate_trial(n_rows=200000, seed=3)
+        with self.assertRaises(ValueError):
+            process_data(trial.data, max_rows=100000)
+        _, index, calculations = process_data(trial.data)
+        _, short_index, short_calculations = process_data(
+            trial.data.iloc[:20000])
+        pd.testing.assert_frame_equal(index, short_index)
+        pd.testing.assert_frame_equal(calculations, short_calculations,
+                                      rtol=1e-3)
+
+    def test_many_jumps(self):
+        """
+        Test for trials with more than three jumps
+        Passed if a ten jump trial gives ten rows of results, with the
+        weight in the first row only.
+        """
+        trial = generate_trial(n_jumps=10, seed=2)
+        _, index, calculations = process_data(trial.data)
+        self.assertEqual(index.shape, (5, 20))
+        self.assertEqual(list(calculations.index), list(range(1, 11)))
+        self.assertAlmostEqual(calculations.loc[1, 'weight(kg)'], 80, 0)
+        self.assertTrue(calculations['weight(kg)'].iloc[1:].isna().all())
+        self.assertFalse(calculations.iloc[:, 1:].isna().any().any())
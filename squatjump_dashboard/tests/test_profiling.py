@@ -0,0 +1,134 @@
+"""
+test_profiling.py
+This file contains unittests for the file profiling.py.
+"""
+import contextlib
+import json
+import os
+import tracemalloc
+import unittest
+from unittest import mock
+import numpy as np
+from squatjump_dashboard.load_data import load_data
+from squatjump_dashboard.process_data import process_data
+from squatjump_dashboard.profiling import Profiler, active_profiler
+from squatjump_dashboard.profiling import profiled, record, stage
+my_dir = os.path.dirname(__file__)
+
+
+@profiled('add')
+def add(values, extra=0):
+    """Function profiled in the tests"""
+    record(extra=extra)
+    return sum(values) + extra
+
+
+class TestProfiling(unittest.TestCase):
+    """
+    Test class to check the profiling hooks and collector
+    """
+
+    def test_inactive(self):
+        """
+        Without an active Profiler nothing is recorded
+        """
+        profiler = Profiler()
+        self.assertEqual(add([1, 2], extra=3), 6)
+        with stage('unused') as unused:
+            self.assertIsNone(unused)
+        self.assertIsNone(active_profiler())
+        self.assertEqual(profiler.records, [])
+
+    def test_nested_stages(self):
+        """
+        Stages record their rows, parent, values and time
+        """
+        with Profiler() as profiler:
+            self.assertIs(active_profiler(), profiler)
+            with stage('outer', rows=10):
+                add(np.array([1, 2, 3]), extra=1)
+        self.assertIsNone(active_profiler())
+        inner, outer = profiler.records
+        self.assertEqual(inner['stage'], 'add')
+        self.assertEqual(inner['parent'], 'outer')
+        self.assertEqual(inner['rows'], 3)
+        self.assertEqual(inner['extra'], 1)
+        self.assertEqual(outer['rows'], 10)
+        self.assertGreaterEqual(outer['seconds'], inner['seconds'])
+        self.assertEqual(profiler.as_dict()['total_seconds'],
+                         outer['seconds'])
+
+    def test_process_data(self):
+        """
+        Processing a trial records each pipeline stage, the contact
+        threshold and a log line that can be parsed back
+        """
+        data = load_data(os.path.join(
+            my_dir, "../../data/BFR003_squat_jump.csv"))
+        with Profiler() as profiler:
+            process_data(data)
+        frame = profiler.as_frame()
+        for name in ['process_data', 'clean_data', 'filter',
+                     'contact_finder', 'contact_event_finder',
+                     'integration', 'calculate_metrics']:
+            self.assertIn(name, frame['stage'].to_list())
+        contact = frame[frame['stage'] == 'contact_finder'].iloc[0]
+        self.assertEqual(contact['rows'], len(data))
+        self.assertGreater(contact['contact_threshold'], 0)
+        self.assertGreaterEqual(contact['contact_threshold_tries'], 1)
+        line = profiler.log_line()
+        self.assertTrue(line.startswith('squatjump_profile '))
+        logged = json.loads(line[len('squatjump_profile '):])
+        self.assertEqual(len(logged['stages']), len(frame))
+
+    def test_memory(self):
+        """
+        The peak memory of a stage includes its nested stages, with or
+        without tracemalloc.reset_peak (Python 3.9+)
+        """
+        def allocate():
+            with stage('inner'):
+                block = bytearray(8 * 2 ** 20)
+                del block
+            with stage('after'):
+                pass
+
+        reset_peak = getattr(tracemalloc, 'reset_peak', None)
+        for has_reset_peak in [True, False]:
+            if has_reset_peak and reset_peak is None:
+                continue
+            with contextlib.ExitStack() as patches:
+                if not has_reset_peak and reset_peak is not None:
+                    # Python < 3.9 behaviour, restored when done
+                    patches.enter_context(
+                        mock.patch.object(tracemalloc, 'reset_peak'))
+                    del tracemalloc.reset_peak
+                with Profiler(memory=True) as profiler:
+                    self.assertTrue(profiler.memory)
+                    with stage('outer'):
+                        block = bytearray(2 * 2 ** 20)
+                        allocate()
+                        del block
+            inner, after, outer = profiler.records
+            self.assertGreater(inner['peak_mb'], 7)
+            self.assertLess(after['peak_mb'], 1)
+            self.assertGreater(outer['peak_mb'], 9)
+        self.assertIs(getattr(tracemalloc, 'reset_peak', None), reset_peak)
+
+    def test_single_memory_profiler(self):
+        """
+        Only one Profiler at a time records memory, and it is released
+        when the Profiler is deactivated, even after an error
+        """
+        with self.assertRaises(RuntimeError):
+            with Profiler(memory=True) as first:
+                self.assertEqual(first.memory, first.memory_requested)
+                with Profiler(memory=True) as second:
+                    self.assertFalse(second.memory)
+                    with stage('inner'):
+                        pass
+                raise RuntimeError('stage failed')
+        self.assertIsNone(active_profiler())
+        self.assertNotIn('peak_mb', second.records[0])
+        with Profiler(memory=True) as third:
+            self.assertEqual(third.memory, third.memory_requested)
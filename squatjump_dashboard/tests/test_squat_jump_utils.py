@@ -9,6 +9,11 @@ import unittest
 import plotly.graph_objs as go
 from squatjump_dashboard.squat_jump_utils import groundforce_plot, create_COP_plot
 from squatjump_dashboard.squat_jump_utils import create_plot_vs_time
+from squatjump_dashboard.squat_jump_utils import metric_viewer, split_by_jump
+from squatjump_dashboard.squat_jump_utils import center_pressure_bins, create_center_pressure_df
+from squatjump_dashboard.squat_jump_utils import jump_slice
+from squatjump_dashboard.process_data import process_data
+from squatjump_dashboard.synthetic_data import generate_trial
 
 
 # Defining the TestCase class from unittest module
@@ -76,3 +81,98 @@ class Test_Squat_Jump_Utils(unittest.TestCase):
         # Check for a value error with incorrect column name:
         with self.assertRaises(ValueError):
             create_plot_vs_time(df, 'time')
+
+    def test_many_jumps(self):
+        """
+        This function checks that the metric table and the jump split
+        cover every jump of a trial with five jumps.
+        """
+        trial = generate_trial(n_jumps=5, seed=1)
+        data, index, calculations = process_data(trial.data)
+        metric_df = metric_viewer(calculations)
+        self.assertEqual(list(metric_df.columns),
+                         ['Jump 1', 'Jump 2', 'Jump 3', 'Jump 4', 'Jump 5'])
+        for jump in [1, '4', 5]:
+            jump_df = split_by_jump(data, index, jump)
+            self.assertEqual(
+                round(jump_df['time'].iloc[0] * 1000),
+                index['Jump ' + str(jump) + ' Start']['Event'])
+            self.assertEqual(
+                round(jump_df['time'].iloc[-1] * 1000),
+                index['Jump ' + str(jump) + ' End']['Event'])
+
+    def test_center_pressure_bins(self):
+        """
+        This function checks that the binned center of pressure holds
+        the mean of each leg per 0.5 s bin, and that the COP plot is
+        built once per trial, each call getting its own figure.
+        """
+        df = generate_trial(seed=2).data
+        center_pressure = center_pressure_bins(df)
+        # Bins (0, 0.5], ..., (15, 15.5] of a 16.4 s trial, the first
+        # one also holding 0
+        self.assertEqual(len(center_pressure), 2 * 31)
+        self.assertEqual(list(center_pressure['side'][:4]),
+                         ['left', 'right', 'left', 'right'])
+        first = df[df['time'] <= 0.5]
+        self.assertAlmostEqual(center_pressure['ground_force_px'][0],
+                               first['ground_force1_px'].mean())
+        second = df[(df['time'] > 0.5) & (df['time'] <= 1)]
+        self.assertAlmostEqual(center_pressure['ground_force_pz'][3],
+                               second['ground_force2_pz'].mean())
+        self.assertEqual(center_pressure['time'][2].right, 1.0)
+        fig = create_COP_plot(df)
+        self.assertIsInstance(fig, go.Figure)
+        fig.update_layout(title='Changed')
+        again = create_COP_plot(df)
+        self.assertIsNot(again, fig)
+        self.assertIsNone(again.layout.title.text)
+
+    def test_center_pressure_df(self):
+        """
+        This function checks that the center of pressure dataframe
+        holds both legs side by side, sliced by leg and rows as views.
+        """
+        df = generate_trial(seed=3).data
+        center_pressure = create_center_pressure_df(df)
+        self.assertEqual(len(center_pressure), len(df))
+        self.assertEqual(center_pressure.columns.levels[0].dtype,
+                         'category')
+        np.testing.assert_array_equal(center_pressure.index, df['time'])
+        left = center_pressure['left']
+        np.testing.assert_array_equal(left['ground_force_pt2z'],
+                                      df['ground_force2_vy'])
+        np.testing.assert_array_equal(
+            center_pressure['right']['ground_force_pt1y'],
+            df['ground_force1_px'])
+        values = center_pressure.to_numpy()
+        self.assertTrue(np.shares_memory(left.to_numpy(), values))
+        self.assertTrue(np.shares_memory(
+            center_pressure.iloc[100:200].to_numpy(), values))
+
+    def test_jump_phases(self):
+        """
+        This function checks that jumps and their phases are split as
+        views from the index table, also on the center of pressure
+        dataframe.
+        """
+        data, index, _ = process_data(generate_trial(n_jumps=2,
+                                                     seed=4).data)
+        eccentric = split_by_jump(data, index, 2, 'eccentric')
+        self.assertEqual(round(eccentric['time'].iloc[0] * 1000),
+                         index['Jump 2 Start']['Eccentric Phase'])
+        self.assertEqual(round(eccentric['time'].iloc[-1] * 1000),
+                         index['Jump 2 End']['Eccentric Phase'])
+        self.assertTrue(np.shares_memory(eccentric['time'].to_numpy(),
+                                         data['time'].to_numpy()))
+        flight = jump_slice(data, index, 1, 'flight')
+        self.assertEqual(flight.stop - flight.start,
+                         index['Jump 1 Start']['Landing Phase'] -
+                         index['Jump 1 End']['Jump Phase'] + 1)
+        center_pressure = create_center_pressure_df(data)
+        self.assertEqual(jump_slice(center_pressure, index, '1', 'flight'),
+                         flight)
+        with self.assertRaises(ValueError):
+            split_by_jump(data, index, 1, 'takeoff')
+        with self.assertRaises(ValueError):
+            split_by_jump(data, index, 3)
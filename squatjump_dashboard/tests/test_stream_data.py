@@ -0,0 +1,196 @@
+"""
+test_stream_data.py
+This file contains unittests for the file stream_data.py.
+"""
+import os
+import unittest
+import numpy as np
+import pandas as pd
+from squatjump_dashboard.clean_data.clean_data import butter_filter
+from squatjump_dashboard.clean_data.clean_data import clean_data
+from squatjump_dashboard.clean_data.clean_data import find_contact_threshold
+from squatjump_dashboard.load_data import load_data
+from squatjump_dashboard.process_data import process_data
+from squatjump_dashboard.stream_data import StreamProcessor, replay
+my_dir = os.path.dirname(__file__)
+
+
+def read_trial(name):
+    """Read a sample data file"""
+    return load_data(os.path.join(my_dir, "../../data/" + name))
+
+
+class TestStreamData(unittest.TestCase):
+    """
+    Test class to check the streaming mode against process_data
+    """
+
+    def test_replay_matches_batch(self):
+        """
+        With the batch mass and in air threshold, replaying a trial in
+        chunks of any size gives the batch results. Only the end of
+        the last jump differs, since the stream cannot know it is the
+        last one. The stream reports the weight used for every jump.
+        """
+        for name in ["BFR003_squat_jump.csv", "BFR007_squat_jump.csv"]:
+            data = read_trial(name)
+            _, index, calculations = process_data(data)
+            mass = clean_data(data)[2]
+            threshold = find_contact_threshold(butter_filter(
+                data[['ground_force1_vy', 'ground_force2_vy']].to_numpy(),
+                5, 1000, 4).sum(axis=1))
+            for chunk_size in [250, 1000, 4096]:
+                stream = replay(data, chunk_size, mass=mass,
+                                threshold=threshold)
+                self.assertEqual(stream.errors, [])
+                np.testing.assert_allclose(stream.calculations['weight(kg)'],
+                                           mass)
+                pd.testing.assert_frame_equal(
+                    stream.calculations.drop(columns='weight(kg)'),
+                    calculations.drop(columns='weight(kg)'), atol=1e-6)
+                np.testing.assert_array_equal(
+                    stream.index.drop(columns='Jump 3 End'),
+                    index.drop(columns='Jump 3 End'))
+                np.testing.assert_array_equal(
+                    stream.index['Jump 3 End'][1:4],
+                    index['Jump 3 End'][1:4])
+
+    def test_estimated_mass(self):
+        """
+        Without a mass, the weight estimated from the samples seen so
+        far is close to the batch weight
+        """
+        data = read_trial("BFR003_squat_jump.csv")
+        _, _, calculations = process_data(data)
+        stream = replay(data)
+        self.assertEqual(len(stream.calculations), 3)
+        np.testing.assert_allclose(stream.calculations['weight(kg)'],
+                                   calculations.loc[1, 'weight(kg)'],
+                                   atol=0.2)
+        np.testing.assert_allclose(stream.calculations['jump_time(s)'],
+                                   calculations['jump_time(s)'], atol=0.005)
+
+    def test_emits_on_landing(self):
+        """
+        Each jump is returned by the chunk in which the patient settles,
+        before the recording ends
+        """
+        data = read_trial("BFR007_squat_jump.csv")
+        stream = StreamProcessor()
+        emitted = []
+        for start in range(0, len(data), 500):
+            jumps = stream.push(data.iloc[start:start + 500])
+            emitted += [start] * len(jumps)
+        stream.finish()
+        self.assertEqual(len(emitted), 3)
+        landings = stream.index.loc['Landing Phase'].to_numpy()[0::2]
+        self.assertTrue(np.all(np.array(emitted) > landings))
+        self.assertTrue(np.all(np.array(emitted) < landings + 5000))
+
+    def test_bounded_memory(self):
+        """
+        Memory does not grow with the length of the recording
+        """
+        data = read_trial("BFR003_squat_jump.csv")
+        trials = []
+        for repeat in range(5):
+            trial = data.copy()
+            trial['time'] += repeat * len(data) / 1000
+            trials.append(trial)
+        data = pd.concat(trials, ignore_index=True)
+        stream = StreamProcessor()
+        buffered = 0
+        for start in range(0, len(data), 1000):
+            stream.push(data.iloc[start:start + 1000])
+            buffered = max(buffered, stream.buffered_samples)
+        stream.finish()
+        self.assertEqual(len(stream.calculations), 15)
+        self.assertLess(buffered, 10000)
+
+    def test_bounded_memory_off_plate(self):
+        """
+        Memory stays bounded while the force plates are empty after the
+        patient steps off, and the last jump is completed as a step off
+        """
+        data = read_trial("BFR003_squat_jump.csv")
+        stream = StreamProcessor()
+        for start in range(0, len(data), 1000):
+            stream.push(data.iloc[start:start + 1000])
+        buffered = 0
+        for chunk in range(300):
+            empty = pd.DataFrame(0.0, index=range(1000),
+                                 columns=data.columns)
+            empty['time'] = (len(data) + 1000 * chunk +
+                             np.arange(1000)) / 1000
+            stream.push(empty)
+            buffered = max(buffered, stream.buffered_samples)
+        stream.finish()
+        self.assertTrue(stream.off_force_plate)
+        self.assertEqual(stream.errors, [])
+        self.assertEqual(len(stream.calculations), 3)
+        self.assertLess(buffered, 12000)
+
+    def test_pending_jump_dropped(self):
+        """
+        A jump after which the patient never settles is dropped once it
+        holds max_pending_samples, with an error, so memory stays bounded
+        """
+        data = read_trial("BFR003_squat_jump.csv")
+        _, index, _ = process_data(data)
+        head = data.iloc[:int(index['Jump 1 Start']['Landing Phase']) + 200]
+        # 40 s of swaying around the standing force after landing
+        n_sway = 40000
+        sway = pd.DataFrame(np.repeat(head.iloc[[-1]].to_numpy(), n_sway,
+                                      axis=0), columns=data.columns)
+        sway['time'] = head['time'].iloc[-1] + \
+            0.001 * np.arange(1, n_sway + 1)
+        wave = 300 * np.sin(2 * np.pi * 2 * np.arange(n_sway) / 1000)
+        for col in ['ground_force1_vy', 'ground_force2_vy']:
+            sway[col] = data[col].iloc[:1000].mean() + wave
+        data = pd.concat([head, sway], ignore_index=True)
+        stream = StreamProcessor(max_pending_samples=20000)
+        buffered = 0
+        for start in range(0, len(data), 1000):
+            stream.push(data.iloc[start:start + 1000])
+            buffered = max(buffered, stream.buffered_samples)
+        stream.finish()
+        self.assertEqual(len(stream.calculations), 0)
+        self.assertEqual(stream.errors,
+                         [(1, 'Jump did not end within 20000 samples')])
+        self.assertLess(buffered, 25000)
+
+    # Edge Tests
+    def test_missing_columns(self):
+        """
+        Chunks without the force plate columns raise ValueError
+        """
+        with self.assertRaises(ValueError):
+            StreamProcessor().push(pd.DataFrame({'time': [0.0]}))
+
+    def test_push_after_finish(self):
+        """
+        A finished stream does not take more samples
+        """
+        data = read_trial("BFR003_squat_jump.csv")
+        stream = replay(data)
+        with self.assertRaises(ValueError):
+            stream.push(data.iloc[:10])
+
+    def test_discontinuous_time(self):
+        """
+        Chunks whose time leaves a gap after, or overlaps, the previous
+        chunk raise ValueError and leave the stream unchanged
+        """
+        data = read_trial("BFR003_squat_jump.csv")
+        stream = StreamProcessor()
+        stream.push(data.iloc[:1000])
+        with self.assertRaises(ValueError):
+            stream.push(data.iloc[1010:2000])
+        with self.assertRaises(ValueError):
+            stream.push(data.iloc[990:2000])
+        with self.assertRaises(ValueError):
+            stream.push(data.iloc[1000:2000].drop(index=1500))
+        for start in range(1000, len(data), 1000):
+            stream.push(data.iloc[start:start + 1000])
+        stream.finish()
+        self.assertEqual(len(stream.calculations), 3)
@@ -0,0 +1,80 @@
+"""
+test_synthetic_data.py
+This file contains unittests for the file synthetic_data.py.
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+from squatjump_dashboard.synthetic_data import generate_trial
+from squatjump_dashboard.synthetic_data.synthetic_data import jump_force
+from squatjump_dashboard.load_data import load_data
+from squatjump_dashboard.load_data.load_data import RAW_COLUMNS
+from squatjump_dashboard.process_data import process_data
+
+
+class TestSyntheticData(unittest.TestCase):
+    """
+    Test class to check the synthetic trials and their ground truth
+    """
+
+    def test_jump_impulse(self):
+        """
+        The force of a jump takes off at the speed of the flight time
+        and brings the patient to rest after landing
+        """
+        force, events = jump_force(70.0, 0.5, 1000)
+        velocity = np.cumsum(force / 70.0 - 9.81) * 0.001
+        self.assertAlmostEqual(velocity[events['takeoff'] - 1],
+                               9.81 * 0.5 / 2)
+        self.assertAlmostEqual(velocity[-1], 0)
+        self.assertTrue(np.all(force[events['takeoff']:
+                                     events['landing']] == 0))
+
+    def test_process_synthetic(self):
+        """
+        process_data finds the mass and the events of synthetic trials
+        """
+        trial = generate_trial(mass=65.0, flight_times=[0.4, 0.45, 0.5],
+                               seed=1)
+        _, index, calculations = process_data(trial.data)
+        self.assertAlmostEqual(calculations.loc[1, 'weight(kg)'], 65.0,
+                               delta=0.5)
+        for jump, events in trial.events.iterrows():
+            start = index['Jump ' + str(jump) + ' Start']
+            end = index['Jump ' + str(jump) + ' End']
+            self.assertLess(abs(start['Eccentric Phase'] -
+                                events['eccentric_start']), 10)
+            self.assertLess(abs(start['Concentric Phase'] -
+                                events['concentric_start']), 10)
+            self.assertLess(abs(end['Jump Phase'] - events['takeoff']), 30)
+            self.assertLess(abs(start['Landing Phase'] -
+                                events['landing']), 60)
+
+    def test_rows_and_step_off(self):
+        """
+        Trials can be generated at a set number of rows, and stepping
+        off the plates ends the trial with unloaded plates
+        """
+        trial = generate_trial(n_rows=30000, step_off=True, seed=2)
+        self.assertEqual(len(trial), 30000)
+        self.assertEqual(list(trial.data.columns), RAW_COLUMNS)
+        self.assertTrue(np.all(
+            trial.data['ground_force1_vy'][trial.step_off:] == 0))
+        self.assertTrue(trial.data['ground_force1_vy']
+                        [trial.step_off - 100] > 0)
+        process_data(trial.data)
+        with self.assertRaises(ValueError):
+            generate_trial(n_rows=1000)
+
+    def test_to_csv(self):
+        """
+        Synthetic trials written as CSV are read back by load_data
+        """
+        trial = generate_trial(n_jumps=1, seed=3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'synthetic_squat_jump.csv')
+            trial.to_csv(path)
+            data = load_data(path, RAW_COLUMNS)
+        np.testing.assert_allclose(data.to_numpy(), trial.data.to_numpy(),
+                                   atol=1e-6)
@@ -0,0 +1,89 @@
+"""
+test_validate_data.py
+This file contains unittests for validate_data
+"""
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from squatjump_dashboard.clean_data import clean_data
+from squatjump_dashboard.load_data.load_data import USED_COLUMNS
+from squatjump_dashboard.validate_data import validate_data, ValidatedTrial
+
+main_path = os.path.dirname(__file__)
+data_path = os.path.join(main_path, "../../data/BFR007_squat_jump.csv")
+test_df = pd.read_csv(data_path, header=6)
+
+
+class Testvalidate_data(unittest.TestCase):
+    def test_token(self):
+        """
+        Checks valid data gives a token which is not checked again
+        """
+        trial = validate_data(test_df)
+        self.assertIsInstance(trial, ValidatedTrial)
+        self.assertIs(trial.data, test_df)
+        self.assertIs(validate_data(trial), trial)
+        self.assertEqual(len(trial), len(test_df))
+
+    def test_clean_token(self):
+        """
+        Checks clean_data gives the same result for a token
+        """
+        expected = clean_data(test_df)
+        result = clean_data(validate_data(test_df))
+        pd.testing.assert_frame_equal(result[0], expected[0])
+        pd.testing.assert_frame_equal(result[1], expected[1])
+        self.assertEqual(result[2], expected[2])
+
+    def test_type(self):
+        """
+        Throws TypeError if data is not a dataframe
+        """
+        with self.assertRaises(TypeError):
+            validate_data(test_df.to_numpy())
+
+    def test_columns(self):
+        """
+        Throws ValueError for a missing or renamed column
+        """
+        with self.assertRaises(ValueError):
+            validate_data(test_df.drop(['ground_force2_pz'], axis=1))
+        with self.assertRaises(ValueError):
+            validate_data(test_df.rename(
+                columns={'ground_force1_vx': 'ground_force1_vb'}))
+
+    def test_column_names(self):
+        """
+        Throws ValueError naming the column when a column not used for
+        processing is renamed, with all 19 or the 11 used columns
+        """
+        with self.assertRaisesRegex(ValueError, 'ground_torque1_x not found'):
+            validate_data(test_df.rename(
+                columns={'ground_torque1_x': 'ground_torque1_b'}))
+        used = validate_data(test_df[USED_COLUMNS]).data
+        with self.assertRaisesRegex(ValueError, 'ground_force2_pz not found'):
+            validate_data(used.rename(
+                columns={'ground_force2_pz': 'ground_force2_pb'}))
+
+    def test_time(self):
+        """
+        Throws ValueError for a gap in time or time not starting at 0
+        """
+        gap_df = test_df.copy()
+        gap_df.loc[100:, 'time'] += 0.001
+        with self.assertRaises(ValueError):
+            validate_data(gap_df)
+        with self.assertRaises(ValueError):
+            validate_data(test_df.iloc[10:])
+
+    def test_missing_values(self):
+        """
+        Throws ValueError for missing values
+        """
+        nan_df = test_df.copy()
+        nan_df.loc[50, 'ground_force1_vy'] = np.nan
+        with self.assertRaises(ValueError):
+            validate_data(nan_df)
@@ -0,0 +1 @@
+from .validate_data import validate_data, ValidatedTrial
@@ -0,0 +1,148 @@
+"""
+validate_data.py
+    This file contains the input checks shared by clean_data,
+    process_data and squat_jump_utils. A trial is checked once in a
+    single vectorized pass and wrapped in a ValidatedTrial, which the
+    other stages accept without checking the data again. Long trials
+    are checked in chunks of rows so the checks need little memory
+    beyond the data itself.
+"""
+import numpy as np
+import pandas as pd
+
+from squatjump_dashboard.load_data.load_data import RAW_COLUMNS
+from squatjump_dashboard.load_data.load_data import USED_COLUMNS
+from squatjump_dashboard.profiling import profiled
+
+SAMPLE_PERIOD = 0.001  # Time between force plate samples (s)
+CHUNK_ROWS = 65536  # Rows checked or filtered at a time in long trials
+
+
+class ValidatedTrial:
+    """
+    Token for squat jump data that passed validate_data. Holds the
+        validated dataframe, which should not be modified afterwards.
+    """
+
+    def __init__(self, data):
+        """
+        Initialize the token. Use validate_data to create one.
+        Argument:
+            data: the validated squat jump dataframe
+        """
+        self.data = data
+
+    def __len__(self):
+        """Return number of rows of the trial"""
+        return len(self.data)
+
+
+@profiled('validation')
+def validate_data(data):
+    """
+    This function checks that a squat jump dataframe can be processed:
+    it has the columns of a force plate export (all 19 or the 11 used
+    ones), time starts at 0 and is continuous at 1000 Hz, and there are
+    no missing values.
+    Arguments:
+        1. data: raw squat jump dataframe, or a ValidatedTrial which is
+            returned as is
+    Return:
+        1. trial: ValidatedTrial holding the dataframe
+    """
+    if isinstance(data, ValidatedTrial):
+        return data
+    if (type(data) is pd.DataFrame) is False:
+        raise TypeError('Data type received for "data" must be a pandas ' +
+                        'DataFrame. Instead recieved data type ' +
+                        str(type(data)))
+
+    # Check # of columns and column names
+    check_columns(data)
+
+    # Check time is continous
+    if not is_continuous(data['time'].to_numpy(dtype=float)):
+        raise ValueError("Time series in data not correct. Check to make "
+                         "sure data is at 1000 Hz and continous.")
+
+    # Check for missing values
+    if has_missing_values(data, USED_COLUMNS):
+        raise ValueError('Data contains missing values!')
+
+    return ValidatedTrial(data)
+
+
+def check_columns(data):
+    """
+    This function checks that a dataframe has the columns of a force
+    plate export: all 19 of them, or the 11 used for processing.
+    Arguments:
+        1. data: squat jump dataframe
+    Return:
+        RaiseError if a column is missing.
+    """
+    if data.shape[1] == len(RAW_COLUMNS):
+        expected = RAW_COLUMNS
+    elif data.shape[1] == len(USED_COLUMNS):
+        expected = USED_COLUMNS
+    else:
+        raise ValueError("Squat jump CSV file has incorrect number of columns")
+    missing = [col for col in expected if col not in data.columns]
+    if len(missing) > 0:
+        raise ValueError(', '.join(missing) + ' not found')
+    if len(data) == 0:
+        raise ValueError('Squat jump CSV file has no rows')
+
+
+def is_continuous(time):
+    """
+    This function checks that time starts at 0 and increases by
+    SAMPLE_PERIOD at every sample, one chunk of rows at a time.
+    Arguments:
+        1. time: time array (s)
+    Return:
+        1. True if time is continuous (bool)
+    """
+    if not np.isclose(time[0], 0):
+        return False
+    for chunk in chunk_slices(time.shape[0] - 1):
+        steps = time[chunk.start + 1:chunk.stop + 1] - time[chunk]
+        if not np.allclose(steps, SAMPLE_PERIOD):
+            return False
+    return True
+
+
+def has_missing_values(data, columns=None):
+    """
+    This function checks a dataframe for missing values, one column at
+    a time so no copy of the whole dataframe is made.
+    Arguments:
+        1. data: dataframe
+        2. columns: names of the columns to check, defaults to all
+    Return:
+        1. True if any value is missing (bool)
+    """
+    if columns is None:
+        columns = data.columns
+    for col in columns:
+        values = data[col].to_numpy()
+        if values.dtype.kind == 'f':
+            missing = np.isnan(values).any()
+        else:
+            missing = pd.isna(values).any()
+        if missing:
+            return True
+    return False
+
+
+def chunk_slices(n_rows, size=CHUNK_ROWS):
+    """
+    This function splits rows into consecutive chunks.
+    Arguments:
+        1. n_rows: number of rows (int)
+        2. size: rows per chunk (int)
+    Return:
+        1. chunks: slices covering the rows in order (list of slice)
+    """
+    return [slice(start, min(start + size, n_rows))
+            for start in range(0, n_rows, size)]